@@ -0,0 +1,184 @@
+# Headless benchmarks for the upload, switching, audio and preset-loading paths, run
+# against the simulated hid, focus and pycaw backends in tools/sim_backends.py.
+#
+#   python tools/bench.py                          # run everything, compare to tools/bench_baseline.json
+#   python tools/bench.py --only audio --quick
+#   python tools/bench.py --save-baseline          # record this machine's numbers as the baseline
+#   python tools/bench.py --out results.json --tolerance 0.15
+#
+# Results are medians in milliseconds. A case regresses when its median is more
+# than --tolerance (fraction) above the baseline median.
+import argparse
+import json
+import os
+import platform
+import statistics
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+DEFAULT_BASELINE = os.path.join(HERE, "bench_baseline.json")
+
+def summarize(samples):
+    samples = sorted(s * 1000 for s in samples)
+    return {
+        "n": len(samples),
+        "median": round(statistics.median(samples), 4),
+        "p90": round(samples[min(len(samples) - 1, int(0.9 * len(samples)))], 4),
+        "min": round(samples[0], 4),
+        "max": round(samples[-1], 4),
+    }
+
+# --- CASES ---
+def bench_upload(ctx, reps):
+    engine = ctx["engine"]
+    results = {}
+    for layout in ("3-Key + Knob", "4-Key"):
+        engine.cfg_layout = layout
+        for label, full in (("full_preset", True), ("unchanged_preset", False)):
+            samples = []
+            for _ in range(reps):
+                assert engine.begin_upload(wait=5)
+                t0 = time.perf_counter()
+                engine._upload_thread(full)
+                samples.append(time.perf_counter() - t0)
+            results[f"upload.{label}[{layout}]"] = summarize(samples)
+    engine.cfg_layout = "3-Key + Knob"
+    return results
+
+def bench_switch(ctx, reps):
+    sim, engine, focus = ctx["sim"], ctx["engine"], ctx["focus"]
+    samples = []
+    for i in range(reps):
+        target = f"Preset {i % 2}"
+        focus.app = f"app{i % 2}.exe"
+        t0 = time.perf_counter()
+        done = sim.wait_for(lambda: engine.last_auto_uploaded_preset == target and engine.upload_idle.is_set(), timeout=10, interval=0.0005)
+        if not done: raise RuntimeError(f"switch to {target} did not complete")
+        samples.append(time.perf_counter() - t0)
+    return {f"switch.focus_to_upload[delay={engine.cfg_focus_delay:g}s]": summarize(samples)}
+
+def bench_audio(ctx, reps):
+    vm, audio = ctx["vm"], ctx["audio"]
+    results = {}
+    for count in (1, 16, 128):
+        audio.set_apps([f"background{i}.exe" for i in range(count - 1)] + ["target.exe"])
+        samples = []
+        for i in range(reps * 20):
+            action = "up" if i % 2 else "down"
+            t0 = time.perf_counter()
+            vm.AppAudioController.adjust_app_volume("target.exe", action)
+            samples.append(time.perf_counter() - t0)
+        results[f"audio.adjust_app_volume[sessions={count}]"] = summarize(samples)
+    return results
+
+def bench_macro(ctx, reps):
+    # Lateness of each step behind its scheduled time, plus trigger-to-first-key.
+    vm, audio = ctx["vm"], ctx["audio"]
+    runner = vm.MacroRunner()
+    steps, _ = vm.parse_macro(["a"] + ["wait 5", "b"] * 20)
+    late, start = [], []
+    for _ in range(reps):
+        audio.key_events.clear()
+        t0 = time.perf_counter()
+        runner.trigger("bench", steps, cancel_on_repress=False)
+        while runner.is_busy(): time.sleep(0.005)
+        times = [t for t, op, arg in audio.key_events]
+        start.append(times[0] - t0)
+        late += [max(0.0, t - (times[0] + 0.005 * i)) for i, t in enumerate(times)][1:]
+    return {"macro.trigger_to_first_key": summarize(start), "macro.step_late[wait 5]": summarize(late)}
+
+def bench_presets(ctx, reps):
+    vm, sim, engine = ctx["vm"], ctx["sim"], ctx["engine"]
+    results = {}
+    for count in (10, 100, 10000):
+        with open(vm.PRESETS_FILE, "w") as f: json.dump(sim.sample_presets(count), f, indent=4)
+        load, normalize = [], []
+        for _ in range(max(1, reps if count < 10000 else reps // 2)):
+            t0 = time.perf_counter()
+            presets = engine.load_presets()
+            t1 = time.perf_counter()
+            for data in presets.values(): vm.normalize_preset(data)
+            t2 = time.perf_counter()
+            load.append(t1 - t0)
+            normalize.append(t2 - t1)
+        results[f"presets.load[{count}]"] = summarize(load)
+        results[f"presets.normalize_all[{count}]"] = summarize(normalize)
+    with open(vm.PRESETS_FILE, "w") as f: json.dump(engine.presets, f, indent=4)
+    return results
+
+CASES = {"upload": bench_upload, "switch": bench_switch, "audio": bench_audio, "macro": bench_macro, "presets": bench_presets}
+
+def setup():
+    import sim_backends as sim
+    sim.install()
+    audio = sim.install_audio()
+    import vmacropad as vm
+    focus = sim.SimFocus()
+    engine = sim.make_engine(vm, presets=sim.sample_presets(2), mappings={"app0.exe": "Preset 0", "app1.exe": "Preset 1"}, focus=focus)
+    engine.save_presets_file()
+    engine.start()
+    engine.cfg_focus_delay = 0
+    engine.cfg_notify_preset = engine.cfg_notify_status = False
+    if not sim.wait_for(engine.pad.is_connected, timeout=10): raise RuntimeError("simulated pad did not connect")
+    engine.current_data, engine.led_mode = vm.normalize_preset(engine.presets["Preset 0"])
+    return {"vm": vm, "sim": sim, "audio": audio, "focus": focus, "engine": engine}
+
+# --- BASELINE ---
+def compare(results, baseline, tolerance):
+    regressions = []
+    for name, res in sorted(results.items()):
+        base = baseline.get("results", {}).get(name)
+        if not base:
+            print(f"{name:<44} {res['median']:10.3f} ms  (no baseline)")
+            continue
+        change = (res["median"] - base["median"]) / base["median"] if base["median"] else 0.0
+        flag = "REGRESSED" if change > tolerance else ""
+        if flag: regressions.append(name)
+        print(f"{name:<44} {res['median']:10.3f} ms  baseline {base['median']:10.3f} ms  {change:+7.1%} {flag}")
+    return regressions
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Run the VMacropad hot-path benchmarks.")
+    parser.add_argument("--only", action="append", choices=sorted(CASES), help="run only these cases")
+    parser.add_argument("--quick", action="store_true", help="fewer repetitions")
+    parser.add_argument("--out", help="write results JSON here")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="store these results as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args(argv)
+
+    reps = 3 if args.quick else 10
+    ctx = setup()
+    results = {}
+    try:
+        for name in args.only or CASES:
+            results.update(CASES[name](ctx, reps))
+    finally:
+        ctx["engine"].stop()
+
+    report = {
+        "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "version": ctx["vm"].CURRENT_VERSION,
+        "results": results,
+    }
+    if args.out:
+        with open(args.out, "w") as f: json.dump(report, f, indent=2)
+    if args.save_baseline:
+        with open(args.baseline, "w") as f: json.dump(report, f, indent=2)
+        print(f"Baseline saved to {args.baseline}")
+
+    baseline = {}
+    if not args.save_baseline and os.path.exists(args.baseline):
+        with open(args.baseline) as f: baseline = json.load(f)
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} case(s) regressed by more than {args.tolerance:.0%}")
+        return 1
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,63 @@
+# Slot text round-trip check. Every key, media usage, mouse button combination,
+# wheel action and a set of macros is parsed from its text form, checked with
+# validate_preset, formatted and parsed again; exits non-zero on any mismatch.
+#
+#   python tools/codec_check.py
+#   python tools/codec_check.py --verbose        # print each failing slot
+import itertools
+import os
+import sys
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+MACROS = [
+    "macro:ctrl+c; wait 50; ctrl+v",
+    "macro:down shift; type hello; up shift",
+    r"macro:type a\;b; type C:\\dir\\; enter",
+    r"macro:type \;\;",
+]
+
+def slot_texts(vm):
+    for name in vm.KEY_MAP: yield "ctrl+shift+" + name if name != "None" else name
+    for usage in vm.KEY_USAGES_EXTRA.values(): yield f"win+0x{usage:02x}"
+    for name in vm.MEDIA_MAP:
+        if name != "None": yield "media:" + name
+    yield "media:0x0223"
+    buttons = [name for name, bit in vm.MOUSE_BUTTONS.items() if bit]
+    for n in range(1, len(buttons) + 1):
+        for combo in itertools.combinations(buttons, n):
+            for wheel in vm.MOUSE_WHEEL:
+                yield "alt+mouse:" + ", ".join(combo + ((wheel,) if wheel != "None" else ()))
+    for wheel in vm.MOUSE_WHEEL:
+        if wheel != "None": yield "mouse:" + wheel
+    for action in ("up", "down", "mute"): yield f"app:spotify.exe {action}"
+    yield from MACROS
+
+def check(vm, text):
+    d = vm.parse_slot(text)
+    errors = vm.validate_preset({"keys": [d] + [vm.parse_slot("None")] * 5, "led": 1}, "3-Key + Knob")
+    if errors: return "; ".join(errors)
+    again = vm.parse_slot(vm.format_slot(d))
+    if again != d: return f"{vm.format_slot(d)!r} parses to {again!r}, not {d!r}"
+    return None
+
+def main(args):
+    import sim_backends
+    sim_backends.install()
+    import vmacropad as vm
+    checked = failed = 0
+    for text in slot_texts(vm):
+        checked += 1
+        try: problem = check(vm, text)
+        except ValueError as e: problem = f"does not parse: {e}"
+        if problem:
+            failed += 1
+            if "--verbose" in args: print(f"{text!r}: {problem}")
+    print(f"slots checked      {checked}")
+    print(f"round-trip errors  {failed}")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
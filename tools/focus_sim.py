@@ -0,0 +1,247 @@
+# Offline evaluation of the auto-switching policy. Feeds a focus timeline through the
+# real MacroEngine.app_monitor_tick on a virtual clock, with uploads going to the
+# simulated HID backend, and reports what the debounce settings cost.
+#
+#   python tools/focus_sim.py record focus.csv            # Windows: log real focus changes
+#   python tools/focus_sim.py run focus.csv --delay 0.25,0.5,1,2
+#   python tools/focus_sim.py run --synthetic 8 --seed 3 --waste-after 10
+#
+# Timelines are CSV lines "timestamp,app" (seconds; empty app = nothing focused).
+# Recorded timelines are evaluated against the presets and mappings in the app data
+# folder unless --library points elsewhere.
+import argparse
+import csv
+import json
+import math
+import os
+import random
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+# Resolved before sim_backends.install() points APPDATA at a scratch folder.
+USER_LIBRARY = os.path.join(os.getenv("APPDATA") or os.path.expanduser("~/.config"), "VMacropad")
+
+class VirtualClock:
+    def __init__(self, t=0.0): self.t = t
+    def __call__(self): return self.t
+
+# --- TIMELINES ---
+def load_timeline(path):
+    events = []
+    with open(path, newline="") as f:
+        for row in csv.reader(f):
+            if not row or row[0].startswith("#"): continue
+            events.append((float(row[0]), row[1] if len(row) > 1 and row[1] else None))
+    events.sort(key=lambda e: e[0])
+    return events
+
+def record_timeline(path, poll):
+    import vmacropad as vm
+    if not vm.user32: raise SystemExit("Recording needs Windows.")
+    print(f"Recording focus changes to {path} every {poll:g}s. Ctrl+C to stop.")
+    last = object()
+    with open(path, "a", newline="") as f:
+        try:
+            while True:
+                app = vm.get_active_app_process()
+                if app != last:
+                    f.write(f"{time.time():.3f},{app or ''}\n")
+                    f.flush()
+                    last = app
+                time.sleep(poll)
+        except KeyboardInterrupt: pass
+    return 0
+
+SYNTHETIC_MAPPED = {"code.exe": "Coding", "chrome.exe": "Browser", "photoshop.exe": "Editing", "game.exe": "Gaming"}
+SYNTHETIC_UNMAPPED = ["explorer.exe", "discord.exe", None]
+
+def synthetic_timeline(hours, seed):
+    # Long stretches in one app broken up by bursts of quick alt-tabs.
+    rng = random.Random(seed)
+    apps = list(SYNTHETIC_MAPPED) + SYNTHETIC_UNMAPPED
+    home = rng.choice(list(SYNTHETIC_MAPPED))
+    t, events = 0.0, []
+    while t < hours * 3600:
+        events.append((t, home))
+        t += rng.lognormvariate(math.log(90), 1.0)
+        if rng.random() < 0.4:
+            for _ in range(rng.randint(1, 4)):
+                events.append((t, rng.choice(apps)))
+                t += rng.uniform(0.3, 4.0)
+        if rng.random() < 0.3: home = rng.choice(apps)
+    events.append((t, home))
+    return events
+
+def synthetic_library(sim):
+    names = sorted(set(SYNTHETIC_MAPPED.values())) + ["Default"]
+    presets = dict(zip(names, sim.sample_presets(len(names)).values()))
+    return presets, dict(SYNTHETIC_MAPPED), "Default"
+
+def load_library(folder):
+    def read(name, fallback):
+        path = os.path.join(folder, name)
+        if not os.path.exists(path): return fallback
+        with open(path) as f: return json.load(f)
+    presets = read("presets.json", None)
+    if not presets: raise SystemExit(f"No presets found in {folder}; pass --library.")
+    return presets, read("mappings.json", {}), read("config.json", {}).get("default_preset")
+
+# --- SIMULATION ---
+def simulate(vm, sim, bus, library, events, delay, poll=0.25, write_ms=0.0, tail=5.0):
+    presets, mappings, default = library
+    focus = sim.SimFocus()
+    clock = VirtualClock(events[0][0])
+    engine = sim.make_engine(vm, presets=presets, mappings=mappings, focus=focus)
+    engine.cfg_focus_delay = delay
+    engine.default_preset_name = default
+    engine.save_config_state = lambda: None
+    engine.clock = clock
+    if not engine.pad.connect(): raise RuntimeError("simulated pad did not connect")
+    engine.connected_last_frame = True
+
+    # Uploads run inline; their sleeps and per-write latency accumulate into a
+    # duration and the upload completes when the virtual clock reaches it.
+    cost = [0.0]
+    engine.sleep = lambda d: cost.__setitem__(0, cost[0] + d)
+    stats = {"uploads": 0, "failed": 0, "flash_commits": 0}
+    pending, applied = [], []
+    pad = engine.pad
+    write_data, save_to_flash = pad.write_data, pad.save_to_flash
+    def timed_write(payload):
+        cost[0] += write_ms / 1000.0
+        return write_data(payload)
+    def counted_flash():
+        stats["flash_commits"] += 1
+        return save_to_flash()
+    pad.write_data, pad.save_to_flash = timed_write, counted_flash
+
+    finish = engine.upload_finished
+    engine.upload_finished = lambda success: pending.append((clock.t + cost[0], engine.current_preset_name, success)) or success
+    def start_upload():
+        if not engine.begin_upload(): return
+        stats["uploads"] += 1
+        cost[0] = 0.0
+        engine._upload_thread()
+        for dev in bus.open_devices: dev.frames.clear()
+    engine.start_upload = start_upload
+
+    start, end = events[0][0], events[-1][0] + tail
+    i, k = 0, 0
+    while True:
+        t = start + k * poll
+        if t > end: break
+        clock.t = t
+        while i < len(events) and events[i][0] <= t:
+            focus.app = events[i][1]
+            i += 1
+        while pending and pending[0][0] <= t:
+            done, preset, success = pending.pop(0)
+            finish(success)
+            if success: applied.append((done, preset))
+            else: stats["failed"] += 1
+        # Ticks only run while the engine would keep its focus poll scheduled.
+        if engine.wants_focus_poll(): engine.app_monitor_tick()
+        k += 1
+    stats["prediction"] = engine.focus_history.stats()
+    engine.stop()
+    pad.mark_disconnected()
+    return stats, applied, (start, end)
+
+def desired_timeline(events, library):
+    presets, mappings, default = library
+    if default not in presets: default = None
+    out = []
+    for t, app in events:
+        target = mappings.get(app) if app else None
+        if target not in presets: target = default
+        if not out or out[-1][1] != target: out.append((t, target))
+    return out
+
+def evaluate(events, library, stats, applied, span, waste_after):
+    start, end = span
+    desired = desired_timeline(events, library)
+    wrong, last = 0.0, start
+    cur = {0: None, 1: None}
+    for t, which, preset in sorted([(t, 0, p) for t, p in desired] + [(t, 1, p) for t, p in applied], key=lambda c: (c[0], c[1])):
+        if cur[0] is not None and cur[0] != cur[1]: wrong += t - last
+        last, cur[which] = t, preset
+    if cur[0] is not None and cur[0] != cur[1]: wrong += end - last
+    wasted = sum(1 for a, b in zip(applied, applied[1:]) if b[0] - a[0] < waste_after)
+    return {
+        "focus_changes": len(events),
+        "needed_switches": sum(1 for _, p in desired if p is not None),
+        "uploads": stats["uploads"],
+        "failed_uploads": stats["failed"],
+        "wasted_uploads": wasted,
+        "flash_commits": stats["flash_commits"],
+        "prediction_hit_rate": stats["prediction"]["hit_rate"],
+        "wrong_preset_s": round(wrong, 2),
+        "wrong_preset_pct": round(100.0 * wrong / max(end - start, 1e-9), 3),
+        "span_s": round(end - start, 1),
+    }
+
+def run(args):
+    import sim_backends as sim
+    user_library = load_library(args.library) if args.library else None
+    if args.synthetic:
+        events = synthetic_timeline(args.synthetic, args.seed)
+    elif args.timeline:
+        events = load_timeline(args.timeline)
+        if not user_library: user_library = load_library(USER_LIBRARY)
+    else: raise SystemExit("Give a timeline file or --synthetic HOURS.")
+    if not events: raise SystemExit("Timeline is empty.")
+
+    bus = sim.install()
+    import vmacropad as vm
+    library = user_library or synthetic_library(sim)
+    if args.no_mappings: library = (library[0], {}, library[2])
+
+    results = []
+    for delay in [float(d) for d in args.delay.split(",")]:
+        stats, applied, span = simulate(vm, sim, bus, library, events, delay, args.poll, args.write_ms)
+        row = evaluate(events, library, stats, applied, span, args.waste_after)
+        row["delay_s"] = delay
+        results.append(row)
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return 0
+    first = results[0]
+    print(f"{first['focus_changes']} focus changes over {first['span_s'] / 3600:.2f} h, {first['needed_switches']} preset changes needed")
+    print(f"{'delay':>7} {'uploads':>8} {'wasted':>7} {'failed':>7} {'flash':>6} {'wrong preset':>16} {'predicted':>10}")
+    for r in results:
+        hit_rate = "-" if r["prediction_hit_rate"] is None else f"{r['prediction_hit_rate']:.0%}"
+        print(f"{r['delay_s']:>6g}s {r['uploads']:>8} {r['wasted_uploads']:>7} {r['failed_uploads']:>7} {r['flash_commits']:>6} {r['wrong_preset_s']:>9.1f}s {r['wrong_preset_pct']:>5.2f}% {hit_rate:>10}")
+    print(f"(wasted = replaced within {args.waste_after:g}s)")
+    over = [r for r in results if args.max_wrong_pct is not None and r["wrong_preset_pct"] > args.max_wrong_pct]
+    for r in over: print(f"delay {r['delay_s']:g}s: wrong preset {r['wrong_preset_pct']:.2f}% over the {args.max_wrong_pct:g}% limit")
+    return 1 if over else 0
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Replay focus timelines through the VMacropad switching logic.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    rec = sub.add_parser("record", help="log foreground app changes (Windows)")
+    rec.add_argument("timeline")
+    rec.add_argument("--poll", type=float, default=0.25)
+    play = sub.add_parser("run", help="simulate a timeline")
+    play.add_argument("timeline", nargs="?")
+    play.add_argument("--synthetic", type=float, metavar="HOURS", help="generate a synthetic timeline instead")
+    play.add_argument("--seed", type=int, default=1)
+    play.add_argument("--library", help="folder with presets.json/mappings.json/config.json")
+    play.add_argument("--delay", default="0.5", help="comma-separated focus delays to compare (seconds)")
+    play.add_argument("--poll", type=float, default=0.25, help="focus poll interval (seconds)")
+    play.add_argument("--write-ms", type=float, default=1.0, help="modelled latency per HID write")
+    play.add_argument("--waste-after", type=float, default=5.0, help="uploads replaced sooner than this count as wasted")
+    play.add_argument("--no-mappings", action="store_true", help="drop the app links and rely on the default preset alone")
+    play.add_argument("--max-wrong-pct", type=float, help="exit non-zero when time on the wrong preset exceeds this share")
+    play.add_argument("--json", action="store_true")
+    args = parser.parse_args(argv)
+    if args.command == "record": return record_timeline(args.timeline, args.poll)
+    return run(args)
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,81 @@
+# Replays a HID trace recorded with "vmacropad.py ctl trace on" against a real pad
+# or the simulated backend, at the original pacing or sped up.
+#
+#   python tools/hid_replay.py hid-trace.vmht --sim
+#   python tools/hid_replay.py hid-trace.vmht --speed 4 --vid 0x1189 --pid 0x8890
+#   python tools/hid_replay.py hid-trace.vmht --sim --ok-only --speed 0
+import argparse
+import os
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+sys.path.insert(0, os.path.dirname(HERE))
+
+def open_device(args):
+    import vmacropad as vm
+    pad = vm.MacroPadDevice(args.vid, args.pid)
+    if not pad.connect(): raise SystemExit("No macropad found.")
+    return vm, pad.device
+
+def send(vm, device, kind, payload):
+    buf = list(payload) + [0] * (65 - len(payload))
+    try:
+        if kind == vm.TRACE_FRAME_OUTPUT: return device.write(buf)
+        return device.send_feature_report(buf)
+    except Exception:
+        return -1
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Replay a VMacropad HID trace.")
+    parser.add_argument("trace")
+    parser.add_argument("--speed", type=float, default=1.0, help="timing multiplier; 0 sends back to back")
+    parser.add_argument("--sim", action="store_true", help="replay against the simulated HID backend")
+    parser.add_argument("--sim-latency", type=float, default=0.0, help="simulated per-write latency in seconds")
+    parser.add_argument("--ok-only", action="store_true", help="skip attempts that failed when recorded")
+    parser.add_argument("--vid", type=lambda v: int(v, 0), default=0x1189)
+    parser.add_argument("--pid", type=lambda v: int(v, 0), default=0x8890)
+    args = parser.parse_args(argv)
+
+    if args.sim:
+        import sim_backends
+        sim_backends.install(write_latency=args.sim_latency)
+    vm, device = open_device(args)
+
+    records = list(vm.read_hid_trace(args.trace))
+    frames = [r for r in records if r[1] in (vm.TRACE_FRAME_OUTPUT, vm.TRACE_FRAME_FEATURE)]
+    if args.ok_only: frames = [r for r in frames if r[2] > 0]
+    if not frames:
+        print("Trace contains no frames.")
+        return 0
+
+    sent = mismatched = failed = 0
+    write_times = []
+    base_t = frames[0][0]
+    start = time.monotonic()
+    for t, kind, result, payload in frames:
+        if args.speed > 0:
+            due = start + (t - base_t) / args.speed
+            delay = due - time.monotonic()
+            if delay > 0: time.sleep(delay)
+        t0 = time.perf_counter()
+        res = send(vm, device, kind, payload)
+        write_times.append(time.perf_counter() - t0)
+        sent += 1
+        if res < 0: failed += 1
+        if (res >= 0) != (result > 0): mismatched += 1
+    wall = time.monotonic() - start
+
+    write_times.sort()
+    pct = lambda q: write_times[min(len(write_times) - 1, int(q * len(write_times)))] * 1000
+    print(f"frames sent        {sent} ({len(records) - len(frames)} connect/disconnect markers skipped)")
+    print(f"recorded span      {(frames[-1][0] - base_t) * 1000:.1f} ms")
+    print(f"replay wall time   {wall * 1000:.1f} ms (speed {args.speed:g})")
+    print(f"write p50/p99/max  {pct(0.5):.3f} / {pct(0.99):.3f} / {write_times[-1] * 1000:.3f} ms")
+    print(f"failed writes      {failed}")
+    print(f"result mismatches  {mismatched}")
+    return 1 if mismatched else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,170 @@
+# Stand-in backends for running vmacropad headless (Linux CI, benchmarks, soak runs).
+# install() and install_audio() must be called before vmacropad is imported so the
+# engine picks up the simulated modules; the focus stand-in is attached to an engine.
+import importlib.machinery
+import os
+import sys
+import tempfile
+import time
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# --- SIMULATED HID ---
+class SimHidDevice:
+    def __init__(self, bus, write_latency=0.0):
+        self.bus = bus
+        self.write_latency = write_latency
+        self.path = None
+        self.frames = []
+        self.fail_output = False
+
+    def open_path(self, path):
+        if path not in self.bus.paths(): raise OSError("open failed")
+        self.path = path
+        self.bus.open_devices.append(self)
+
+    def set_nonblocking(self, flag): pass
+
+    def _send(self, buf):
+        if self.write_latency: time.sleep(self.write_latency)
+        if self.path not in self.bus.paths(): return -1
+        self.frames.append(bytes(buf))
+        return len(buf)
+
+    def write(self, buf):
+        if self.fail_output: return -1
+        return self._send(buf)
+
+    def send_feature_report(self, buf): return self._send(buf)
+
+    def close(self):
+        if self in self.bus.open_devices: self.bus.open_devices.remove(self)
+
+class SimHidBus:
+    def __init__(self, write_latency=0.0):
+        self.write_latency = write_latency
+        self.devices = []
+        self.open_devices = []
+        self.plug()
+
+    def plug(self, serial="SIM0001", interface=1):
+        path = f"sim://{serial}/mi_0{interface}".encode()
+        self.devices.append({"path": path, "interface_number": interface, "serial_number": serial, "vendor_id": 0x1189, "product_id": 0x8890})
+        return path
+
+    def unplug(self, serial=None):
+        self.devices = [d for d in self.devices if serial is not None and d["serial_number"] != serial]
+
+    def paths(self):
+        return [d["path"] for d in self.devices]
+
+    def module(self):
+        mod = types.ModuleType("hid")
+        mod.enumerate = lambda vid=0, pid=0: [dict(d) for d in self.devices if d["vendor_id"] == vid and d["product_id"] == pid]
+        mod.device = lambda: SimHidDevice(self, self.write_latency)
+        return mod
+
+    def frames(self):
+        out = []
+        for dev in self.open_devices: out.extend(dev.frames)
+        return out
+
+# --- SIMULATED FOCUS ---
+class SimFocus:
+    def __init__(self, app=None):
+        self.app = app
+    def __call__(self, force=False): return self.app
+
+# --- SIMULATED AUDIO (pycaw/comtypes/keyboard) ---
+class SimVolume:
+    def __init__(self):
+        self.level = 0.5
+        self.muted = False
+    def GetMute(self): return self.muted
+    def SetMute(self, muted, ctx): self.muted = bool(muted)
+    def GetMasterVolume(self): return self.level
+    def SetMasterVolume(self, level, ctx): self.level = level
+
+class SimProcess:
+    def __init__(self, name): self._name = name
+    def name(self): return self._name
+
+class SimSession:
+    def __init__(self, name):
+        self.Process = SimProcess(name) if name else None
+        self.SimpleAudioVolume = SimVolume()
+
+class SimAudio:
+    def __init__(self, apps=()):
+        self.sessions = []
+        self.sent_keys = []
+        self.key_events = []
+        self.hotkeys = {}
+        self.set_apps(apps)
+
+    def set_apps(self, apps):
+        self.sessions = [SimSession(None)] + [SimSession(a) for a in apps]
+
+    def session(self, app):
+        return next(s for s in self.sessions if s.Process and s.Process.name() == app)
+
+    def modules(self):
+        def module(name, **attrs):
+            mod = types.ModuleType(name)
+            mod.__spec__ = importlib.machinery.ModuleSpec(name, None)
+            mod.__dict__.update(attrs)
+            return mod
+        utilities = type("AudioUtilities", (), {"GetAllSessions": staticmethod(lambda: list(self.sessions))})
+        pycaw_inner = module("pycaw.pycaw", AudioUtilities=utilities, IAudioEndpointVolume=object, ISimpleAudioVolume=object)
+        def add_hotkey(hotkey, cb, suppress=False):
+            self.hotkeys[hotkey] = cb
+            return hotkey
+        def key_event(op):
+            def record(arg):
+                self.key_events.append((time.perf_counter(), op, arg))
+                if op == "send": self.sent_keys.append(arg)
+            return record
+        return {
+            "pycaw": module("pycaw", pycaw=pycaw_inner),
+            "pycaw.pycaw": pycaw_inner,
+            "comtypes": module("comtypes", CLSCTX_ALL=23, CoInitialize=lambda: None, CoUninitialize=lambda: None),
+            "keyboard": module("keyboard", send=key_event("send"), press=key_event("press"), release=key_event("release"),
+                               write=key_event("write"), is_pressed=lambda key: False, add_hotkey=add_hotkey,
+                               remove_hotkey=lambda hk: self.hotkeys.pop(hk, None), unhook_all=self.hotkeys.clear),
+        }
+
+def install_audio(apps=()):
+    audio = SimAudio(apps)
+    sys.modules.update(audio.modules())
+    return audio
+
+def install(write_latency=0.0, app_data=None):
+    bus = SimHidBus(write_latency)
+    sys.modules["hid"] = bus.module()
+    os.environ["APPDATA"] = app_data or tempfile.mkdtemp(prefix="vmacropad-sim-")
+    if ROOT not in sys.path: sys.path.insert(0, ROOT)
+    return bus
+
+def make_engine(vm, presets=None, mappings=None, focus=None):
+    engine = vm.MacroEngine()
+    engine.cfg_startup = False
+    engine.cfg_check_updates = False
+    if presets is not None: engine.presets = presets
+    if mappings is not None: engine.app_mappings = mappings
+    if focus is not None: engine.get_foreground_app = focus
+    return engine
+
+def sample_presets(count, slots=6):
+    presets = {}
+    for i in range(count):
+        keys = [{"type": "key", "mod": (i + s) % 16, "code": 4 + (i + s) % 26} for s in range(slots)]
+        presets[f"Preset {i}"] = {"keys": keys, "led": 1, "color": "#%06x" % (i * 2654435761 % 0xFFFFFF)}
+    return presets
+
+def wait_for(predicate, timeout=5.0, interval=0.005):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate(): return True
+        time.sleep(interval)
+    return predicate()
@@ -0,0 +1,261 @@
+# Long-running soak and stress harness. Drives the real engine against the simulated
+# hid, focus and audio backends with the focus debounce on a virtual clock, so days
+# of focus changes, replugs and knob turns run back to back. Samples thread count,
+# open handles, simulated HID handles, live hotkeys, traced Python memory and
+# focus-to-upload latency as it goes, and fails when any of them grows past a limit.
+#
+#   python tools/soak.py                                  # 20k focus changes
+#   python tools/soak.py --steps 2000000 --samples 40     # overnight
+#   python tools/soak.py --reconnect-rate 0.05 --knob-rate 1 --out soak.json
+#
+# Growth is measured from the first sample after --warmup steps to the last one.
+import argparse
+import gc
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+import tracemalloc
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+from focus_sim import VirtualClock
+
+PRIMARY, EXTRA = "SIM0001", "SIM0002"
+
+# --- LIBRARY ---
+def soak_library(sim, count, apps):
+    # Knob and key-4 slots alternate between app-volume targets and macros, so every
+    # switch adds, removes or rebinds trigger hotkeys.
+    presets = sim.sample_presets(count)
+    for i, data in enumerate(presets.values()):
+        target = f"media{i % 3}.exe"
+        data["keys"][3] = {"type": "app_vol", "app": target, "action": "down"}
+        data["keys"][4] = {"type": "app_vol", "app": target, "action": "up"}
+        if i % 2: data["keys"][5] = {"type": "macro", "steps": ["ctrl+c", "wait 1", "type ok"]}
+    names = list(presets)
+    mappings = {f"app{i}.exe": names[i % count] for i in range(apps)}
+    return presets, mappings
+
+# --- PROBES ---
+def open_handles():
+    if sys.platform == "win32":
+        import ctypes
+        count = ctypes.c_ulong()
+        ctypes.windll.kernel32.GetProcessHandleCount(ctypes.windll.kernel32.GetCurrentProcess(), ctypes.byref(count))
+        return count.value
+    if os.path.isdir("/proc/self/fd"): return len(os.listdir("/proc/self/fd"))
+    return None
+
+def percentile(samples, q):
+    if not samples: return None
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+class Soak:
+    def __init__(self, args):
+        import sim_backends as sim
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.bus = sim.install()
+        self.audio = sim.install_audio([f"media{i}.exe" for i in range(3)])
+        import vmacropad as vm
+        self.vm, self.sim = vm, sim
+        vm.METRICS.enabled = True
+        presets, mappings = soak_library(sim, args.presets, args.apps)
+        self.apps = list(mappings) + ["explorer.exe", None]
+        self.focus = sim.SimFocus()
+        self.clock = VirtualClock(0.0)
+        focus = self.focus
+        if args.process_lookup:
+            # Windows: also run the OpenProcess name lookup on every poll so its handle use shows up.
+            focus = lambda force=False: (vm.get_process_name_by_pid_ctypes(os.getpid()), self.focus(force))[1]
+        engine = sim.make_engine(vm, presets=presets, mappings=mappings, focus=focus)
+        engine.cfg_notify_preset = engine.cfg_notify_status = False
+        engine.clock = self.clock
+        engine.sleep = lambda d: None
+        # The harness runs the polls itself; uploads, pad workers and macros keep their threads.
+        engine.update_polling = lambda: None
+        self.engine = engine
+        self.latency = []
+        self.samples = []
+        self.counts = {"focus": 0, "switches": 0, "reconnects": 0, "extra_pad": 0, "knob": 0, "stalls": 0}
+        self.new_apps = 0
+
+    def start(self):
+        engine = self.engine
+        engine.save_presets_file()
+        engine.save_mappings_file()
+        engine.start()
+        if not self.sim.wait_for(engine.pad.is_connected, timeout=10): raise RuntimeError("simulated pad did not connect")
+        engine.scheduler.cancel("check_conn")
+        self.settle()
+
+    def settle(self, timeout=5.0):
+        engine = self.engine
+        ok = engine.upload_idle.wait(timeout) and engine.devices.wait_idle(timeout)
+        ok = self.sim.wait_for(lambda: not engine.macros.is_busy(), timeout) and ok
+        if not ok: self.counts["stalls"] += 1
+        return ok
+
+    # --- Actions ---
+    def focus_change(self):
+        engine, delay = self.engine, self.engine.cfg_focus_delay
+        if self.rng.random() < self.args.new_app_rate:
+            self.new_apps += 1
+            app = f"new{self.new_apps}.exe"
+        else: app = self.rng.choice(self.apps)
+        self.focus.app = app
+        self.counts["focus"] += 1
+        before = engine.last_auto_uploaded_preset
+        t0 = time.perf_counter()
+        engine.app_monitor_tick()
+        self.clock.t += delay + 0.25
+        engine.app_monitor_tick()
+        if engine.last_auto_uploaded_preset != before:
+            self.settle()
+            self.latency.append(time.perf_counter() - t0)
+            self.counts["switches"] += 1
+        self.clock.t += self.rng.uniform(0.5, 120.0)
+
+    def reconnect(self):
+        self.bus.unplug(PRIMARY)
+        self.engine.check_conn_tick()
+        self.bus.plug(PRIMARY)
+        self.engine.check_conn_tick()
+        self.settle()
+        self.counts["reconnects"] += 1
+
+    def toggle_extra_pad(self):
+        if any(d["serial_number"] == EXTRA for d in self.bus.devices):
+            self.bus.devices = [d for d in self.bus.devices if d["serial_number"] != EXTRA]
+        else: self.bus.plug(EXTRA)
+        self.engine.check_conn_tick()
+        self.settle()
+        self.counts["extra_pad"] += 1
+
+    def knob(self):
+        live = list(self.audio.hotkeys.values())
+        for _ in range(self.rng.randint(1, 5)):
+            if live: self.rng.choice(live)()
+        self.counts["knob"] += 1
+
+    def step(self):
+        args, rng = self.args, self.rng
+        self.focus_change()
+        if rng.random() < args.knob_rate: self.knob()
+        if rng.random() < args.reconnect_rate: self.reconnect()
+        if rng.random() < args.extra_pad_rate: self.toggle_extra_pad()
+
+    # --- Sampling ---
+    def sample(self, step, t0):
+        self.settle()
+        gc.collect()
+        window, self.latency = self.latency, []
+        row = {
+            "step": step,
+            "elapsed_s": round(time.perf_counter() - t0, 1),
+            "threads": threading.active_count(),
+            "handles": open_handles(),
+            "hid_open": len(self.bus.open_devices),
+            "extra_pads": len(self.engine.devices.pads),
+            "hotkeys": len(self.audio.hotkeys),
+            "traced_mb": round(tracemalloc.get_traced_memory()[0] / 1e6, 3) if tracemalloc.is_tracing() else None,
+            "switches": len(window),
+            "p50_ms": None if not window else round(statistics.median(window) * 1000, 3),
+            "p99_ms": None if not window else round(percentile(window, 0.99) * 1000, 3),
+        }
+        self.samples.append(row)
+        return row
+
+    def run(self):
+        args = self.args
+        if not args.no_tracemalloc: tracemalloc.start(args.trace_frames)
+        self.start()
+        every = max(1, args.steps // args.samples)
+        warmup = min(args.warmup, args.steps - 1)
+        baseline_snapshot = None
+        print(f"{'step':>9} {'secs':>7} {'threads':>7} {'handles':>7} {'hid':>4} {'hotkeys':>7} {'traced MB':>9} {'p50 ms':>8} {'p99 ms':>8}")
+        t0 = time.perf_counter()
+        try:
+            for step in range(1, args.steps + 1):
+                self.step()
+                if step == warmup or step % every == 0 or step == args.steps:
+                    row = self.sample(step, t0)
+                    if step == warmup:
+                        row["baseline"] = True
+                        if tracemalloc.is_tracing(): baseline_snapshot = tracemalloc.take_snapshot()
+                    fmt = lambda v, w, p=0: f"{'-':>{w}}" if v is None else f"{v:>{w}.{p}f}"
+                    print(f"{step:>9} {row['elapsed_s']:>7.1f} {row['threads']:>7} {fmt(row['handles'], 7)} {row['hid_open']:>4} {row['hotkeys']:>7} "
+                          f"{fmt(row['traced_mb'], 9, 3)} {fmt(row['p50_ms'], 8, 3)} {fmt(row['p99_ms'], 8, 3)}{'  baseline' if step == warmup else ''}")
+        finally:
+            final_snapshot = tracemalloc.take_snapshot() if tracemalloc.is_tracing() else None
+            self.engine.stop()
+        return self.check(baseline_snapshot, final_snapshot)
+
+    # --- Limits ---
+    def check(self, baseline_snapshot, final_snapshot):
+        args = self.args
+        base = next(r for r in self.samples if r.get("baseline"))
+        last = self.samples[-1]
+        timed = [r for r in self.samples if r["p99_ms"] is not None and r["step"] >= base["step"]]
+        # Each extra pad legitimately holds a worker thread and a device handle.
+        grown = lambda key: (last[key] - last["extra_pads"]) - (base[key] - base["extra_pads"])
+        limits = [
+            ("threads", grown("threads"), args.max_thread_growth, ""),
+            ("hid_open", grown("hid_open"), 0, ""),
+            ("hotkeys", last["hotkeys"], args.max_hotkeys, ""),
+        ]
+        if base["handles"] is not None: limits.append(("handles", last["handles"] - base["handles"], args.max_handle_growth, ""))
+        if base["traced_mb"] is not None: limits.append(("traced_mb", round(last["traced_mb"] - base["traced_mb"], 3), args.max_mem_growth_mb, " MB"))
+        if len(timed) >= 2 and timed[0]["p99_ms"]:
+            limits.append(("p99_growth", round(timed[-1]["p99_ms"] / timed[0]["p99_ms"], 2), args.max_latency_growth, "x"))
+        if timed: limits.append(("p99_ms", max(r["p99_ms"] for r in timed), args.max_p99_ms, " ms"))
+        limits.append(("stalls", self.counts["stalls"], 0, ""))
+
+        print(", ".join(f"{k} {v}" for k, v in self.counts.items()) + f", new apps {self.new_apps}")
+        failed = []
+        for name, value, limit, unit in limits:
+            over = value > limit
+            if over: failed.append(name)
+            print(f"{name:<12} {value:>10}{unit:<3} limit {limit}{unit}  {'OVER' if over else 'ok'}")
+        if "traced_mb" in failed and baseline_snapshot and final_snapshot:
+            print("largest allocation growth since baseline:")
+            for stat in final_snapshot.compare_to(baseline_snapshot, "lineno")[:10]: print(f"  {stat}")
+        if args.out:
+            with open(args.out, "w") as f:
+                json.dump({"args": vars(args), "counts": self.counts, "samples": self.samples, "failed": failed}, f, indent=2)
+        if failed: print(f"{len(failed)} limit(s) exceeded: {', '.join(failed)}")
+        return 1 if failed else 0
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Soak the VMacropad engine with simulated switching, replugs and knob turns.")
+    parser.add_argument("--steps", type=int, default=20000, help="focus changes to drive")
+    parser.add_argument("--samples", type=int, default=20, help="resource samples over the run")
+    parser.add_argument("--warmup", type=int, default=1000, help="step of the baseline sample")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--presets", type=int, default=8)
+    parser.add_argument("--apps", type=int, default=24, help="mapped apps")
+    parser.add_argument("--knob-rate", type=float, default=0.3, help="chance of knob turns after a focus change")
+    parser.add_argument("--reconnect-rate", type=float, default=0.01, help="chance of a replug after a focus change")
+    parser.add_argument("--extra-pad-rate", type=float, default=0.005, help="chance of plugging or unplugging a second pad")
+    parser.add_argument("--new-app-rate", type=float, default=0.001, help="chance the focused app was never seen before")
+    parser.add_argument("--process-lookup", action="store_true", help="call the Windows process-name lookup on every focus poll")
+    parser.add_argument("--no-tracemalloc", action="store_true", help="skip traced memory (runs faster)")
+    parser.add_argument("--trace-frames", type=int, default=1)
+    parser.add_argument("--max-thread-growth", type=int, default=2)
+    parser.add_argument("--max-handle-growth", type=int, default=16)
+    parser.add_argument("--max-hotkeys", type=int, default=12)
+    parser.add_argument("--max-mem-growth-mb", type=float, default=8.0)
+    parser.add_argument("--max-latency-growth", type=float, default=3.0, help="last/first window p99 ratio")
+    parser.add_argument("--max-p99-ms", type=float, default=250.0)
+    parser.add_argument("--out", help="write samples JSON here")
+    args = parser.parse_args(argv)
+    return Soak(args).run()
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
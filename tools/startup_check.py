@@ -0,0 +1,60 @@
+# Startup-time regression check. Boots the service headless against the simulated
+# HID backend in a fresh interpreter and fails when any phase exceeds its budget.
+#
+#   python tools/startup_check.py                 # default budgets
+#   python tools/startup_check.py --budget first_upload=800 --budget import=150
+import json
+import os
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, HERE)
+
+# Milliseconds since vmacropad started importing.
+DEFAULT_BUDGETS_MS = {
+    "import": 250,
+    "engine_start": 400,
+    "first_connect": 900,
+    "first_upload": 1500,
+}
+
+def measure():
+    import sim_backends
+    sim_backends.install()
+    import vmacropad as vm
+    engine = sim_backends.make_engine(vm, presets=sim_backends.sample_presets(10))
+    engine.start()
+    sim_backends.wait_for(lambda: "first_upload" in engine.startup.marks, timeout=10)
+    engine.stop()
+    print(json.dumps(engine.startup.report()))
+
+def parse_budgets(args):
+    budgets = dict(DEFAULT_BUDGETS_MS)
+    for i, arg in enumerate(args):
+        if arg == "--budget" and i + 1 < len(args):
+            phase, _, value = args[i + 1].partition("=")
+            budgets[phase] = float(value)
+    return budgets
+
+def main(args):
+    if "--child" in args: return measure()
+    budgets = parse_budgets(args)
+    t0 = time.perf_counter()
+    out = subprocess.run([sys.executable, os.path.abspath(__file__), "--child"], capture_output=True, text=True, timeout=60)
+    if out.returncode != 0:
+        sys.stderr.write(out.stderr)
+        return 2
+    phases = json.loads(out.stdout.strip().splitlines()[-1])
+    failed = False
+    for phase, budget in budgets.items():
+        value = phases.get(phase)
+        status = "missing" if value is None else ("ok" if value <= budget else "OVER")
+        if status != "ok": failed = True
+        print(f"{phase:<14} {'-' if value is None else f'{value:8.1f}'} ms  budget {budget:8.1f} ms  {status}")
+    print(f"process wall time {(time.perf_counter() - t0) * 1000:.0f} ms")
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
@@ -0,0 +1,66 @@
+# Local stand-in for the GitHub "latest release" endpoint, for exercising the update
+# check without touching the real API. Answers conditional requests with 304 and logs
+# every request so the number of round trips can be checked.
+#
+#   python tools/update_server.py --tag v9.9.9 --port 8765
+#   set VMACROPAD_UPDATE_URL=http://127.0.0.1:8765/releases/latest
+#   python vmacropad.py ctl update check
+import argparse
+import hashlib
+import json
+import sys
+import threading
+from email.utils import formatdate
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class ReleaseServer(ThreadingHTTPServer):
+    def __init__(self, port=0, tag="v9.9.9", quiet=False):
+        super().__init__(("127.0.0.1", port), ReleaseHandler)
+        self.quiet = quiet
+        self.requests = []
+        self.set_release(tag)
+
+    def set_release(self, tag):
+        self.body = json.dumps({"tag_name": tag, "html_url": f"https://github.com/visiuun/VMacropad/releases/tag/{tag}"}).encode()
+        self.etag = '"' + hashlib.sha1(self.body).hexdigest()[:16] + '"'
+        self.last_modified = formatdate(usegmt=True)
+
+    @property
+    def url(self): return f"http://127.0.0.1:{self.server_address[1]}/releases/latest"
+
+    def start(self):
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+        return self
+
+class ReleaseHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        srv = self.server
+        not_modified = self.headers.get("If-None-Match") == srv.etag
+        srv.requests.append({"etag": self.headers.get("If-None-Match"), "since": self.headers.get("If-Modified-Since"), "status": 304 if not_modified else 200})
+        self.send_response(304 if not_modified else 200)
+        self.send_header("ETag", srv.etag)
+        self.send_header("Last-Modified", srv.last_modified)
+        if not_modified:
+            self.end_headers()
+            return
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(srv.body)))
+        self.end_headers()
+        self.wfile.write(srv.body)
+
+    def log_message(self, fmt, *args):
+        if not self.server.quiet: sys.stderr.write("%s %s\n" % (self.log_date_time_string(), fmt % args))
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Serve a fake latest-release document for update-check testing.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--tag", default="v9.9.9")
+    args = parser.parse_args(argv)
+    srv = ReleaseServer(args.port, args.tag)
+    print(f"Serving {args.tag} at {srv.url}")
+    try: srv.serve_forever()
+    except KeyboardInterrupt: pass
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
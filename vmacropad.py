@@ -1,27 +1,28 @@
-import customtkinter as ctk
-import tkinter as tk
-from tkinter import messagebox, colorchooser
-import hid
+import time
+PROCESS_T0 = time.perf_counter()
 import json
 import os
-import time
 import threading
 import sys
 import math
 import subprocess
 import webbrowser
 import ctypes
+import importlib.util
 from ctypes import wintypes
-from PIL import Image, ImageDraw
-import pystray
+from multiprocessing.connection import Listener, Client
 import re
+import struct
+import heapq
+import hashlib
+from collections import deque, namedtuple
 
 # --- CONSOLE HIDER FAILSAFE ---
 try:
     if getattr(sys, 'frozen', False):
         import ctypes
         ctypes.windll.user32.ShowWindow(ctypes.windll.kernel32.GetConsoleWindow(), 0)
-except:
+except Exception:
     pass
 
 # --- VERSION INFO ---
@@ -29,9 +30,13 @@ CURRENT_VERSION = "v1.0.6"
 GITHUB_REPO_API = "https://api.github.com/repos/visiuun/VMacropad/releases/latest"
 
 # --- DEPENDENCIES CHECK ---
+# Only hid and psutil sit on the hot path and are imported eagerly. Everything else
+# is checked with find_spec (no import) and loaded by the load_* helpers on first use.
+hid = None
+Image = None
+ImageDraw = None
+pystray = None
 psutil = None
-win32gui = None
-win32process = None
 win32com = None
 keyboard = None
 AudioUtilities = None
@@ -43,73 +48,101 @@ requests = None
 
 MISSING_LIBS = []
 
-try:
-    import psutil
-    import win32gui
-    import win32process
-    import win32com.client
-except ImportError:
-    MISSING_LIBS.append("psutil/pywin32")
+def _has_modules(*names):
+    try: return all(importlib.util.find_spec(n) is not None for n in names)
+    except (ImportError, ValueError): return False
 
 try:
-    import keyboard
-    from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume, ISimpleAudioVolume
-    from comtypes import CLSCTX_ALL, CoInitialize, CoUninitialize
+    import hid
 except ImportError:
-    MISSING_LIBS.append("keyboard/pycaw/comtypes")
+    MISSING_LIBS.append("hidapi")
 
 try:
-    import requests
+    import psutil
 except ImportError:
-    MISSING_LIBS.append("requests")
+    pass
+
+if not _has_modules("PIL", "pystray"): MISSING_LIBS.append("pystray/pillow")
+if not _has_modules("psutil", "win32com"): MISSING_LIBS.append("psutil/pywin32")
+if not _has_modules("keyboard", "pycaw", "comtypes"): MISSING_LIBS.append("keyboard/pycaw/comtypes")
+if not _has_modules("requests"): MISSING_LIBS.append("requests")
+
+def load_tray_libs():
+    global Image, ImageDraw, pystray
+    if pystray is None and "pystray/pillow" not in MISSING_LIBS:
+        try:
+            from PIL import Image, ImageDraw
+            import pystray
+        except ImportError:
+            MISSING_LIBS.append("pystray/pillow")
+    return pystray
+
+def load_win32com():
+    global win32com
+    if win32com is None and "psutil/pywin32" not in MISSING_LIBS:
+        try:
+            import win32com.client
+        except ImportError:
+            MISSING_LIBS.append("psutil/pywin32")
+    return win32com
+
+def load_keyboard():
+    global keyboard
+    if keyboard is None and "keyboard/pycaw/comtypes" not in MISSING_LIBS:
+        try:
+            import keyboard
+        except ImportError:
+            MISSING_LIBS.append("keyboard/pycaw/comtypes")
+    return keyboard
+
+def load_audio():
+    global AudioUtilities, IAudioEndpointVolume, ISimpleAudioVolume, CoInitialize, CoUninitialize
+    if AudioUtilities is None and "keyboard/pycaw/comtypes" not in MISSING_LIBS:
+        try:
+            from pycaw.pycaw import AudioUtilities, IAudioEndpointVolume, ISimpleAudioVolume
+            from comtypes import CoInitialize, CoUninitialize
+        except ImportError:
+            MISSING_LIBS.append("keyboard/pycaw/comtypes")
+    return AudioUtilities
+
+def load_requests():
+    global requests
+    if requests is None and "requests" not in MISSING_LIBS:
+        try:
+            import requests
+        except ImportError:
+            MISSING_LIBS.append("requests")
+    return requests
 
 # --- WINDOWS API DEFINITIONS ---
-kernel32 = ctypes.windll.kernel32
-user32 = ctypes.windll.user32
+IS_WINDOWS = sys.platform == "win32"
+kernel32 = ctypes.windll.kernel32 if IS_WINDOWS else None
+user32 = ctypes.windll.user32 if IS_WINDOWS else None
+winmm = ctypes.windll.winmm if IS_WINDOWS else None
 PROCESS_QUERY_INFORMATION = 0x0400
 PROCESS_VM_READ = 0x0010
 
 def get_process_name_by_pid_ctypes(pid):
+    if not kernel32: return None
     try:
         h_process = kernel32.OpenProcess(PROCESS_QUERY_INFORMATION | PROCESS_VM_READ, False, pid)
         if not h_process: return None
-        buf = ctypes.create_unicode_buffer(1024)
-        size = ctypes.c_ulong(1024)
         try:
-            QueryFullProcessImageNameW = kernel32.QueryFullProcessImageNameW
-            if QueryFullProcessImageNameW(h_process, 0, buf, ctypes.byref(size)):
-                kernel32.CloseHandle(h_process)
+            buf = ctypes.create_unicode_buffer(1024)
+            size = ctypes.c_ulong(1024)
+            if kernel32.QueryFullProcessImageNameW(h_process, 0, buf, ctypes.byref(size)):
                 return os.path.basename(buf.value)
-        except: pass
-        kernel32.CloseHandle(h_process)
-    except: pass
+        finally: kernel32.CloseHandle(h_process)
+    except Exception: LOG.debug("focus", "process name lookup for pid %s failed", pid, exc=True)
     return None
 
 # --- WINDOWS APP ID FIX ---
 try:
     myappid = u'VMacropad.Manager.1.0'
     ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID(myappid)
-except:
+except Exception:
     pass
 
-# --- THEME DEFINITION ---
-class Theme:
-    MAIN_BG = "#000000"
-    CONTAINER_BG = "#121212" 
-    WIDGET_BG = "#1c1c1c"
-    ACTIVE_BUTTON = "#e5e5e5"
-    INACTIVE_PILL = "#282828"
-    BUTTON_HOVER = "#333333"
-    CONNECTED_COLOR = "#76ff03"
-    DISCONNECTED_COLOR = "#ff3d00"
-    TEXT_PRIMARY = "#ffffff"
-    TEXT_INVERSE = "#000000"
-    TEXT_SECONDARY = "#8e8e8e"
-    TEXT_DISABLED = "#4d4d4d"
-    FONT_HEADER = ("Segoe UI", 20, "bold")
-    FONT_SUBHEADER = ("Segoe UI", 14, "bold")
-    FONT_BODY = ("Segoe UI", 12, "normal")
-
 # --- HARDWARE DEFAULTS ---
 DEFAULT_VENDOR_ID = 0x1189
 DEFAULT_PRODUCT_ID = 0x8890
@@ -178,13 +211,505 @@ MOUSE_WHEEL = {
 
 LED_MODES = {"Off": 0, "Static": 1, "Breathing": 2}
 
+# --- USAGE CODEC ---
+# Forward (name -> code) and reverse (code -> name) tables for the keyboard and
+# consumer usage pages, and a one-line slot syntax for scripts and 'import':
+#   ctrl+shift+F5   media:Play/Pause   media:0x0223   alt+mouse:Right Click
+#   app:discord.exe down   macro:ctrl+c; wait 50; ctrl+v
+# Names are matched without case; usages without a name are written as hex.
+KEY_USAGES_EXTRA = {
+    "Power": 0x66, "Execute": 0x74, "Help": 0x75, "Menu": 0x76, "Select": 0x77, "Stop": 0x78,
+    "Again": 0x79, "Undo": 0x7A, "Cut": 0x7B, "Copy": 0x7C, "Paste": 0x7D, "Find": 0x7E,
+    "Key Mute": 0x7F, "Key Vol Up": 0x80, "Key Vol Down": 0x81, "KP Comma": 0x85,
+    **{f"Intl {i}": 0x86 + i for i in range(1, 10)}, **{f"Lang {i}": 0x8F + i for i in range(1, 10)},
+    "SysReq": 0x9A, "Cancel": 0x9B, "Clear": 0x9C, "Separator": 0x9F,
+}
+CONSUMER_USAGES_EXTRA = {
+    "Power": 0x30, "Reset": 0x31, "Menu": 0x40, "Play": 0xB0, "Pause": 0xB1, "Record": 0xB2,
+    "Eject": 0xB8, "Shuffle": 0xB9, "Repeat": 0xBC, "Bass Boost": 0xE5, "Media Player": 0x183,
+    "Calendar": 0x18E, "Browser": 0x196, "Control Panel": 0x19F, "Documents": 0x1A7,
+    "New": 0x201, "Open": 0x202, "Close": 0x203, "Save": 0x207, "Print": 0x208,
+    "Undo": 0x21A, "Copy": 0x21B, "Cut": 0x21C, "Paste": 0x21D, "Find": 0x21F,
+    "Zoom In": 0x22D, "Zoom Out": 0x22E, "Redo": 0x279,
+}
+KEY_USAGES = set(range(0x04, 0xA5)) | set(range(0xB0, 0xDE)) | set(range(0xE0, 0xE8)) | {0}
+MODIFIER_BITS = {"ctrl": 1, "shift": 2, "alt": 4, "win": 8, "rctrl": 16, "rshift": 32, "ralt": 64, "rwin": 128}
+MODIFIER_ALIASES = dict(MODIFIER_BITS, control=1, option=4, gui=8, meta=8, cmd=8, super=8)
+MODIFIER_RE = re.compile(r"\s*(" + "|".join(sorted(MODIFIER_ALIASES, key=len, reverse=True)) + r")\s*\+", re.I)
+KEY_ALIASES = {"escape": "Esc", "return": "Enter", "del": "Delete", "ins": "Insert", "pgup": "PageUp", "pgdn": "PageDown",
+               "left": "Left Arrow", "right": "Right Arrow", "up": "Up Arrow", "down": "Down Arrow", "caps": "CapsLock",
+               "prtsc": "PrintScreen", "context": "Application / Context Menu", "-": "Minus (-)", "=": "Equal (=)"}
+MOUSE_ALIASES = {"left": "Left Click", "right": "Right Click", "middle": "Middle Click", "back": "Back (Btn 4)", "forward": "Forward (Btn 5)"}
+MEDIA_ALIASES = {"volume up": "Vol Up", "volume down": "Vol Down", "previous track": "Prev Track", "next": "Next Track",
+                 "prev": "Prev Track", "play pause": "Play/Pause", "playpause": "Play/Pause", "explorer": "File Explorer"}
+WHEEL_ALIASES = {"up": "Scroll Up", "down": "Scroll Down", "wheel up": "Scroll Up", "wheel down": "Scroll Down"}
+
+def usage_key(name): return " ".join(name.lower().split())
+
+def usage_table(*tables, aliases=None):
+    # Every spelling of a name: as written, without its "(x)" suffix, the x alone
+    # and without spaces. Earlier tables win a clash.
+    forward = {}
+    for table in tables:
+        for name, code in table.items():
+            base, _, inner = name.partition(" (")
+            for spelling in (name, base, inner[:-1] if inner.endswith(")") else ""):
+                key = usage_key(spelling)
+                if not key: continue
+                forward.setdefault(key, code)
+                forward.setdefault(key.replace(" ", ""), code)
+    for alias, name in (aliases or {}).items(): forward.setdefault(alias, forward[usage_key(name)])
+    return forward
+
+def reverse_table(*tables):
+    reverse = {}
+    for table in tables:
+        for name, code in table.items(): reverse.setdefault(code, name)
+    return reverse
+
+KEY_CODES = usage_table(KEY_MAP, KEY_USAGES_EXTRA, aliases=KEY_ALIASES)
+KEY_NAMES = reverse_table(KEY_MAP, KEY_USAGES_EXTRA)
+MEDIA_EXTRA = {name: (usage & 0xFF, usage >> 8) for name, usage in CONSUMER_USAGES_EXTRA.items()}
+MEDIA_CODES = usage_table(MEDIA_MAP, MEDIA_EXTRA, aliases=MEDIA_ALIASES)
+MEDIA_NAMES = reverse_table(MEDIA_MAP, MEDIA_EXTRA)
+MOUSE_CODES = usage_table(MOUSE_BUTTONS, aliases=MOUSE_ALIASES)
+MOUSE_WHEEL_CODES = usage_table(MOUSE_WHEEL, aliases=WHEEL_ALIASES)
+MOUSE_BUTTON_NAMES = reverse_table(MOUSE_BUTTONS)
+MOUSE_BUTTON_MASK = sum(set(MOUSE_BUTTONS.values()))  # a slot may press several buttons at once
+MOUSE_WHEEL_NAMES = reverse_table(MOUSE_WHEEL)
+LED_NAMES = reverse_table(LED_MODES)
+LED_CODES = usage_table(LED_MODES)
+
+def key_name(code): return KEY_NAMES.get(code) or f"0x{code:02X}"
+def media_name(b1, b2): return MEDIA_NAMES.get((b1, b2)) or f"0x{b1 | b2 << 8:04X}"
+
+def key_code(name):
+    code = KEY_CODES.get(usage_key(name))
+    if code is None and name.strip().lower().startswith("0x"):
+        try: code = int(name, 16)
+        except ValueError: return None
+        if code not in KEY_USAGES: return None
+    return code
+
+def media_code(name):
+    code = MEDIA_CODES.get(usage_key(name))
+    if code is None and name.strip().lower().startswith("0x"):
+        try: usage = int(name, 16)
+        except ValueError: return None
+        if 0 < usage <= 0x3FF: code = (usage & 0xFF, usage >> 8)
+    return code
+
+def split_macro_steps(text):
+    # Steps in "macro:" text are split on ";"; write \; for a literal ";" and \\ for a backslash.
+    steps, current, chars = [], [], iter(text)
+    for ch in chars:
+        if ch == "\\":
+            nxt = next(chars, "")
+            current.append(nxt if nxt in ("\\", ";") else ch + nxt)
+        elif ch == ";":
+            steps.append("".join(current))
+            current = []
+        else: current.append(ch)
+    steps.append("".join(current))
+    return [s.strip() for s in steps if s.strip()]
+
+def format_macro_steps(steps): return "; ".join(s.replace("\\", "\\\\").replace(";", "\\;") for s in steps)
+
+def parse_slot(text):
+    # One slot in the text syntax -> slot dict. Raises ValueError.
+    mods, pos = 0, 0
+    while True:
+        m = MODIFIER_RE.match(text, pos)
+        if not m: break
+        mods |= MODIFIER_ALIASES[m.group(1).lower()]
+        pos = m.end()
+    body = text[pos:].strip()
+    kind, sep, rest = body.partition(":")
+    kind = kind.strip().lower() if sep else ""
+    if kind == "media":
+        if mods: raise ValueError("media keys take no modifiers")
+        code = media_code(rest)
+        if code is None: raise ValueError(f"unknown media key {rest.strip()!r}")
+        return {"type": "media", "b1": code[0], "b2": code[1]}
+    if kind == "mouse":
+        btn = scroll = 0
+        for part in rest.split(","):
+            key = usage_key(part)
+            if key in MOUSE_CODES: btn |= MOUSE_CODES[key]
+            elif key in MOUSE_WHEEL_CODES: scroll = MOUSE_WHEEL_CODES[key]
+            else: raise ValueError(f"unknown mouse action {part.strip()!r}")
+        return {"type": "mouse", "mod": mods, "code": 0, "mouse_btn": btn, "mouse_scroll": scroll}
+    if kind == "app":
+        app, _, action = rest.strip().rpartition(" ")
+        if mods or not app or action.lower() not in ("up", "down", "mute"): raise ValueError("expected app:<exe> up|down|mute")
+        return {"type": "app_vol", "app": app.strip(), "action": action.lower()}
+    if kind == "macro":
+        if mods: raise ValueError("macros take no modifiers")
+        return {"type": "macro", "steps": split_macro_steps(rest)}
+    code = key_code(body) if body else 0
+    if code is None: raise ValueError(f"unknown key {body!r}")
+    return {"type": "key", "mod": mods, "code": code}
+
+def format_mods(mod): return "".join(f"{name}+" for name, bit in MODIFIER_BITS.items() if mod & bit)
+
+def format_slot(d):
+    t = d.get("type", "key")
+    if t == "media": return "media:" + media_name(d.get("b1", 0), d.get("b2", 0))
+    if t == "mouse":
+        btn, scroll = d.get("mouse_btn", d.get("btn", 0)), d.get("mouse_scroll", d.get("scroll", 0))
+        parts = [name for bit, name in MOUSE_BUTTON_NAMES.items() if bit and btn & bit] + ([MOUSE_WHEEL_NAMES.get(scroll, "None")] if scroll else [])
+        return format_mods(d.get("mod", 0)) + "mouse:" + (", ".join(parts) or "None")
+    if t == "app_vol": return f"app:{d.get('app', '')} {d.get('action', 'up')}"
+    if t == "macro": return "macro:" + format_macro_steps(d.get("steps", []))
+    return format_mods(d.get("mod", 0)) + key_name(d.get("code", 0))
+
+PRESET_TEXT_SECTION = re.compile(r"^\[(.+)\]$")
+PRESET_TEXT_FIELD = re.compile(r"^([\w-]+)\s*[=:]\s*(.*)$")
+
+def parse_preset_text(text):
+    # "[Name]" starts a preset; then "parent = X", "led = Breathing", "color = #rrggbb"
+    # and "1 = ctrl+c" through "6 = ...". Without a parent, unlisted slots are empty.
+    # Returns (presets, errors); errors carry line numbers.
+    presets, errors, name, current = {}, [], None, None
+    for lineno, line in enumerate(text.splitlines(), 1):
+        line = line.strip()
+        if not line or line[0] in "#;": continue
+        m = PRESET_TEXT_SECTION.match(line)
+        if m:
+            name = m.group(1).strip()
+            if name in presets: errors.append(f"line {lineno}: preset {name!r} defined twice")
+            current = presets[name] = {"keys": {}}
+            continue
+        m = PRESET_TEXT_FIELD.match(line)
+        if not m or current is None:
+            errors.append(f"line {lineno}: expected [Preset] or field = value")
+            continue
+        field, value = m.group(1).lower(), m.group(2).strip()
+        try:
+            if field.isdigit():
+                if not 1 <= int(field) <= 6: raise ValueError("slots are numbered 1 to 6")
+                current["keys"][str(int(field) - 1)] = parse_slot(value)
+            elif field == "parent": current["parent"] = value
+            elif field == "color": current["color"] = value
+            elif field == "led":
+                led = LED_CODES.get(usage_key(value), int(value) if value.isdigit() else None)
+                if led is None: raise ValueError(f"unknown LED mode {value!r}")
+                current["led"] = led
+            else: raise ValueError(f"unknown field {field!r}")
+        except ValueError as e: errors.append(f"line {lineno}: {e}")
+    for data in presets.values():
+        if "parent" not in data:
+            data["keys"] = [data["keys"].get(str(i)) or {"type": "key", "mod": 0, "code": 0} for i in range(6)]
+            data.setdefault("led", 1)
+            data.setdefault("color", "#888888")
+    return presets, errors
+
+# --- METRICS ---
+class Histogram:
+    # Log-scale buckets, four per power of two, starting at 1 microsecond.
+    BUCKETS = 4 * 32
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = 0.0
+        self.buckets = [0] * self.BUCKETS
+
+    def observe(self, seconds):
+        us = seconds * 1e6
+        idx = int(4 * math.log2(us)) + 1 if us >= 1 else 0
+        self.buckets[min(idx, self.BUCKETS - 1)] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min: self.min = seconds
+        if seconds > self.max: self.max = seconds
+
+    def percentile(self, q):
+        if not self.count: return 0.0
+        rank = q * self.count
+        seen = 0
+        for idx, n in enumerate(self.buckets):
+            seen += n
+            if seen >= rank:
+                upper = 2 ** (idx / 4) / 1e6
+                return min(upper, self.max)
+        return self.max
+
+    def snapshot(self):
+        ms = lambda v: round(v * 1000, 3)
+        return {
+            "count": self.count,
+            "mean_ms": ms(self.total / self.count) if self.count else 0.0,
+            "min_ms": ms(self.min or 0.0),
+            "p50_ms": ms(self.percentile(0.5)),
+            "p90_ms": ms(self.percentile(0.9)),
+            "p99_ms": ms(self.percentile(0.99)),
+            "max_ms": ms(self.max),
+        }
+
+class Metrics:
+    # Call sites check .enabled before reading the clock, so a disabled registry
+    # costs one attribute lookup per instrumented operation.
+    def __init__(self, enabled=False):
+        self.enabled = enabled
+        self.lock = threading.Lock()
+        self.histograms = {}
+        self.counters = {}
+
+    def observe(self, name, seconds):
+        if not self.enabled: return
+        with self.lock:
+            hist = self.histograms.get(name)
+            if hist is None: hist = self.histograms[name] = Histogram()
+            hist.observe(seconds)
+
+    def incr(self, name, n=1):
+        if not self.enabled: return
+        with self.lock: self.counters[name] = self.counters.get(name, 0) + n
+
+    def reset(self):
+        with self.lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                "enabled": self.enabled,
+                "histograms": {k: v.snapshot() for k, v in sorted(self.histograms.items())},
+                "counters": dict(sorted(self.counters.items())),
+            }
+
+METRICS = Metrics(enabled=os.getenv("VMACROPAD_METRICS") == "1")
+
+# --- EVENT LOG ---
+LOG_LEVELS = {"debug": 10, "info": 20, "warning": 30, "error": 40, "off": 100}
+LOG_LEVEL_NAMES = {v: k for k, v in LOG_LEVELS.items()}
+LOG_SUBSYSTEMS = ("hid", "devices", "upload", "focus", "engine", "presets", "audio", "hotkeys", "macro", "config", "update", "control", "tray")
+
+class EventLog:
+    # Fixed-size ring of (time, subsystem, level, format, args, exception) records.
+    # Messages are only formatted when read, so a record on a hot path costs a level
+    # lookup and a deque append. Records at or above spill_level also go to a text
+    # file that rolls over to <path>.1 past max_bytes.
+    def __init__(self, capacity=2000, level="info"):
+        self.ring = deque(maxlen=capacity)
+        self.default_level = LOG_LEVELS.get(level, LOG_LEVELS["info"])
+        self.levels = {}
+        self.spill_path = None
+        self.spill_level = LOG_LEVELS["warning"]
+        self.max_bytes = 1024 * 1024
+        self.file = None
+        self.lock = threading.Lock()
+
+    def set_level(self, subsystem, level):
+        # subsystem None or "*" sets the default for subsystems without their own level
+        value = LOG_LEVELS[level]
+        if subsystem in (None, "*"): self.default_level = value
+        else: self.levels[subsystem] = value
+
+    def level_names(self):
+        names = {k: LOG_LEVEL_NAMES[v] for k, v in sorted(self.levels.items())}
+        names["*"] = LOG_LEVEL_NAMES[self.default_level]
+        return names
+
+    def log(self, subsystem, level, fmt, *args, exc=False):
+        if level < self.levels.get(subsystem, self.default_level): return
+        entry = (time.time(), subsystem, level, fmt, args, sys.exc_info()[1] if exc else None)
+        self.ring.append(entry)
+        if self.file and level >= self.spill_level: self.spill(entry)
+
+    # The shortcuts repeat the level check so a filtered record is a single call.
+    def debug(self, subsystem, fmt, *args, exc=False):
+        if self.levels.get(subsystem, self.default_level) <= 10: self.log(subsystem, 10, fmt, *args, exc=exc)
+    def info(self, subsystem, fmt, *args, exc=False):
+        if self.levels.get(subsystem, self.default_level) <= 20: self.log(subsystem, 20, fmt, *args, exc=exc)
+    def warning(self, subsystem, fmt, *args, exc=False):
+        if self.levels.get(subsystem, self.default_level) <= 30: self.log(subsystem, 30, fmt, *args, exc=exc)
+    def error(self, subsystem, fmt, *args, exc=True):
+        if self.levels.get(subsystem, self.default_level) <= 40: self.log(subsystem, 40, fmt, *args, exc=exc)
+
+    @staticmethod
+    def format(entry):
+        t, subsystem, level, fmt, args, error = entry
+        try: message = fmt % args if args else fmt
+        except Exception: message = f"{fmt} {args!r}"
+        if error is not None: message += f" [{type(error).__name__}: {error}]"
+        stamp = time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(t)) + f".{int(t % 1 * 1000):03d}"
+        return f"{stamp} {LOG_LEVEL_NAMES.get(level, level):<7} {subsystem:<8} {message}"
+
+    def recent(self, count=None, subsystem=None, level="debug"):
+        floor = LOG_LEVELS[level]
+        entries = [e for e in list(self.ring) if e[2] >= floor and (not subsystem or e[1] == subsystem)]
+        return [self.format(e) for e in entries[-count if count else 0:]]
+
+    def dump(self, path):
+        lines = self.recent()
+        with open(path, "w", encoding="utf-8") as f:
+            f.write("\n".join(lines) + "\n")
+        return len(lines)
+
+    def set_spill(self, path, level="warning"):
+        with self.lock:
+            if self.file:
+                try: self.file.close()
+                except OSError: pass
+            self.file = None
+            self.spill_path = path
+            self.spill_level = LOG_LEVELS[level]
+            if path: self.open_spill()
+
+    def open_spill(self):
+        try:
+            if os.path.exists(self.spill_path) and os.path.getsize(self.spill_path) >= self.max_bytes:
+                os.replace(self.spill_path, self.spill_path + ".1")
+            self.file = open(self.spill_path, "a", encoding="utf-8")
+        except OSError: self.file = None
+
+    def spill(self, entry):
+        with self.lock:
+            if not self.file: return
+            try:
+                self.file.write(self.format(entry) + "\n")
+                self.file.flush()
+                if self.file.tell() >= self.max_bytes:
+                    self.file.close()
+                    self.open_spill()
+            except (OSError, ValueError): self.file = None
+
+LOG = EventLog(level=os.getenv("VMACROPAD_LOG", "info"))
+
+# --- SCHEDULER ---
+class ScheduledTask:
+    __slots__ = ("name", "fn", "args", "interval", "due", "cancelled")
+    def __init__(self, name, fn, args, interval):
+        self.name = name
+        self.fn = fn
+        self.args = args
+        self.interval = interval
+        self.due = 0
+        self.cancelled = False
+
+class Scheduler:
+    # One timer thread and a fixed pool of workers run every delayed, periodic and
+    # background job. Scheduling a name again replaces the pending task with that
+    # name; a task whose name is still running waits for that run to finish. Periodic
+    # tasks are rescheduled after they finish, so they never overlap; returning a
+    # number from one overrides the delay before its next run.
+    def __init__(self, workers=3):
+        self.workers = workers
+        self.lock = threading.Lock()
+        self.timer_cond = threading.Condition(self.lock)
+        self.work_cond = threading.Condition(self.lock)
+        self.timers = []
+        self.ready = deque()
+        self.tasks = {}
+        self.active = set()
+        self.deferred = {}
+        self.seq = 0
+        self.running = False
+
+    def start(self):
+        with self.lock:
+            if self.running: return
+            self.running = True
+        threading.Thread(target=self.timer_loop, name="scheduler-timer", daemon=True).start()
+        for i in range(self.workers):
+            threading.Thread(target=self.worker_loop, name=f"scheduler-worker-{i}", daemon=True).start()
+
+    def stop(self):
+        with self.lock:
+            self.running = False
+            for task in self.tasks.values(): task.cancelled = True
+            self.tasks.clear()
+            self.timers.clear()
+            self.ready.clear()
+            self.deferred.clear()
+            self.timer_cond.notify_all()
+            self.work_cond.notify_all()
+
+    def schedule(self, delay, fn, *args, name=None, interval=None):
+        task = ScheduledTask(name, fn, args, interval)
+        with self.lock:
+            if name:
+                old = self.tasks.get(name)
+                if old: old.cancelled = True
+                self.tasks[name] = task
+            self._push(task, time.monotonic() + delay)
+        return task
+
+    def call_later(self, delay, fn, *args, name=None): return self.schedule(delay, fn, *args, name=name)
+    def call_every(self, interval, fn, *args, name=None, delay=0): return self.schedule(delay, fn, *args, name=name, interval=interval)
+    def submit(self, fn, *args, name=None): return self.schedule(0, fn, *args, name=name)
+
+    def cancel(self, name):
+        with self.lock:
+            task = self.tasks.pop(name, None)
+            if task: task.cancelled = True
+
+    def pending(self):
+        with self.lock: return sorted(self.tasks)
+
+    def scheduled(self, name):
+        with self.lock: return name in self.tasks
+
+    def _push(self, task, due):
+        task.due = due
+        if due <= time.monotonic():
+            self.ready.append(task)
+            self.work_cond.notify()
+            return
+        self.seq += 1
+        heapq.heappush(self.timers, (due, self.seq, task))
+        if self.timers[0][2] is task: self.timer_cond.notify()
+
+    def timer_loop(self):
+        with self.lock:
+            while self.running:
+                now = time.monotonic()
+                while self.timers and self.timers[0][0] <= now:
+                    task = heapq.heappop(self.timers)[2]
+                    if task.cancelled: continue
+                    self.ready.append(task)
+                    self.work_cond.notify()
+                self.timer_cond.wait(self.timers[0][0] - now if self.timers else None)
+
+    def worker_loop(self):
+        while True:
+            with self.lock:
+                while self.running and not self.ready: self.work_cond.wait()
+                if not self.running: return
+                task = self.ready.popleft()
+                if task.cancelled: continue
+                if task.name:
+                    if task.name in self.active:
+                        self.deferred[task.name] = task
+                        continue
+                    self.active.add(task.name)
+            try: next_delay = task.fn(*task.args)
+            except Exception:
+                next_delay = None
+                METRICS.incr("scheduler.task_failed")
+            with self.lock:
+                if task.interval is not None and not task.cancelled and self.running:
+                    delay = next_delay if isinstance(next_delay, (int, float)) and not isinstance(next_delay, bool) else task.interval
+                    self._push(task, time.monotonic() + delay)
+                elif task.name and self.tasks.get(task.name) is task:
+                    del self.tasks[task.name]
+                if task.name:
+                    self.active.discard(task.name)
+                    waiting = self.deferred.pop(task.name, None)
+                    if waiting and not waiting.cancelled and self.running: self._push(waiting, waiting.due)
+
 # --- AUDIO CONTROLLER ---
 class AppAudioController:
     @staticmethod
     def adjust_app_volume(app_exe, action):
-        if not AudioUtilities: return
+        if not load_audio(): return
+        t0 = time.perf_counter() if METRICS.enabled else 0
         try: CoInitialize()
-        except: pass
+        except Exception: LOG.debug("audio", "CoInitialize failed", exc=True)
         try:
             found = False
             clean_target = app_exe.lower().replace(".exe", "").strip()
@@ -194,7 +719,7 @@ class AppAudioController:
                     process = session.Process
                     if process:
                         try: p_name = process.name()
-                        except: continue
+                        except Exception: continue
                         if p_name and clean_target in p_name.lower():
                             found = True
                             volume = session.SimpleAudioVolume
@@ -207,36 +732,327 @@ class AppAudioController:
                                 new_vol = current_vol + step if action == 'up' else current_vol - step
                                 new_vol = max(0.0, min(1.0, new_vol))
                                 volume.SetMasterVolume(new_vol, None)
-                except Exception: continue
+                except Exception:
+                    LOG.debug("audio", "skipped a session while looking for %s", app_exe, exc=True)
+                    continue
             if not found:
+                LOG.info("audio", "no audio session for %s, using master volume", app_exe)
+                METRICS.incr("audio.master_fallback")
                 AppAudioController._adjust_master_volume_internal(action)
-        except Exception as e:
+        except Exception:
+            LOG.warning("audio", "session lookup for %s failed, using master volume", app_exe, exc=True)
+            METRICS.incr("audio.master_fallback")
             AppAudioController._adjust_master_volume_internal(action)
         finally:
             try: CoUninitialize()
-            except: pass
+            except Exception: LOG.debug("audio", "CoUninitialize failed", exc=True)
+            if t0: METRICS.observe("audio.action", time.perf_counter() - t0)
 
     @staticmethod
     def _adjust_master_volume_internal(action):
-        if not keyboard: return
+        if not load_keyboard(): return
         try:
             if action == 'mute': keyboard.send('volume mute')
             elif action == 'up': keyboard.send('volume up')
             elif action == 'down': keyboard.send('volume down')
-        except: pass
+        except Exception: LOG.warning("audio", "master volume %s failed", action, exc=True)
 
 INTERNAL_TRIGGER_KEYS = [104, 105, 106, 107, 108, 109]
 TRIGGER_MODIFIER = 7
+# Each attached pad gets its own bank of trigger chords: F13-F18 or F19-F24, with or
+# without the Windows key. Bank 0 is the primary pad.
+TRIGGER_BANKS = 4
+
+def trigger_chord(slot, bank=0):
+    code = INTERNAL_TRIGGER_KEYS[slot] + 6 * (bank % 2)
+    win = bank >= 2
+    return TRIGGER_MODIFIER | (8 if win else 0), code, f"ctrl+alt+shift+{'windows+' if win else ''}f{13 + code - 104}"
+
+# --- MACROS ---
+# A macro slot uploads a trigger chord like app_vol and plays its steps on the host.
+# Steps, one per line:
+#   ctrl+c        press and release a key or chord
+#   down shift    hold a key until "up shift" (or the end of the macro)
+#   type Hello    type text
+#   wait 50       pause for 50 ms
+def parse_macro(lines):
+    steps, errors = [], []
+    for n, raw in enumerate(lines, 1):
+        line = raw.strip()
+        if not line or line.startswith("#"): continue
+        op, _, arg = line.partition(" ")
+        op = op.lower()
+        if op == "wait":
+            try: steps.append(("wait", max(0.0, float(arg) / 1000.0)))
+            except ValueError: errors.append(f"Line {n}: wait needs a number of milliseconds")
+        elif op == "type":
+            steps.append(("type", raw.lstrip()[5:]))
+        elif op in ("down", "up"):
+            if arg.strip(): steps.append((op, arg.strip()))
+            else: errors.append(f"Line {n}: {op} needs a key name")
+        else: steps.append(("send", line))
+    return steps, errors
+
+class MacroRunner:
+    # Plays macros on one long-lived thread. Waits are scheduled against
+    # perf_counter deadlines: the thread sleeps until just before a deadline and
+    # spins the rest, so a "wait 5" lands within a fraction of a millisecond.
+    SPIN_S = 0.002
+
+    def __init__(self, output=None):
+        self.output = output
+        self.cond = threading.Condition()
+        self.queue = deque()
+        self.current = None
+        self.cancel_event = threading.Event()
+        self.held = set()
+        self.thread = None
+
+    def trigger(self, key, steps, char_delay=0.0, cancel_on_repress=True):
+        with self.cond:
+            if cancel_on_repress and self.current == key:
+                self.cancel_event.set()
+                return
+            if cancel_on_repress and any(job[0] == key for job in self.queue):
+                self.queue = deque(job for job in self.queue if job[0] != key)
+                return
+            self.queue.append((key, steps, char_delay, time.perf_counter()))
+            if not self.thread:
+                self.thread = threading.Thread(target=self.run, name="macro-runner", daemon=True)
+                self.thread.start()
+            self.cond.notify()
+
+    def cancel_all(self):
+        with self.cond:
+            self.queue.clear()
+            self.cancel_event.set()
+
+    def is_busy(self):
+        with self.cond: return bool(self.current or self.queue)
+
+    def run(self):
+        while True:
+            with self.cond:
+                while not self.queue: self.cond.wait()
+                key, steps, char_delay, queued = self.queue.popleft()
+                self.current = key
+                self.cancel_event.clear()
+            if winmm: winmm.timeBeginPeriod(1)
+            try: self.play(steps, char_delay, queued)
+            except Exception:
+                LOG.error("macro", "macro on %s failed", key)
+                METRICS.incr("macro.failed")
+            finally:
+                if winmm: winmm.timeEndPeriod(1)
+                self.release_held()
+                with self.cond: self.current = None
+
+    def play(self, steps, char_delay, queued):
+        out = self.output or load_keyboard()
+        if not out: return
+        self.wait_for_trigger_release(out)
+        if METRICS.enabled: METRICS.observe("macro.start_delay", time.perf_counter() - queued)
+        due = time.perf_counter()
+        timed = False
+        for op, arg in steps:
+            if op == "wait":
+                due += arg
+                timed = True
+                continue
+            if not self.wait_until(due, timed): return
+            timed = False
+            if op == "send": out.send(arg)
+            elif op == "down":
+                out.press(arg)
+                self.held.add(arg)
+            elif op == "up":
+                out.release(arg)
+                self.held.discard(arg)
+            elif op == "type":
+                if char_delay <= 0: out.write(arg)
+                else:
+                    for i, ch in enumerate(arg):
+                        if i and not self.wait_until(due + i * char_delay, True): return
+                        out.write(ch)
+                    due += (len(arg) - 1) * char_delay
+            # Later waits count from when this step finished, not from the plan.
+            due = max(due, time.perf_counter())
+
+    def wait_until(self, due, timed=False):
+        remaining = due - time.perf_counter()
+        if remaining > self.SPIN_S and self.cancel_event.wait(remaining - self.SPIN_S): return False
+        while time.perf_counter() < due:
+            if self.cancel_event.is_set(): return False
+        if timed and METRICS.enabled: METRICS.observe("macro.step_late", time.perf_counter() - due)
+        return not self.cancel_event.is_set()
+
+    def wait_for_trigger_release(self, out):
+        # The pad holds ctrl+alt+shift while sending the trigger key; wait for it to
+        # let go so they do not leak into the first step.
+        is_pressed = getattr(out, "is_pressed", None)
+        if not is_pressed: return
+        deadline = time.perf_counter() + 0.3
+        try:
+            while time.perf_counter() < deadline and any(is_pressed(m) for m in ("ctrl", "alt", "shift")):
+                if self.cancel_event.wait(0.002): return
+        except Exception: LOG.debug("macro", "modifier state check failed", exc=True)
+
+    def release_held(self):
+        out = self.output or keyboard
+        for key in list(self.held):
+            try: out.release(key)
+            except Exception: LOG.warning("macro", "could not release held key %s", key, exc=True)
+        self.held.clear()
+
+# --- HOTKEYS ---
+class HotkeyRegistry:
+    # Keeps the global trigger hotkeys in step with the uploaded presets. Every chord
+    # is registered once with a dispatcher that looks up its current action, so a
+    # preset switch only adds or removes chords that appear or disappear; a chord
+    # that stays but now does something else is rebound in place without touching
+    # the keyboard hook.
+    def __init__(self, run):
+        self.run = run
+        self.handles = {}
+        self.actions = {}
+        self.lock = threading.Lock()
+
+    def fire(self, hotkey):
+        with self.lock: item = self.actions.get(hotkey)
+        if item: self.run(item)
+
+    def update(self, items):
+        new = {item["hotkey"]: item for item in items}
+        if not new and not self.handles: return
+        if not load_keyboard(): return
+        with self.lock:
+            removed = [hk for hk in self.handles if hk not in new]
+            for hk in removed:
+                handle = self.handles.pop(hk)
+                self.actions.pop(hk, None)
+                try: keyboard.remove_hotkey(handle)
+                except Exception: LOG.debug("hotkeys", "remove %s failed", hk, exc=True)
+            rebound = sum(1 for hk, item in new.items() if hk in self.handles and self.actions.get(hk) != item)
+            self.actions.update(new)
+            added = 0
+            for hk in new:
+                if hk in self.handles: continue
+                try:
+                    self.handles[hk] = keyboard.add_hotkey(hk, lambda h=hk: self.fire(h), suppress=True)
+                    added += 1
+                except Exception:
+                    self.actions.pop(hk, None)
+                    LOG.warning("hotkeys", "could not register %s", hk, exc=True)
+        if added or removed or rebound:
+            LOG.debug("hotkeys", "%d added, %d removed, %d rebound, %d live", added, len(removed), rebound, len(self.handles))
+            METRICS.incr("hotkeys.added", added)
+            METRICS.incr("hotkeys.removed", len(removed))
+            METRICS.incr("hotkeys.rebound", rebound)
+
+    def clear(self):
+        with self.lock:
+            for hk, handle in self.handles.items():
+                try: keyboard.remove_hotkey(handle)
+                except Exception: LOG.debug("hotkeys", "remove %s failed", hk, exc=True)
+            self.handles.clear()
+            self.actions.clear()
 
 # --- FILE PATHS ---
 APP_NAME = "VMacropad"
-APP_DATA_DIR = os.path.join(os.getenv('APPDATA'), APP_NAME)
+APP_DATA_DIR = os.path.join(os.getenv('APPDATA') or os.path.expanduser("~/.config"), APP_NAME)
 if not os.path.exists(APP_DATA_DIR):
     try: os.makedirs(APP_DATA_DIR)
-    except: pass
+    except OSError: pass
 CONFIG_FILE = os.path.join(APP_DATA_DIR, "config.json")
 PRESETS_FILE = os.path.join(APP_DATA_DIR, "presets.json")
 MAPPINGS_FILE = os.path.join(APP_DATA_DIR, "mappings.json")
+STARTUP_REPORT_FILE = os.path.join(APP_DATA_DIR, "startup.json")
+HID_TRACE_FILE = os.path.join(APP_DATA_DIR, "hid-trace.vmht")
+FOCUS_HISTORY_FILE = os.path.join(APP_DATA_DIR, "focus_history.json")
+UPDATE_CACHE_FILE = os.path.join(APP_DATA_DIR, "update_cache.json")
+DEVICE_CACHE_FILE = os.path.join(APP_DATA_DIR, "devices.json")
+EVENT_LOG_FILE = os.path.join(APP_DATA_DIR, "events.log")
+EVENT_DUMP_FILE = os.path.join(APP_DATA_DIR, "events-recent.txt")
+
+# --- HID TRACE ---
+# Trace file: b"VMHT" + version byte, then one record per event:
+#   <d B b H  = seconds since the trace started, kind/strategy, result, payload length
+# followed by the payload with trailing zero padding stripped.
+HID_TRACE_MAGIC = b"VMHT\x01"
+HID_TRACE_RECORD = struct.Struct("<dBbH")
+TRACE_FRAME_OUTPUT = 1
+TRACE_FRAME_FEATURE = 2
+TRACE_CONNECT = 3
+TRACE_DISCONNECT = 4
+TRACE_STRATEGIES = {'output': TRACE_FRAME_OUTPUT, 'feature': TRACE_FRAME_FEATURE}
+
+class HidRecorder:
+    # Every write attempt goes into an in-memory ring; when a path is given it is
+    # also appended to disk. The file rolls over to <path>.1 past max_bytes.
+    def __init__(self, path=None, capacity=4096, max_bytes=8 * 1024 * 1024):
+        self.ring = deque(maxlen=capacity)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.file = None
+        self.t0 = time.monotonic()
+        self.lock = threading.Lock()
+        if path: self.open_file()
+
+    def open_file(self):
+        try:
+            if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                os.replace(self.path, self.path + ".1")
+            new = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+            self.file = open(self.path, "ab")
+            if new: self.file.write(HID_TRACE_MAGIC)
+        except OSError: self.file = None
+
+    def record(self, kind, result, payload=b""):
+        payload = bytes(payload).rstrip(b"\x00")
+        entry = (time.monotonic() - self.t0, kind, max(-1, min(1, result)), payload)
+        with self.lock:
+            self.ring.append(entry)
+            if self.file:
+                try:
+                    self.file.write(HID_TRACE_RECORD.pack(entry[0], kind, entry[2], len(payload)) + payload)
+                    if self.file.tell() >= self.max_bytes:
+                        self.file.close()
+                        self.open_file()
+                except (OSError, ValueError): self.file = None
+
+    def flush(self):
+        with self.lock:
+            if self.file:
+                try: self.file.flush()
+                except (OSError, ValueError): pass
+
+    def close(self):
+        with self.lock:
+            if self.file:
+                try: self.file.close()
+                except OSError: pass
+            self.file = None
+
+    def dump(self, path):
+        with self.lock: entries = list(self.ring)
+        with open(path, "wb") as f:
+            f.write(HID_TRACE_MAGIC)
+            for t, kind, result, payload in entries:
+                f.write(HID_TRACE_RECORD.pack(t, kind, result, len(payload)) + payload)
+        return len(entries)
+
+def read_hid_trace(path):
+    with open(path, "rb") as f:
+        data = f.read()
+    if not data.startswith(HID_TRACE_MAGIC): raise ValueError(f"{path} is not a HID trace")
+    pos = len(HID_TRACE_MAGIC)
+    size = HID_TRACE_RECORD.size
+    while pos + size <= len(data):
+        t, kind, result, length = HID_TRACE_RECORD.unpack_from(data, pos)
+        pos += size
+        payload = data[pos:pos + length]
+        pos += length
+        yield t, kind, result, payload
 
 # --- HARDWARE CONTROLLER ---
 class MacroPadDevice:
@@ -246,144 +1062,1179 @@ class MacroPadDevice:
         self._connected = False
         self.vid = vendor_id
         self.pid = product_id
+        self.path = None
+        self.recorder = None
 
     def is_connected(self):
         return self._connected
 
     def scan_for_device(self):
+        # One pass: interface 1 wins, then an "mi_01" path, then the first match.
+        if not hid: return None
+        best, rank = None, 3
         try:
-            devices = hid.enumerate(self.vid, self.pid)
-            for d in devices:
+            for d in hid.enumerate(self.vid, self.pid):
                 if d.get('interface_number') == 1: return d['path']
-            for d in devices:
-                path_str = d['path'].decode('utf-8') if isinstance(d['path'], bytes) else d['path']
-                if "mi_01" in path_str.lower(): return d['path']
-            if devices: return devices[0]['path']
-        except: pass
-        return None
-
-    def connect(self):
+                r = 1 if "mi_01" in hid_path_text(d['path']).lower() else 2
+                if r < rank: best, rank = d['path'], r
+        except Exception: LOG.warning("hid", "enumerate failed", exc=True)
+        return best
+
+    def connect(self, path=None):
         if self.device:
             try: self.device.close()
-            except: pass
+            except Exception: LOG.debug("hid", "close before reconnect failed", exc=True)
             self.device = None
-        target_path = self.scan_for_device()
+        target_path = path or self.scan_for_device()
         if target_path:
             try:
                 self.device = hid.device()
                 self.device.open_path(target_path)
                 self.device.set_nonblocking(1)
                 self._connected = True
+                self.path = target_path
+                if self.recorder: self.recorder.record(TRACE_CONNECT, 1, target_path if isinstance(target_path, bytes) else str(target_path).encode())
+                LOG.info("hid", "opened %s (strategy %s)", hid_path_text(target_path), self.working_strategy)
                 return True
-            except: self.device = None
+            except Exception:
+                LOG.info("hid", "open %s failed", hid_path_text(target_path), exc=True)
+                self.device = None
         self._connected = False
         return False
 
+    def mark_disconnected(self):
+        if self.device:
+            LOG.info("hid", "closed %s", hid_path_text(self.path))
+            try: self.device.close()
+            except Exception: LOG.debug("hid", "close failed", exc=True)
+        self.device = None
+        self._connected = False
+        if self.recorder: self.recorder.record(TRACE_DISCONNECT, 1)
+
     def write_data(self, payload):
         if not self.device: return False
+        t0 = time.perf_counter() if METRICS.enabled else 0
         buf_65 = [REPORT_ID] + payload + [0] * (64 - len(payload))
         strategies = [('output', buf_65), ('feature', buf_65)]
         if self.working_strategy == 'output': strategies = [strategies[0], strategies[1]]
         elif self.working_strategy == 'feature': strategies = [strategies[1], strategies[0]]
-        for mode, buf in strategies:
+        for attempt, (mode, buf) in enumerate(strategies):
             try:
                 res = -1
                 if mode == 'output': res = self.device.write(buf)
                 else: res = self.device.send_feature_report(buf)
+                if self.recorder: self.recorder.record(TRACE_STRATEGIES[mode], 1 if res >= 0 else 0, buf)
                 if res >= 0:
                     self.working_strategy = mode
+                    if t0:
+                        METRICS.observe("hid.write", time.perf_counter() - t0)
+                        METRICS.incr(f"hid.strategy.{mode}")
+                        if attempt: METRICS.incr("hid.strategy_fallback")
                     return True
-            except: continue
+            except Exception:
+                LOG.debug("hid", "%s report raised", mode, exc=True)
+                if self.recorder: self.recorder.record(TRACE_STRATEGIES[mode], -1, buf)
+                continue
+        LOG.warning("hid", "frame %02x failed with output and feature reports", payload[0] if payload else 0)
+        METRICS.incr("hid.write_failed")
         return False
 
     def select_layer(self, layer=0): return self.write_data([0xA1, layer])
     def save_to_flash(self): return self.write_data([0xAA, 0xAA])
+
+    # Payload builders, shared by the set_* helpers and compile_preset_frames.
+    @staticmethod
+    def key_frames(action, mod, code): return ((action, 1, 1, 0, mod, 0), (action, 1, 1, 1, mod, code))
+    @staticmethod
+    def media_frames(action, b1, b2): return ((action, 2, b1, b2),)
+    @staticmethod
+    def mouse_frames(action, btn, scroll, mod=0): return ((action, 3, btn, 0, 0, scroll, mod),)
+    @staticmethod
+    def led_frame(mode): return (0xB0, 0x08, mode)
     
     def set_key(self, ui_index, mod, code, action_id_override=None):
         action = action_id_override if action_id_override else ACTION_IDS_3K_KNOB[ui_index]
-        self.write_data([action, 1, 1, 0, mod, 0])
-        return self.write_data([action, 1, 1, 1, mod, code])
+        first, second = self.key_frames(action, mod, code)
+        self.write_data(list(first))
+        return self.write_data(list(second))
 
     def set_media(self, ui_index, b1, b2, action_id_override=None):
         action = action_id_override if action_id_override else ACTION_IDS_3K_KNOB[ui_index]
-        return self.write_data([action, 2, b1, b2])
+        return self.write_data(list(self.media_frames(action, b1, b2)[0]))
 
     def set_mouse(self, ui_index, btn, scroll, mod=0, action_id_override=None):
         action = action_id_override if action_id_override else ACTION_IDS_3K_KNOB[ui_index]
-        return self.write_data([action, 3, btn, 0, 0, scroll, mod])
+        return self.write_data(list(self.mouse_frames(action, btn, scroll, mod)[0]))
+
+    def set_led(self, mode): return self.write_data(list(self.led_frame(mode)))
+
+def resource_path(relative_path):
+    try: base_path = sys._MEIPASS
+    except Exception: base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+def get_active_app_process(force=False):
+    if not user32: return None
+    hwnd = user32.GetForegroundWindow()
+    if hwnd == 0: return None
+    pid_obj = ctypes.c_ulong()
+    user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid_obj))
+    pid = pid_obj.value
+    if pid == 0: return None
+    process_name = None
+    if psutil:
+        try: process_name = psutil.Process(pid).name()
+        except (psutil.NoSuchProcess, psutil.AccessDenied): pass
+    if not process_name:
+        process_name = get_process_name_by_pid_ctypes(pid)
+    return process_name
+
+class MONITORINFO(ctypes.Structure):
+    _fields_ = [("cbSize", wintypes.DWORD), ("rcMonitor", wintypes.RECT), ("rcWork", wintypes.RECT), ("dwFlags", wintypes.DWORD)]
+
+def is_fullscreen_window(hwnd):
+    # Exclusive and borderless fullscreen both cover the whole monitor.
+    if not user32 or not hwnd or hwnd in (user32.GetDesktopWindow(), user32.GetShellWindow()): return False
+    rect, info = wintypes.RECT(), MONITORINFO()
+    info.cbSize = ctypes.sizeof(MONITORINFO)
+    if not user32.GetWindowRect(hwnd, ctypes.byref(rect)): return False
+    monitor = user32.MonitorFromWindow(hwnd, 2)  # MONITOR_DEFAULTTONEAREST
+    if not monitor or not user32.GetMonitorInfoW(monitor, ctypes.byref(info)): return False
+    m = info.rcMonitor
+    return rect.left <= m.left and rect.top <= m.top and rect.right >= m.right and rect.bottom >= m.bottom
+
+def compare_versions(latest, current):
+    try:
+        l_parts = [int(x) for x in latest.lower().lstrip('v').split('.') if x.isdigit()]
+        c_parts = [int(x) for x in current.lower().lstrip('v').split('.') if x.isdigit()]
+        for i in range(max(len(l_parts), len(c_parts))):
+            l_val = l_parts[i] if i < len(l_parts) else 0
+            c_val = c_parts[i] if i < len(c_parts) else 0
+            if l_val > c_val: return True
+            if l_val < c_val: return False
+        return False
+    except Exception:
+        LOG.debug("update", "could not compare versions %r and %r", latest, current, exc=True)
+        return False
 
-    def set_led(self, mode): return self.write_data([0xB0, 0x08, mode])
+def normalize_preset(data):
+    cleaned_data = []
+    for d in data["keys"]:
+        # validate_preset reports slots that are not objects; here they play as empty keys.
+        new_d = dict(d) if isinstance(d, dict) else {}
+        if "type" not in new_d: new_d["type"] = "key"
+        if "code" not in new_d: new_d["code"] = 0
+        if "mouse_btn" not in new_d: new_d["mouse_btn"] = 0
+        if "mouse_scroll" not in new_d: new_d["mouse_scroll"] = 0
+        if new_d["type"] == "mouse":
+            if "btn" in new_d: new_d["mouse_btn"] = new_d["btn"]
+            if "scroll" in new_d: new_d["mouse_scroll"] = new_d["scroll"]
+        cleaned_data.append(new_d)
+    return cleaned_data, data.get("led", 1)
+
+# Everything an upload writes for one preset: per-slot payload tuples, the LED
+# payload and the app-volume hotkeys to register afterwards.
+PresetFrames = namedtuple("PresetFrames", "slots led hotkeys")
+
+def compile_preset_frames(data, led_mode, layout, bank=0):
+    use_ids = ACTION_IDS_4K if layout == "4-Key" else ACTION_IDS_3K_KNOB
+    slots, hotkeys = [], []
+    for i, d in enumerate(data):
+        # Slots 5 and 6 do not exist in 4-Key mode
+        if layout == "4-Key" and i > 3: continue
+        t = d.get("type")
+        action = use_ids[i] or ACTION_IDS_3K_KNOB[i]
+        frames = ()
+        if t == "key": frames = MacroPadDevice.key_frames(action, d["mod"], d["code"])
+        elif t == "media": frames = MacroPadDevice.media_frames(action, d["b1"], d["b2"])
+        elif t == "mouse": frames = MacroPadDevice.mouse_frames(action, d["mouse_btn"], d["mouse_scroll"], d.get("mod", 0))
+        elif t in ("app_vol", "macro"):
+            # Host-side actions: the pad sends a trigger chord that a hotkey picks up
+            modifier, trigger_code, hotkey = trigger_chord(i, bank)
+            frames = MacroPadDevice.key_frames(action, modifier, trigger_code)
+            if t == "app_vol": hotkeys.append({"hotkey": hotkey, "app": d.get("app"), "action": d.get("action")})
+            else:
+                hotkeys.append({"hotkey": hotkey, "macro": parse_macro(d.get("steps", []))[0],
+                                "char_delay": d.get("char_delay_ms", 0) / 1000.0, "cancel": d.get("cancel_on_repress", True)})
+        slots.append(frames)
+    return PresetFrames(tuple(slots), MacroPadDevice.led_frame(led_mode), hotkeys)
+
+# --- PRESET INHERITANCE ---
+# A preset with a "parent" stores only what differs from it: "keys" maps slot index
+# to slot and "led"/"color" are optional. Resolved presets and their normalized slots
+# are memoized; a change to any preset drops the entries of everything below it.
+def flatten_preset(full):
+    return {"keys": [dict(d) for d in full["keys"]], "led": full.get("led", 1), "color": full.get("color", "#888888")}
+
+def derive_preset(full, parent, base):
+    # Stores full as a child of parent, keeping only the slots that differ from base.
+    mine, theirs = normalize_preset(full)[0], normalize_preset(base)[0]
+    keys = {str(i): dict(full["keys"][i]) for i in range(len(mine)) if i >= len(theirs) or mine[i] != theirs[i]}
+    data = {"parent": parent, "keys": keys}
+    for field, default in (("led", 1), ("color", "#888888")):
+        if full.get(field, default) != base.get(field, default): data[field] = full.get(field, default)
+    return data
+
+class PresetResolver:
+    BLANK = {"keys": [{"type": "key", "mod": 0, "code": 0} for _ in range(6)], "led": 1, "color": "#888888"}
+
+    def __init__(self, presets=None):
+        self.lock = threading.RLock()
+        self.reset(presets if presets is not None else {})
+
+    def reset(self, presets):
+        with self.lock:
+            self.presets = presets
+            self.cache = {}
+            self.children = None
+            self.cycles = None
+            self.broken = {}
+
+    def resolve(self, name):
+        hit = self.cache.get(name)
+        if hit is None:
+            with self.lock: hit = self._resolve(name)
+        return hit[0]
+
+    def normalized(self, name):
+        # (slots, led) for the hot path. Callers must copy before changing them.
+        hit = self.cache.get(name)
+        if hit is None:
+            with self.lock: hit = self._resolve(name)
+        return hit[1]
+
+    def _resolve(self, name):
+        hit = self.cache.get(name)
+        if hit: return hit
+        raw = self.presets[name]
+        parent = raw.get("parent")
+        if parent is None: resolved = raw
+        else:
+            loop = self.cycle_of(name)
+            if loop or parent not in self.presets:
+                # Every member of a loop is flagged at once, whichever is resolved first.
+                for member in loop or [name]:
+                    if member in self.broken: continue
+                    self.broken[member] = f"parent {parent!r} is missing" if not loop else "inherits from itself through " + " -> ".join(loop + [loop[0]])
+                    LOG.warning("presets", "%s: %s", member, self.broken[member])
+                base = self.BLANK
+            else: base = self._resolve(parent)[0]
+            keys = list(base["keys"])
+            overrides = raw.get("keys") or {}
+            for index, slot in (overrides.items() if isinstance(overrides, dict) else enumerate(overrides)):
+                index = int(index)
+                if slot is not None and 0 <= index < len(keys): keys[index] = slot
+            resolved = {"parent": parent, "keys": keys, "led": raw.get("led", base.get("led", 1)), "color": raw.get("color", base.get("color", "#888888"))}
+        hit = (resolved, normalize_preset(resolved))
+        self.cache[name] = hit
+        METRICS.incr("presets.resolved")
+        return hit
+
+    def ancestors(self, name):
+        out = []
+        while name in self.presets and name not in out:
+            out.append(name)
+            name = self.presets[name].get("parent")
+        return out[1:]
+
+    def cycle_of(self, name):
+        # The parent loop a preset is part of (starting from its lowest name), or None.
+        with self.lock:
+            if self.cycles is None:
+                self.cycles, walked = {}, {}
+                for start in self.presets:
+                    path, node = [], start
+                    while node in self.presets and node not in walked:
+                        walked[node] = start
+                        path.append(node)
+                        node = self.presets[node].get("parent")
+                    if node in self.presets and walked[node] == start:
+                        loop = path[path.index(node):]
+                        first = loop.index(min(loop))
+                        loop = loop[first:] + loop[:first]
+                        for member in loop: self.cycles[member] = loop
+            return self.cycles.get(name)
+
+    def children_of(self, name):
+        with self.lock:
+            if self.children is None:
+                self.children = {}
+                for child, data in self.presets.items():
+                    if data.get("parent") is not None: self.children.setdefault(data["parent"], []).append(child)
+            return list(self.children.get(name, ()))
+
+    def invalidate(self, *names):
+        # Call after presets change; drops each name and every preset that inherits from it.
+        with self.lock:
+            self.children = None
+            self.cycles = None
+            stack, seen = list(names), set()
+            while stack:
+                name = stack.pop()
+                if name in seen: continue
+                seen.add(name)
+                self.cache.pop(name, None)
+                self.broken.pop(name, None)
+                stack += self.children_of(name)
+        METRICS.incr("presets.invalidated", len(seen))
+
+# --- DEVICE MANAGER ---
+def hid_path_text(path):
+    return path.decode("utf-8", "replace") if isinstance(path, bytes) else str(path)
+
+def hid_device_key(path):
+    # Windows lists one path per top-level collection (&colNN, instance suffix
+    # &000N); strip those so every interface of a pad maps to one key.
+    text = re.sub(r"&col[0-9a-f]{2}", "", hid_path_text(path).lower())
+    return re.sub(r"&[0-9a-f]{4}#", "#", text)
+
+def scan_pads(vid, pid):
+    # One enumerate pass; returns one entry per pad with an "identity" added.
+    if not hid: return []
+    try: devices = hid.enumerate(vid, pid)
+    except Exception:
+        LOG.warning("hid", "enumerate failed", exc=True)
+        return []
+    tiers = ([], [], [])
+    for d in devices:
+        tiers[0 if d.get('interface_number') == 1 else 1 if "mi_01" in hid_path_text(d['path']).lower() else 2].append(d)
+    entries = tiers[0] or tiers[1] or tiers[2][:1]
+    pads, seen = [], set()
+    for d in entries:
+        key = hid_device_key(d['path'])
+        if key not in seen:
+            seen.add(key)
+            pads.append(dict(d, key=key))
+    serials = [d.get("serial_number") or "" for d in pads]
+    for d in pads:
+        serial = d.get("serial_number") or ""
+        d["identity"] = f"sn:{serial}" if serial and serials.count(serial) == 1 else d["key"]
+    return pads
+
+def write_preset_frames(pad, frames, previous=None, sleep=time.sleep, commit=True):
+    # Slots and the LED frame that already match previous are left alone.
+    ok = pad.select_layer(0)
+    sleep(0.05)
+    for i, slot in enumerate(frames.slots):
+        if previous and i < len(previous.slots) and previous.slots[i] == slot: continue
+        for payload in slot: ok = pad.write_data(list(payload)) and ok
+        sleep(0.02)
+    if not previous or previous.led != frames.led: ok = pad.write_data(list(frames.led)) and ok
+    if commit: ok = pad.save_to_flash() and ok
+    return ok
+
+class PadChannel:
+    # An additional pad: its own device handle, trigger bank and upload worker.
+    # Requests that arrive while an upload runs collapse into the newest one.
+    def __init__(self, engine, identity, path, serial, bank):
+        self.engine = engine
+        self.identity = identity
+        self.path = path
+        self.serial = serial
+        self.bank = bank
+        self.pad = MacroPadDevice(engine.cfg_vid, engine.cfg_pid)
+        self.target = None
+        self.preset = None
+        self.pad_image = None
+        self.hotkeys = []
+        self.pending = None
+        self.uploading = False
+        self.running = True
+        self.cond = threading.Condition()
+        self.thread = threading.Thread(target=self.upload_loop, daemon=True, name=f"pad-upload-{bank}")
+        self.thread.start()
+
+    def request(self, name, full=False):
+        with self.cond:
+            self.target = name
+            self.pending = (name, full or bool(self.pending and self.pending[1]))
+            self.cond.notify()
+
+    def upload_loop(self):
+        while True:
+            with self.cond:
+                while self.running and not self.pending: self.cond.wait()
+                if not self.running: return
+                (name, full), self.pending = self.pending, None
+                self.uploading = True
+            try: self.upload(name, full)
+            except Exception:
+                LOG.error("devices", "upload of %s to %s failed", name, self.identity)
+                METRICS.incr("upload.failed")
+            finally:
+                with self.cond:
+                    self.uploading = False
+                    self.cond.notify_all()
+
+    def upload(self, name, full):
+        engine = self.engine
+        if name not in engine.presets or not self.pad.is_connected(): return False
+        t0 = time.perf_counter() if METRICS.enabled else 0
+        data, led = engine.resolver.normalized(name)
+        frames = compile_preset_frames(data, led, engine.cfg_layout, self.bank)
+        previous = None if full else self.pad_image
+        self.pad_image = None
+        ok = engine.write_frames(self.pad, frames, previous)
+        if ok: self.pad_image = frames
+        else:
+            LOG.warning("devices", "writes to %s failed while uploading %s", self.identity, name)
+            METRICS.incr("upload.failed")
+        self.preset = name
+        engine.devices.remember(self.identity, self.pad)
+        if frames.hotkeys != self.hotkeys:
+            self.hotkeys = frames.hotkeys
+            engine.refresh_hotkeys(engine.all_hotkeys())
+        if t0: METRICS.observe("upload.device", time.perf_counter() - t0)
+        return ok
+
+    def wait_idle(self, timeout=None):
+        with self.cond: return self.cond.wait_for(lambda: not self.pending and not self.uploading, timeout)
+
+    def stop(self):
+        with self.cond:
+            self.running = False
+            self.cond.notify_all()
+        self.pad.mark_disconnected()
+
+class DeviceManager:
+    # Tracks every attached pad by identity (serial number, or the interface path
+    # when serials are missing or shared). The primary pad is the engine's own
+    # MacroPadDevice and follows the main library; every other pad gets a
+    # PadChannel and a per-device config: a display name, a pinned preset and an
+    # app table of its own. Unpinned pads follow the primary's preset.
+    def __init__(self, engine, cache_path=DEVICE_CACHE_FILE):
+        self.engine = engine
+        self.pads = {}
+        self.config = {}
+        self.primary_identity = None
+        self.lock = threading.RLock()
+        # Last working interface path and report strategy per identity, so a
+        # reconnect skips discovery (devices.json).
+        self.cache_path = cache_path
+        self.known = None
+
+    def load_config(self, conf):
+        self.primary_identity = conf.get("primary", self.primary_identity)
+        self.config = {k: dict(v) for k, v in conf.get("pads", {}).items()}
+
+    def config_values(self):
+        return {"primary": self.primary_identity, "pads": self.config}
+
+    def scan(self):
+        return scan_pads(self.engine.cfg_vid, self.engine.cfg_pid)
+
+    def primary_entry(self, entries):
+        # The connected primary keeps its pad; otherwise prefer the remembered
+        # primary, then a pad without per-device settings.
+        pad = self.engine.pad
+        if pad.is_connected():
+            return next((e for e in entries if e["path"] == pad.path), None)
+        with self.lock: owned = {ch.path for ch in self.pads.values()}
+        free = [e for e in entries if e["path"] not in owned]
+        if not free: return None
+        for e in free:
+            if e["identity"] == self.primary_identity: return e
+        for e in free:
+            if e["identity"] not in self.config: return e
+        return free[0]
+
+    # --- Connection cache ---
+    def load_known(self):
+        if self.known is None:
+            self.known = {}
+            if os.path.exists(self.cache_path):
+                try:
+                    with open(self.cache_path, "r") as f: self.known = json.load(f)
+                except Exception: LOG.warning("devices", "could not read %s", self.cache_path, exc=True)
+        return self.known
+
+    def remember(self, identity, pad):
+        if not identity or not pad.path: return
+        entry = {"path": hid_path_text(pad.path), "bytes": isinstance(pad.path, bytes), "strategy": pad.working_strategy}
+        known = self.load_known()
+        if known.get(identity) == entry: return
+        known[identity] = entry
+        try:
+            with open(self.cache_path, "w") as f: json.dump(known, f, indent=4)
+        except Exception: LOG.warning("devices", "could not write %s", self.cache_path, exc=True)
+
+    def connect(self, pad, entry):
+        # Opens a scanned pad with the report strategy it last worked with.
+        known = self.load_known().get(entry["identity"], {})
+        if known.get("strategy"): pad.working_strategy = known["strategy"]
+        if not pad.connect(entry["path"]): return False
+        self.remember(entry["identity"], pad)
+        return True
+
+    def fast_connect(self, pad):
+        # Reopens the primary's last path directly, without enumerating. Any
+        # failure falls back to a full scan.
+        known = self.load_known().get(self.primary_identity)
+        if not known or pad.is_connected(): return False
+        path = known["path"].encode("utf-8") if known.get("bytes") else known["path"]
+        pad.working_strategy = known.get("strategy")
+        if pad.connect(path):
+            METRICS.incr("hid.fast_connect")
+            return True
+        METRICS.incr("hid.fast_connect_failed")
+        return False
+
+    def sync(self, entries):
+        # Called from the connection poll with the same scan: opens new pads and
+        # drops the ones that went away.
+        primary = self.engine.pad.path if self.engine.pad.is_connected() else None
+        present = {}
+        for e in entries:
+            if e["path"] == primary:
+                if e["identity"] != self.primary_identity:
+                    self.primary_identity = e["identity"]
+                    self.engine.save_config_state()
+            # While the primary is away its pad is kept free for it
+            elif primary or e["identity"] != self.primary_identity: present[e["identity"]] = e
+        changed = False
+        with self.lock:
+            for identity in [i for i, ch in self.pads.items() if i not in present or present[i]["path"] != ch.path or not ch.pad.is_connected()]:
+                LOG.info("devices", "%s removed", identity)
+                self.pads.pop(identity).stop()
+                changed = True
+            for identity, e in present.items():
+                if identity in self.pads: continue
+                banks = {ch.bank for ch in self.pads.values()}
+                bank = next((b for b in range(1, TRIGGER_BANKS) if b not in banks), None)
+                if bank is None: break
+                ch = PadChannel(self.engine, identity, e["path"], e.get("serial_number"), bank)
+                ch.pad.recorder = self.engine.pad.recorder
+                if not self.connect(ch.pad, e):
+                    ch.stop()
+                    continue
+                self.pads[identity] = ch
+                LOG.info("devices", "%s added with trigger bank %d", identity, bank)
+                changed = True
+                target = self.target_for(ch)
+                if target: ch.request(target, full=True)
+        if changed:
+            self.engine.refresh_hotkeys(self.engine.all_hotkeys())
+            self.engine.update_polling()
+            self.engine.emit("devices")
+        return changed
+
+    def target_for(self, ch, app=None):
+        conf = self.config.get(ch.identity, {})
+        app = app if app is not None else self.engine.last_focus_app
+        name = conf.get("mappings", {}).get(app) if app else None
+        name = name or conf.get("preset") or self.engine.current_preset_name
+        return name if name in self.engine.presets else self.engine.current_preset_name
+
+    def follow(self, app=None):
+        # Queues an upload on every pad whose target changed; each pad's worker
+        # writes in parallel with the others and with the primary.
+        with self.lock: channels = list(self.pads.values())
+        for ch in channels:
+            target = self.target_for(ch, app)
+            if target and target != ch.target: ch.request(target)
+
+    def has_mappings(self):
+        with self.lock: return any(self.config.get(i, {}).get("mappings") for i in self.pads)
+
+    def hotkeys(self):
+        with self.lock: return [hk for ch in self.pads.values() for hk in ch.hotkeys]
+
+    def wait_idle(self, timeout=None):
+        with self.lock: channels = list(self.pads.values())
+        return all(ch.wait_idle(timeout) for ch in channels)
+
+    def stop(self):
+        with self.lock:
+            for ch in self.pads.values(): ch.stop()
+            self.pads.clear()
+
+    def describe(self):
+        engine, out = self.engine, []
+        if engine.pad.is_connected():
+            out.append({"id": self.primary_identity, "role": "primary", "connected": True, "path": hid_path_text(engine.pad.path),
+                        "preset": engine.current_preset_name, "uploading": engine.is_uploading})
+        with self.lock: channels = sorted(self.pads.values(), key=lambda c: c.bank)
+        for ch in channels:
+            conf = self.config.get(ch.identity, {})
+            out.append({"id": ch.identity, "role": "extra", "connected": ch.pad.is_connected(), "path": hid_path_text(ch.path),
+                        "serial": ch.serial, "name": conf.get("name"), "preset": ch.preset, "uploading": ch.uploading or bool(ch.pending),
+                        "assigned": conf.get("preset"), "mappings": conf.get("mappings", {})})
+        listed = {d["id"] for d in out}
+        for identity, conf in sorted(self.config.items()):
+            if identity not in listed:
+                out.append({"id": identity, "role": "extra", "connected": False, "name": conf.get("name"),
+                            "assigned": conf.get("preset"), "mappings": conf.get("mappings", {})})
+        return out
+
+    def resolve(self, ref):
+        # Accepts the 1-based position from describe(), an identity or part of one, or a name.
+        listing = self.describe()
+        ref = str(ref or "")
+        if ref.isdigit() and 1 <= int(ref) <= len(listing): return listing[int(ref) - 1]
+        for d in listing:
+            if ref == d["id"] or (ref and ref == d.get("name")): return d
+        matches = [d for d in listing if ref and ref.lower() in str(d["id"]).lower()]
+        if len(matches) == 1: return matches[0]
+        raise ValueError(f"Unknown device: {ref}")
+
+    def configure(self, ref, **changes):
+        # changes: name, preset (None = follow the primary), map={app: preset}, unmap=app
+        device = self.resolve(ref)
+        if device["role"] == "primary": raise ValueError("The primary pad follows the main presets and app links")
+        # Copied rather than edited in place so save_config_state sees the change
+        conf = dict(self.config.get(device["id"], {}))
+        conf["mappings"] = dict(conf.get("mappings", {}))
+        if "name" in changes: conf["name"] = changes["name"]
+        if "preset" in changes:
+            if changes["preset"] and changes["preset"] not in self.engine.presets: raise ValueError(f"Unknown preset: {changes['preset']}")
+            conf["preset"] = changes["preset"]
+        for app, preset in (changes.get("map") or {}).items():
+            if preset not in self.engine.presets: raise ValueError(f"Unknown preset: {preset}")
+            conf["mappings"][app] = preset
+        if changes.get("unmap"): conf["mappings"].pop(changes["unmap"], None)
+        self.config = dict(self.config)
+        self.config[device["id"]] = {k: v for k, v in conf.items() if v}
+        self.engine.save_config_state()
+        self.engine.update_polling()
+        self.follow()
+        self.engine.emit("devices")
+        return self.resolve(device["id"])
+
+# --- PRESET BUNDLES ---
+# Presets compiled ahead of time for provisioning pads (vmacropad.py compile/flash).
+# b"VMPB" + version byte, then <BBH = layout index, trigger bank, preset count, and
+# per preset:
+#   <H name length + utf-8 name, 20-byte SHA-1 of the frame data, the frame data
+#   (B slot count; per slot B frame count and per frame B length + payload; then
+#   B length + LED payload), <I length + JSON list of the trigger hotkeys.
+BUNDLE_MAGIC = b"VMPB\x01"
+BUNDLE_HEADER = struct.Struct("<BBH")
+BUNDLE_LAYOUTS = ("3-Key + Knob", "4-Key")
+BundlePreset = namedtuple("BundlePreset", "name digest frames")
+
+def is_usage(value, table): return isinstance(value, int) and value in table
+
+def validate_preset(data, layout):
+    keys = data.get("keys") if isinstance(data, dict) else None
+    if not isinstance(keys, list) or not keys: return ["no key list"]
+    errors = []
+    if data.get("led", 1) not in LED_MODES.values(): errors.append(f"LED mode {data.get('led')!r} is not one of {sorted(LED_MODES.values())}")
+    wheel = set(MOUSE_WHEEL.values())
+    for i, d in enumerate(keys[:4 if layout == "4-Key" else 6]):
+        if not isinstance(d, dict):
+            errors.append(f"slot {i + 1}: not an object")
+            continue
+        slot, t, mod = f"slot {i + 1}", d.get("type", "key"), d.get("mod", 0)
+        if t in ("key", "mouse") and not (isinstance(mod, int) and 0 <= mod <= 255): errors.append(f"{slot}: modifier {mod!r} out of range")
+        if t == "key":
+            if not is_usage(d.get("code", 0), KEY_USAGES): errors.append(f"{slot}: key code {d.get('code')!r} is not a keyboard usage")
+        elif t == "media":
+            b1, b2 = d.get("b1"), d.get("b2")
+            if not (isinstance(b1, int) and isinstance(b2, int) and ((b1, b2) in MEDIA_NAMES or 0 <= b1 <= 255 and 0 < b1 | b2 << 8 <= 0x3FF)):
+                errors.append(f"{slot}: media code {b1!r}/{b2!r} is not a consumer usage")
+        elif t == "mouse":
+            btn = d.get("mouse_btn", d.get("btn", 0))
+            if not (isinstance(btn, int) and not btn & ~MOUSE_BUTTON_MASK): errors.append(f"{slot}: mouse button {btn!r} is not a combination of MOUSE_BUTTONS")
+            if not is_usage(d.get("mouse_scroll", d.get("scroll", 0)), wheel): errors.append(f"{slot}: scroll {d.get('mouse_scroll', d.get('scroll'))!r} is not in MOUSE_WHEEL")
+        elif t == "app_vol":
+            if not d.get("app"): errors.append(f"{slot}: no app name")
+            if d.get("action") not in ("up", "down", "mute"): errors.append(f"{slot}: app action {d.get('action')!r} is not up, down or mute")
+        elif t == "macro":
+            errors += [f"{slot}: {e}" for e in parse_macro(d.get("steps", []))[1]]
+        else: errors.append(f"{slot}: unknown type {t!r}")
+    return errors
+
+def encode_frames(frames):
+    out = bytearray([len(frames.slots)])
+    for slot in frames.slots:
+        out.append(len(slot))
+        for payload in slot: out += bytes([len(payload)]) + bytes(payload)
+    return bytes(out + bytes([len(frames.led)]) + bytes(frames.led))
+
+def decode_frames(blob, pos):
+    def take(n):
+        nonlocal pos
+        chunk = blob[pos:pos + n]
+        if len(chunk) != n: raise ValueError("bundle is truncated")
+        pos += n
+        return chunk
+    slots = []
+    for _ in range(take(1)[0]):
+        slots.append(tuple(tuple(take(take(1)[0])) for _ in range(take(1)[0])))
+    led = tuple(take(take(1)[0]))
+    return tuple(slots), led, pos
+
+def compile_bundle(presets, layout, bank=0, names=None):
+    # Raises ValueError listing every invalid slot; nothing is written for a bad library.
+    errors, body = [], []
+    resolver = PresetResolver(presets)
+    for name in names or list(presets):
+        if name not in presets:
+            errors.append(f"{name}: no such preset")
+            continue
+        problems = validate_preset(resolver.resolve(name), layout)
+        if name in resolver.broken: problems.insert(0, resolver.broken[name])
+        if problems:
+            errors += [f"{name}: {e}" for e in problems]
+            continue
+        data, led = resolver.normalized(name)
+        frames = compile_preset_frames(data, led, layout, bank)
+        blob = encode_frames(frames)
+        table = json.dumps(frames.hotkeys).encode("utf-8")
+        raw = name.encode("utf-8")
+        body.append(struct.pack("<H", len(raw)) + raw + hashlib.sha1(blob).digest() + blob + struct.pack("<I", len(table)) + table)
+    if errors: raise ValueError("\n".join(errors))
+    return BUNDLE_MAGIC + BUNDLE_HEADER.pack(BUNDLE_LAYOUTS.index(layout), bank, len(body)) + b"".join(body)
+
+def read_bundle(blob):
+    # Returns (layout, bank, [BundlePreset]); each preset's frames are checked against its hash.
+    if not blob.startswith(BUNDLE_MAGIC): raise ValueError("not a VMacropad bundle")
+    pos = len(BUNDLE_MAGIC)
+    layout, bank, count = BUNDLE_HEADER.unpack_from(blob, pos)
+    pos += BUNDLE_HEADER.size
+    presets = []
+    for _ in range(count):
+        (length,) = struct.unpack_from("<H", blob, pos)
+        name = blob[pos + 2:pos + 2 + length].decode("utf-8")
+        pos += 2 + length
+        digest = blob[pos:pos + 20]
+        start = pos + 20
+        slots, led, pos = decode_frames(blob, start)
+        if hashlib.sha1(blob[start:pos]).digest() != digest: raise ValueError(f"{name}: frame data does not match its hash")
+        (length,) = struct.unpack_from("<I", blob, pos)
+        hotkeys = json.loads(blob[pos + 4:pos + 4 + length])
+        pos += 4 + length
+        presets.append(BundlePreset(name, digest.hex(), PresetFrames(slots, led, hotkeys)))
+    return BUNDLE_LAYOUTS[layout], bank, presets
+
+# --- FOCUS HISTORY ---
+class FocusHistory:
+    # Per-app counts of which app took focus next, kept across sessions. The engine
+    # uses it to guess the next preset switch and compile its frames ahead of time.
+    def __init__(self, path=None, max_apps=200):
+        self.path = path
+        self.max_apps = max_apps
+        self.transitions = {}
+        self.predictions = 0
+        self.hits = 0
+        self.unsaved = 0
+
+    def load(self):
+        if not self.path or not os.path.exists(self.path): return
+        try:
+            with open(self.path, "r") as f: data = json.load(f)
+            self.transitions = {a: {b: int(n) for b, n in nxt.items()} for a, nxt in data.get("transitions", {}).items()}
+            self.predictions = data.get("predictions", 0)
+            self.hits = data.get("hits", 0)
+        except Exception: LOG.warning("focus", "could not read %s", self.path, exc=True)
+
+    def save(self):
+        if not self.path or not self.unsaved: return
+        if len(self.transitions) > self.max_apps:
+            ranked = sorted(self.transitions, key=lambda a: sum(self.transitions[a].values()), reverse=True)
+            self.transitions = {a: self.transitions[a] for a in ranked[:self.max_apps]}
+        try:
+            with open(self.path, "w") as f:
+                json.dump({"transitions": self.transitions, "predictions": self.predictions, "hits": self.hits}, f)
+            self.unsaved = 0
+        except Exception: LOG.warning("focus", "could not write %s", self.path, exc=True)
+
+    def record(self, prev, app):
+        if not prev or not app or prev == app: return
+        nxt = self.transitions.setdefault(prev, {})
+        nxt[app] = nxt.get(app, 0) + 1
+        self.unsaved += 1
+        if self.unsaved >= 25: self.save()
+
+    def predict(self, app, resolve, exclude=None):
+        # Most frequent next preset after app; resolve maps an app to its preset.
+        scores = {}
+        for nxt, n in self.transitions.get(app, {}).items():
+            target = resolve(nxt)
+            if target and target != exclude: scores[target] = scores.get(target, 0) + n
+        return max(scores, key=scores.get) if scores else None
+
+    def score(self, predicted, actual):
+        if predicted is None: return
+        self.predictions += 1
+        if predicted == actual: self.hits += 1
+
+    def stats(self):
+        rate = round(self.hits / self.predictions, 3) if self.predictions else None
+        return {"predictions": self.predictions, "hits": self.hits, "hit_rate": rate, "apps": len(self.transitions)}
+
+# --- TRAY ICON ---
+TRAY_IMAGE_CACHE = {}
+
+def render_tray_image(connected, color):
+    key = (connected, color if connected else None)
+    img = TRAY_IMAGE_CACHE.get(key)
+    if img is not None: return img
+    img = Image.new('RGBA', (64, 64), (0,0,0,0))
+    d = ImageDraw.Draw(img)
+    if not connected:
+        d.rounded_rectangle([2, 2, 62, 62], 16, fill="black", outline="#ff3d00", width=4)
+        d.line((18, 18, 46, 46), fill="#ff3d00", width=6)
+        d.line((46, 18, 18, 46), fill="#ff3d00", width=6)
+    else:
+        d.rounded_rectangle([2, 2, 62, 62], 16, fill=color, outline=color, width=0)
+        d.line((16, 20, 32, 48), fill="white", width=6)
+        d.line((32, 48, 48, 20), fill="white", width=6)
+    TRAY_IMAGE_CACHE[key] = img
+    return img
+
+class NotificationQueue:
+    # Notices are grouped by category. Everything posted to a category within `window`
+    # seconds becomes one toast, and a category shows at most one toast per interval.
+    # A single scheduler task delivers them, so bursts never pile up threads.
+    INTERVALS = {"preset": 5.0, "status": 10.0}
+
+    def __init__(self, scheduler, deliver, window=1.0, intervals=None, clock=time.monotonic):
+        self.scheduler = scheduler
+        self.deliver = deliver
+        self.window = window
+        self.intervals = dict(self.INTERVALS, **(intervals or {}))
+        self.clock = clock
+        self.lock = threading.Lock()
+        self.pending = {}
+        self.last_sent = {}
+
+    def post(self, title, message, category="info"):
+        now = self.clock()
+        with self.lock:
+            entry = self.pending.get(category)
+            if entry:
+                entry[1:] = [entry[1] + 1, title, message]
+                METRICS.incr("notify.merged")
+            else: self.pending[category] = [now, 1, title, message]
+            self._schedule(now)
+
+    def due(self, category, entry):
+        return max(entry[0] + self.window, self.last_sent.get(category, float("-inf")) + self.intervals.get(category, 0.0))
+
+    def _schedule(self, now):
+        if self.pending:
+            delay = min(self.due(c, e) for c, e in self.pending.items()) - now
+            self.scheduler.call_later(max(0.0, delay), self.flush, name="notify_flush")
+
+    def flush(self):
+        now = self.clock()
+        with self.lock:
+            ready = [(c, e) for c, e in self.pending.items() if self.due(c, e) <= now]
+            for c, e in ready:
+                del self.pending[c]
+                self.last_sent[c] = now
+            self._schedule(now)
+        for category, (first, count, title, message) in ready:
+            if count > 1:
+                LOG.debug("tray", "merged %d %s notices", count, category)
+                message = f"{message} ({count} changes)"
+            METRICS.incr("notify.shown")
+            try: self.deliver(title, message)
+            except Exception: LOG.warning("tray", "could not show notification", exc=True)
+
+    def clear(self):
+        self.scheduler.cancel("notify_flush")
+        with self.lock: self.pending.clear()
+
+class TrayController:
+    def __init__(self, engine, on_open, on_quit):
+        self.engine = engine
+        self.on_open = on_open
+        self.on_quit = on_quit
+        self.tray_icon = None
+        self.tray_menu_key = None
+        self.tray_checked_preset = None
+        self.lock = threading.RLock()
+        self.notices = NotificationQueue(engine.scheduler, self.show_notification)
+        engine.subscribe(self.on_engine_event)
+
+    def on_engine_event(self, event, *args):
+        # Bursts of changes collapse into one icon/menu refresh.
+        if event in ("status", "preset", "presets", "preset_added", "preset_removed", "update"): self.engine.scheduler.call_later(0.05, self.update_tray_icon, name="tray_refresh")
+        elif event == "notify": self.notify_user(*args)
+        elif event == "config":
+            if self.engine.cfg_tray_enabled: self.start()
+            else: self.stop()
+
+    def start(self):
+        if self.engine.cfg_tray_enabled and not self.tray_icon: self.update_tray_icon()
+
+    def stop(self):
+        with self.lock:
+            if self.tray_icon:
+                try: self.tray_icon.stop()
+                except Exception: LOG.warning("tray", "could not stop the tray icon", exc=True)
+            self.tray_icon = None
+            self.tray_menu_key = None
+        self.notices.clear()
+
+    def notify_user(self, title, message, category="info"):
+        if self.tray_icon: self.notices.post(title, message, category)
+
+    def show_notification(self, title, message):
+        if self.tray_icon: self.tray_icon.notify(message, title)
+
+    def update_tray_icon(self):
+        engine = self.engine
+        if not engine.running or not engine.cfg_tray_enabled or not load_tray_libs(): return
+        with self.lock:
+            connected = engine.is_connected()
+            color = "#888888"
+            if connected and engine.current_preset_name in engine.presets:
+                color = engine.resolver.resolve(engine.current_preset_name).get("color", "#888888")
+            img = render_tray_image(connected, color)
+            menu_key = (tuple(engine.presets), engine.update_info)
+            if self.tray_icon:
+                if self.tray_icon.icon is not img: self.tray_icon.icon = img
+                if menu_key != self.tray_menu_key:
+                    self.tray_menu_key = menu_key
+                    self.tray_icon.menu = self.create_tray_menu()
+                elif engine.current_preset_name != self.tray_checked_preset:
+                    try: self.tray_icon.update_menu()
+                    except Exception: LOG.warning("tray", "could not refresh the tray menu", exc=True)
+            else:
+                self.tray_menu_key = menu_key
+                self.tray_icon = pystray.Icon("VMacropad", img, "V Macropad", self.create_tray_menu())
+                threading.Thread(target=self.tray_icon.run, daemon=True).start()
+            self.tray_checked_preset = engine.current_preset_name
+
+    def _make_tray_action(self, name): return lambda icon, item: self.engine.tray_activate_preset(name)
+    def _make_tray_check(self, name): return lambda item: self.engine.current_preset_name == name
+
+    def dump_events(self):
+        try: count = self.engine.dump_events()
+        except OSError:
+            LOG.error("tray", "could not write %s", EVENT_DUMP_FILE)
+            return
+        if hasattr(os, "startfile"): os.startfile(EVENT_DUMP_FILE)
+        else: self.notify_user("Events saved", f"{count} events written to {EVENT_DUMP_FILE}")
+
+    def create_tray_menu(self):
+        items = [pystray.MenuItem("Open", lambda icon, item: self.on_open(), default=True), pystray.Menu.SEPARATOR]
+        for name in self.engine.presets:
+            items.append(pystray.MenuItem(name, self._make_tray_action(name), checked=self._make_tray_check(name)))
+        items.append(pystray.Menu.SEPARATOR)
+        if self.engine.update_info:
+            version, url = self.engine.update_info
+            items.append(pystray.MenuItem(f"Download {version}", lambda icon, item: webbrowser.open(url)))
+        items.append(pystray.MenuItem("Dump recent events", lambda icon, item: self.dump_events()))
+        items.append(pystray.MenuItem("Quit", lambda icon, item: self.on_quit()))
+        return pystray.Menu(*items)
+
+# --- STARTUP TIMING ---
+class StartupTimer:
+    # Seconds since this module started importing, recorded once per phase. The
+    # report is written when the first upload completes, the last phase of a boot.
+    PHASES = ("import", "engine_start", "ui_build", "first_connect", "first_upload")
 
-# --- MAIN APPLICATION ---
-class VMacroApp(ctk.CTk):
     def __init__(self):
-        super().__init__()
-        
-        self.load_config_early()
-        
-        ctk.set_appearance_mode("dark")
-        ctk.set_default_color_theme("dark-blue")
-        self.title(f"V Macropad Manager")
-        self.geometry("1000x700")
-        self.configure(fg_color=Theme.MAIN_BG)
-        self.protocol("WM_DELETE_WINDOW", self.on_close_attempt)
-        self.minsize(950, 650)
-        
+        self.marks = {}
+
+    def mark(self, phase, value=None):
+        if phase in self.marks: return
+        self.marks[phase] = value if value is not None else time.perf_counter() - PROCESS_T0
+        if phase == "first_upload": self.write_report()
+
+    def report(self):
+        return {phase: round(self.marks[phase] * 1000, 1) for phase in self.PHASES if phase in self.marks}
+
+    def write_report(self):
+        try:
+            with open(STARTUP_REPORT_FILE, "w") as f:
+                json.dump({"version": CURRENT_VERSION, "phases_ms": self.report()}, f, indent=4)
+        except Exception: LOG.warning("config", "could not write %s", STARTUP_REPORT_FILE, exc=True)
+
+# --- UPDATE CHECK ---
+class UpdateChecker:
+    # Asks the releases API at most once per interval. The last release and its
+    # ETag/Last-Modified are cached on disk, so a due check is a conditional request
+    # and an unchanged release comes back as a bodyless 304.
+    def __init__(self, url=None, cache_path=UPDATE_CACHE_FILE, interval=24 * 3600):
+        self.url = url or os.getenv("VMACROPAD_UPDATE_URL") or GITHUB_REPO_API
+        self.cache_path = cache_path
+        self.interval = interval
+        self.cache = None
+
+    def load_cache(self):
+        if self.cache is None:
+            self.cache = {}
+            if os.path.exists(self.cache_path):
+                try:
+                    with open(self.cache_path, "r") as f: self.cache = json.load(f)
+                except Exception: LOG.warning("update", "could not read %s", self.cache_path, exc=True)
+            if self.cache.get("url") != self.url: self.cache = {"url": self.url}
+        return self.cache
+
+    def save_cache(self):
         try:
-            icon_path = self.resource_path("vmacropad.ico")
-            self.iconbitmap(icon_path)
-        except Exception: pass
+            with open(self.cache_path, "w") as f: json.dump(self.cache, f, indent=4)
+        except Exception: LOG.warning("update", "could not write %s", self.cache_path, exc=True)
+
+    def next_check_in(self):
+        return max(0.0, self.load_cache().get("checked_at", 0) + self.interval - time.time())
+
+    def check(self, force=False):
+        # Returns the latest known release ({"tag_name", "html_url"}) or None.
+        cache = self.load_cache()
+        if not force and self.next_check_in() > 0: return cache.get("release")
+        if not load_requests(): return cache.get("release")
+        headers = {"Accept": "application/vnd.github+json", "User-Agent": f"VMacropad/{CURRENT_VERSION}"}
+        if cache.get("release"):
+            if cache.get("etag"): headers["If-None-Match"] = cache["etag"]
+            if cache.get("last_modified"): headers["If-Modified-Since"] = cache["last_modified"]
+        try: r = requests.get(self.url, headers=headers, timeout=5)
+        except Exception:
+            LOG.info("update", "request to %s failed", self.url, exc=True)
+            return cache.get("release")
+        LOG.info("update", "%s answered %d", self.url, r.status_code)
+        METRICS.incr(f"update.http_{r.status_code}")
+        if r.status_code == 200:
+            try: data = r.json()
+            except ValueError: data = {}
+            cache["release"] = {"tag_name": data.get("tag_name", "v0.0.0"), "html_url": data.get("html_url", "https://github.com/visiuun/VMacropad/releases")}
+            cache["etag"] = r.headers.get("ETag")
+            cache["last_modified"] = r.headers.get("Last-Modified")
+        # Any answer, including 304 and rate-limit errors, counts as a check.
+        cache["checked_at"] = time.time()
+        cache["status"] = r.status_code
+        self.save_cache()
+        return cache.get("release")
+
+# --- ENGINE ---
+# Poll intervals while game mode holds the pad.
+GAME_FOCUS_POLL_S = 1.0
+GAME_CONN_POLL_S = 30.0
+GAME_CHECK_POLL_S = 2.0
+UPDATE_MAX_HOURS = 24 * 30
+
+class MacroEngine:
+    # Device connection, focus switching, hotkeys and audio control. Runs without
+    # Tk; the editor and the tray observe it through subscribe().
+    def __init__(self):
+        self.devices = DeviceManager(self)
+        self.load_config_early()
 
         self.pad = MacroPadDevice(self.cfg_vid, self.cfg_pid)
+        if self.cfg_hid_trace: self.set_hid_trace(True)
+        self.resolver = PresetResolver()
         self.presets = self.load_presets()
         self.app_mappings = self.load_mappings()
-        
+
         self.current_data = [{"type": "key", "mod": 0, "code": 0, "mouse_btn": 0, "mouse_scroll": 0} for _ in range(6)]
         self.led_mode = 1
-        self.selected_key_index = 0
         self.current_preset_name = None
-        
+
         self.is_uploading = False
         self.upload_lock = threading.Lock()
+        self.state_lock = threading.Lock()
+        # Presets, mappings and the active preset are edited from the focus poll,
+        # control connections, the tray and the editor.
+        self.library_lock = threading.RLock()
+        self.upload_idle = threading.Event()
+        self.upload_idle.set()
         self.connected_last_frame = False
-        self.tray_icon = None
         self.running = True
-
+        self.init_complete = False
+        self.stopped = threading.Event()
+        self.listeners = []
+        self.update_info = None
+        self.update_checker = UpdateChecker()
+        self.library_version = 0
+        self.startup = StartupTimer()
+        self.startup.mark("import", STARTUP_IMPORT_TIME)
+
+        # Focus source, clock and sleep are injectable so the switching logic can be
+        # driven by a simulated timeline (tools/focus_sim.py).
+        self.get_foreground_app = get_active_app_process
+        self.is_fullscreen = is_fullscreen_window
+        self.clock = time.monotonic
+        self.sleep = time.sleep
         self.last_detected_target = None
         self.last_hwnd = None
         self.focus_timer_start = 0
+        self.focus_changed_at = 0
+        self.switch_started_at = None
         self.last_auto_uploaded_preset = None
         self.manual_override = False
 
-        self.active_hotkeys = []
-
-        self.grid_columnconfigure(1, weight=1)
-        self.grid_rowconfigure(0, weight=1)
-
-        self.setup_sidebar()
-        self.setup_main_area()
-        self.load_config_state_ui_vars()
+        # Switch prediction. staged_frames holds compiled frames for the pending and
+        # predicted presets; pad_image is what was last written to the pad (None when
+        # unknown) so an upload only rewrites the slots that differ.
+        self.focus_history = FocusHistory(FOCUS_HISTORY_FILE)
+        self.last_focus_app = None
+        self.predicted_preset = None
+        self.staged_frames = {}
+        self.pad_image = None
+
+        # Game mode: once a fullscreen or listed app has its preset, polling slows to a
+        # foreground-window compare and uploads and flash commits that can wait are
+        # held until it loses focus.
+        self.game = None
+        self.game_checked = (None, 0, False)
+        self.game_probe = (None, None)
+        self.deferred_upload = None
+        self.uncommitted = set()
+
+        self.hotkeys = HotkeyRegistry(self.run_hotkey)
+        self.primary_hotkeys = []
+        self.scheduler = Scheduler()
+        self.conn_poll_interval = 2.0
+        self.fast_path_ok = True
+        self.last_scan = None
+        self.macros = MacroRunner()
+
+    # Replacing the library resets the resolved-preset cache.
+    @property
+    def presets(self): return self.resolver.presets
+
+    @presets.setter
+    def presets(self, presets): self.resolver.reset(presets)
+
+    def subscribe(self, callback):
+        self.listeners.append(callback)
+
+    def emit(self, event, *args):
+        for callback in list(self.listeners):
+            try: callback(event, *args)
+            except Exception: LOG.error("engine", "listener failed on %s", event)
+
+    def start(self):
+        self.focus_history.load()
+        self.load_config_state_vars()
         self.save_config_state()
-        self.refresh_preset_list() 
         self.force_refresh_startup()
-        self.perform_initial_connection()
-        self.setup_tray()
-        
+        self.scheduler.start()
         if self.cfg_check_updates and "requests" not in MISSING_LIBS:
-            threading.Thread(target=self.perform_update_check, daemon=True).start()
-        
-        self.check_conn_loop()
-        self.app_monitor_loop()
-        
+            self.scheduler.submit(self.perform_update_check, name="update_check")
+        self.scheduler.submit(self.initial_connect, name="connect")
         self.init_complete = True
-        
-        if self.cfg_tray_enabled: self.withdraw() 
-        else: self.deiconify()
+        self.startup.mark("engine_start")
+
+    def stop(self):
+        if not self.running: return
+        self.running = False
+        self.macros.cancel_all()
+        self.devices.stop()
+        self.hotkeys.clear()
+        if keyboard:
+            try: keyboard.unhook_all()
+            except Exception: LOG.warning("hotkeys", "unhook_all failed", exc=True)
+        self.focus_history.save()
+        self.scheduler.stop()
+        self.stopped.set()
+        self.emit("stopped")
 
-    def resource_path(self, relative_path):
-        try: base_path = sys._MEIPASS
-        except Exception: base_path = os.path.abspath(".")
-        return os.path.join(base_path, relative_path)
+    def is_connected(self):
+        return self.pad.is_connected()
+
+    def set_hid_trace(self, enabled):
+        if enabled and not self.pad.recorder:
+            self.pad.recorder = HidRecorder(HID_TRACE_FILE)
+        elif not enabled and self.pad.recorder:
+            self.pad.recorder.close()
+            self.pad.recorder = None
+        self.cfg_hid_trace = enabled
 
     def load_config_early(self):
         self.cfg_vid = DEFAULT_VENDOR_ID
@@ -395,887 +2246,1352 @@ class VMacroApp(ctk.CTk):
         self.cfg_startup = True
         self.cfg_focus_delay = 0.5
         self.cfg_check_updates = True
+        self.cfg_update_hours = 24
         self.cfg_layout = "3-Key + Knob" # Default
-        
+        self.cfg_startup_stamp = None
+        self.cfg_metrics = METRICS.enabled
+        self.cfg_hid_trace = False
+        self.cfg_log_levels = {}
+        self.cfg_log_spill = False
+        self.cfg_game_mode = True
+        self.cfg_game_apps = []
+        self.saved_config = None
+
         if os.path.exists(CONFIG_FILE):
             try:
                 with open(CONFIG_FILE, "r") as f:
-                    conf = json.load(f)
-                    self.cfg_vid = conf.get("vendor_id", DEFAULT_VENDOR_ID)
-                    self.cfg_pid = conf.get("product_id", DEFAULT_PRODUCT_ID)
-                    self.default_preset_name = conf.get("default_preset")
-                    self.cfg_notify_preset = conf.get("notify_preset", False)
-                    self.cfg_notify_status = conf.get("notify_status", False)
-                    self.cfg_tray_enabled = conf.get("tray_enabled", True)
-                    self.cfg_startup = conf.get("startup_enabled", True)
-                    self.cfg_focus_delay = conf.get("focus_delay", 0.5) 
-                    self.cfg_check_updates = conf.get("check_updates", True)
-                    self.cfg_layout = conf.get("layout", "3-Key + Knob")
-            except: pass
-
-    def load_config_state_ui_vars(self):
+                    self.saved_config = json.load(f)
+                    self.apply_config_values(self.saved_config)
+            except Exception: LOG.warning("config", "could not read %s", CONFIG_FILE, exc=True)
+        METRICS.enabled = self.cfg_metrics
+        self.apply_log_config()
+
+    def apply_config_values(self, conf):
+        self.cfg_vid = conf.get("vendor_id", self.cfg_vid)
+        self.cfg_pid = conf.get("product_id", self.cfg_pid)
+        self.default_preset_name = conf.get("default_preset", self.default_preset_name)
+        self.cfg_notify_preset = conf.get("notify_preset", self.cfg_notify_preset)
+        self.cfg_notify_status = conf.get("notify_status", self.cfg_notify_status)
+        self.cfg_tray_enabled = conf.get("tray_enabled", self.cfg_tray_enabled)
+        self.cfg_startup = conf.get("startup_enabled", self.cfg_startup)
+        self.cfg_focus_delay = conf.get("focus_delay", self.cfg_focus_delay)
+        self.cfg_check_updates = conf.get("check_updates", self.cfg_check_updates)
+        hours = conf.get("update_check_hours", self.cfg_update_hours)
+        try: self.cfg_update_hours = min(max(1.0, float(hours)), UPDATE_MAX_HOURS)
+        except (TypeError, ValueError): LOG.warning("config", "update_check_hours %r is not a number, keeping %s", hours, self.cfg_update_hours)
+        self.cfg_layout = conf.get("layout", self.cfg_layout)
+        self.cfg_startup_stamp = conf.get("startup_shortcut", self.cfg_startup_stamp)
+        self.cfg_metrics = conf.get("metrics_enabled", self.cfg_metrics)
+        self.cfg_hid_trace = conf.get("hid_trace", self.cfg_hid_trace)
+        if "devices" in conf: self.devices.load_config(conf["devices"])
+        self.cfg_log_levels = conf.get("log_levels", self.cfg_log_levels)
+        self.cfg_log_spill = conf.get("log_spill", self.cfg_log_spill)
+        self.cfg_game_mode = conf.get("game_mode", self.cfg_game_mode)
+        self.cfg_game_apps = conf.get("game_apps", self.cfg_game_apps)
+
+    def config_values(self):
+        return {
+            "vendor_id": self.cfg_vid,
+            "product_id": self.cfg_pid,
+            "last_preset": self.current_preset_name,
+            "default_preset": self.default_preset_name,
+            "notify_preset": self.cfg_notify_preset,
+            "notify_status": self.cfg_notify_status,
+            "tray_enabled": self.cfg_tray_enabled,
+            "startup_enabled": self.cfg_startup,
+            "focus_delay": self.cfg_focus_delay,
+            "check_updates": self.cfg_check_updates,
+            "update_check_hours": self.cfg_update_hours,
+            "layout": self.cfg_layout,
+            "startup_shortcut": self.cfg_startup_stamp,
+            "metrics_enabled": self.cfg_metrics,
+            "hid_trace": self.cfg_hid_trace,
+            "log_levels": self.cfg_log_levels,
+            "log_spill": self.cfg_log_spill,
+            "game_mode": self.cfg_game_mode,
+            "game_apps": self.cfg_game_apps,
+            "devices": self.devices.config_values()
+        }
+
+    def apply_log_config(self):
+        for subsystem, level in self.cfg_log_levels.items():
+            if level in LOG_LEVELS: LOG.set_level(subsystem, level)
+        want = EVENT_LOG_FILE if self.cfg_log_spill else None
+        if want != LOG.spill_path: LOG.set_spill(want)
+
+    def dump_events(self, path=EVENT_DUMP_FILE):
+        count = LOG.dump(path)
+        LOG.info("engine", "dumped %d events to %s", count, path)
+        return count
+
+    def load_config_state_vars(self):
         if os.path.exists(CONFIG_FILE):
             try:
                 with open(CONFIG_FILE, "r") as f:
                     conf = json.load(f)
                     last = conf.get("last_preset")
                     if last and last in self.presets:
-                        self.load_preset_by_name(last)
-            except: pass
+                        self.activate_preset(last)
+            except Exception: LOG.warning("config", "could not read %s", CONFIG_FILE, exc=True)
         if not self.current_preset_name and self.presets:
-            self.load_preset_by_name(list(self.presets.keys())[0])
+            self.activate_preset(next(iter(self.presets)))
 
     def save_config_state(self):
+        values = self.config_values()
+        if values == self.saved_config: return
         try:
             with open(CONFIG_FILE, "w") as f:
-                json.dump({
-                    "vendor_id": self.cfg_vid,
-                    "product_id": self.cfg_pid,
-                    "last_preset": self.current_preset_name,
-                    "default_preset": self.default_preset_name,
-                    "notify_preset": self.cfg_notify_preset,
-                    "notify_status": self.cfg_notify_status,
-                    "tray_enabled": self.cfg_tray_enabled,
-                    "startup_enabled": self.cfg_startup,
-                    "focus_delay": self.cfg_focus_delay,
-                    "check_updates": self.cfg_check_updates,
-                    "layout": self.cfg_layout
-                }, f, indent=4)
-        except: pass
-
-    def perform_initial_connection(self):
-        def attempt():
-            for _ in range(10):
-                if not self.running: return
-                if self.pad.connect():
-                    self.after(0, self.safe_update_status, True)
-                    return
-                time.sleep(0.5)
-        threading.Thread(target=attempt, daemon=True).start()
-
-    def safe_update_status(self, connected):
-        if self.running and self.winfo_exists():
-            self.update_status_ui(connected)
-
-    def notify_user(self, title, message):
-        if self.tray_icon:
-            self.update_tray_icon()
-            def _delayed_notify():
-                time.sleep(0.25)
-                if self.tray_icon: self.tray_icon.notify(message, title)
-            threading.Thread(target=_delayed_notify, daemon=True).start()
-
-    def perform_update_check(self):
-        if not requests: return
-        try:
-            r = requests.get(GITHUB_REPO_API, timeout=5)
-            if r.status_code == 200:
-                data = r.json()
-                latest_tag = data.get("tag_name", "v0.0.0")
-                html_url = data.get("html_url", "https://github.com/visiuun/VMacropad/releases")
-                if self.compare_versions(latest_tag, CURRENT_VERSION):
-                    self.after(0, lambda: self.notify_update(latest_tag, html_url))
-        except Exception: pass
-
-    def compare_versions(self, latest, current):
-        try:
-            l_parts = [int(x) for x in latest.lower().lstrip('v').split('.') if x.isdigit()]
-            c_parts = [int(x) for x in current.lower().lstrip('v').split('.') if x.isdigit()]
-            for i in range(max(len(l_parts), len(c_parts))):
-                l_val = l_parts[i] if i < len(l_parts) else 0
-                c_val = c_parts[i] if i < len(c_parts) else 0
-                if l_val > c_val: return True
-                if l_val < c_val: return False
-            return False
-        except: return False
-
-    def notify_update(self, version, url):
-        if self.cfg_tray_enabled and self.tray_icon:
-            self.notify_user("Update Available", f"New version {version} is available!")
-        ans = messagebox.askyesno("Update Available", f"A new version ({version}) is available.\n\nCurrent: {CURRENT_VERSION}\n\nWould you like to open the download page?")
-        if ans: webbrowser.open(url)
+                json.dump(values, f, indent=4)
+            self.saved_config = values
+        except Exception: LOG.error("config", "could not write %s", CONFIG_FILE)
+
+    def update_config(self, values):
+        old_tray, old_startup = self.cfg_tray_enabled, self.cfg_startup
+        old_ids = (self.cfg_vid, self.cfg_pid)
+        self.apply_config_values(values)
+        self.apply_log_config()
+        if self.cfg_startup != old_startup: self.toggle_startup()
+        if (self.cfg_vid, self.cfg_pid) != old_ids:
+            self.pad.vid = self.cfg_vid
+            self.pad.pid = self.cfg_pid
+            self.pad.connect()
+        self.save_config_state()
+        if self.cfg_tray_enabled != old_tray: self.emit("config")
+        self.update_polling()
+
+    def perform_update_check(self, force=False):
+        if not (force or self.cfg_check_updates): return None
+        if self.game and not force:
+            self.scheduler.call_later(600, self.perform_update_check, name="update_check")
+            return None
+        checker = self.update_checker
+        checker.interval = self.cfg_update_hours * 3600
+        release = checker.check(force)
+        # Long-running services look again when the interval is up.
+        if self.running and self.cfg_check_updates:
+            self.scheduler.call_later(max(60.0, checker.next_check_in()), self.perform_update_check, name="update_check")
+        if not release: return None
+        latest_tag, html_url = release["tag_name"], release["html_url"]
+        if compare_versions(latest_tag, CURRENT_VERSION) and self.update_info != (latest_tag, html_url):
+            self.update_info = (latest_tag, html_url)
+            if self.cfg_tray_enabled:
+                self.notify_user("Update Available", f"New version {latest_tag} is available!", "update")
+            self.emit("update", latest_tag, html_url)
+        return release
+
+    def notify_user(self, title, message, category="info"):
+        self.emit("notify", title, message, category)
 
     def load_presets(self):
         if os.path.exists(PRESETS_FILE):
             try:
                 with open(PRESETS_FILE, "r") as f: return json.load(f)
-            except: pass
+            except Exception: LOG.error("config", "could not read %s", PRESETS_FILE)
         return {}
     def save_presets_file(self):
         try:
             with open(PRESETS_FILE, "w") as f: json.dump(self.presets, f, indent=4)
-        except: pass
+        except Exception: LOG.error("config", "could not write %s", PRESETS_FILE)
     def load_mappings(self):
         if os.path.exists(MAPPINGS_FILE):
             try:
                 with open(MAPPINGS_FILE, "r") as f: return json.load(f)
-            except: pass
+            except Exception: LOG.error("config", "could not read %s", MAPPINGS_FILE)
         return {}
     def save_mappings_file(self):
         try:
             with open(MAPPINGS_FILE, "w") as f: json.dump(self.app_mappings, f, indent=4)
-        except: pass
+        except Exception: LOG.error("config", "could not write %s", MAPPINGS_FILE)
+
+    def startup_shortcut(self):
+        startup_folder = os.path.join(os.getenv('APPDATA') or "", 'Microsoft', 'Windows', 'Start Menu', 'Programs', 'Startup')
+        shortcut_path = os.path.join(startup_folder, "VMacropad.lnk")
+        target = sys.executable
+        arguments = f'"{os.path.abspath(__file__)}"' if not getattr(sys, 'frozen', False) else ""
+        return shortcut_path, target, arguments
+
+    def force_refresh_startup(self):
+        # The shortcut only needs rewriting when it is missing or points somewhere else
+        # (e.g. the exe moved). Skipping it avoids a WScript.Shell COM dispatch per boot.
+        shortcut_path, target, arguments = self.startup_shortcut()
+        if self.cfg_startup:
+            if os.path.exists(shortcut_path) and self.cfg_startup_stamp == f"{target}|{arguments}": return
+        elif not os.path.exists(shortcut_path): return
+        self.toggle_startup()
 
-    def force_refresh_startup(self): self.toggle_startup()
     def toggle_startup(self):
         try:
-            if not win32com: return
-            startup_folder = os.path.join(os.getenv('APPDATA'), 'Microsoft', 'Windows', 'Start Menu', 'Programs', 'Startup')
-            shortcut_path = os.path.join(startup_folder, "VMacropad.lnk")
+            if not IS_WINDOWS or not load_win32com(): return
+            shortcut_path, target, arguments = self.startup_shortcut()
             if self.cfg_startup:
-                target = sys.executable
                 shell = win32com.client.Dispatch("WScript.Shell")
                 shortcut = shell.CreateShortcut(shortcut_path)
                 shortcut.TargetPath = target
-                if not getattr(sys, 'frozen', False): shortcut.Arguments = f'"{os.path.abspath(__file__)}"'
-                else: shortcut.Arguments = ""
+                shortcut.Arguments = arguments
                 shortcut.WorkingDirectory = os.path.dirname(target)
                 shortcut.IconLocation = target
                 shortcut.Save()
+                self.cfg_startup_stamp = f"{target}|{arguments}"
             else:
                 if os.path.exists(shortcut_path): os.remove(shortcut_path)
-        except Exception: pass
-
-    def setup_sidebar(self):
-        self.sidebar = ctk.CTkFrame(self, fg_color=Theme.CONTAINER_BG, corner_radius=0, width=260)
-        self.sidebar.grid(row=0, column=0, sticky="nsew")
-        self.sidebar.grid_rowconfigure(2, weight=1)
-        self.sidebar.grid_columnconfigure(0, weight=1)
-        ctk.CTkLabel(self.sidebar, text="V MACROPAD", font=Theme.FONT_HEADER, text_color=Theme.TEXT_PRIMARY).grid(row=0, column=0, pady=(30, 10))
-        ctk.CTkLabel(self.sidebar, text="PRESET LIBRARY", font=Theme.FONT_BODY, text_color=Theme.TEXT_SECONDARY).grid(row=1, column=0, pady=(0, 20))
-        self.preset_scroll = ctk.CTkScrollableFrame(self.sidebar, fg_color="transparent")
-        self.preset_scroll.grid(row=2, column=0, sticky="nsew", padx=10, pady=10)
-        self.preset_widgets = {} 
-        btn_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
-        btn_frame.grid(row=3, column=0, sticky="ew", pady=20, padx=20)
-        btn_frame.grid_columnconfigure((0,1), weight=1)
-        self.btn_add = ctk.CTkButton(btn_frame, text="NEW", font=Theme.FONT_BODY, fg_color=Theme.BUTTON_HOVER, hover_color=Theme.TEXT_DISABLED, command=self.add_preset)
-        self.btn_add.grid(row=0, column=0, padx=5, sticky="ew")
-        self.btn_del = ctk.CTkButton(btn_frame, text="DELETE", font=Theme.FONT_BODY, fg_color="#441111", hover_color="#802122", command=self.del_preset)
-        self.btn_del.grid(row=0, column=1, padx=5, sticky="ew")
-        self.btn_settings = ctk.CTkButton(self.sidebar, text="SETTINGS", font=Theme.FONT_BODY, fg_color="transparent", border_width=1, border_color=Theme.TEXT_DISABLED, command=self.open_settings_ui)
-        self.btn_settings.grid(row=4, column=0, sticky="ew", padx=20, pady=(0, 20))
-        self.refresh_preset_list()
-
-    def open_settings_ui(self):
-        win = ctk.CTkToplevel(self)
-        win.title("Settings")
-        win.geometry("420x750")
-        win.resizable(False, False)
-        win.attributes("-topmost", True)
-        win.configure(fg_color=Theme.CONTAINER_BG)
-        try:
-            x = self.winfo_x() + (self.winfo_width()//2) - 210
-            y = self.winfo_y() + (self.winfo_height()//2) - 375
-            win.geometry(f"+{x}+{y}")
-        except: pass
-        ctk.CTkLabel(win, text="SETTINGS", font=Theme.FONT_HEADER).pack(pady=(20, 20))
-        
-        var_notif_p = ctk.BooleanVar(value=self.cfg_notify_preset)
-        var_notif_s = ctk.BooleanVar(value=self.cfg_notify_status)
-        var_tray = ctk.BooleanVar(value=self.cfg_tray_enabled)
-        var_start = ctk.BooleanVar(value=self.cfg_startup)
-        var_update = ctk.BooleanVar(value=self.cfg_check_updates)
-        
-        frm_hw = ctk.CTkFrame(win, fg_color="transparent")
-        frm_hw.pack(pady=10, padx=40, fill="x")
-        ctk.CTkLabel(frm_hw, text="Vendor ID (Hex):", text_color=Theme.TEXT_SECONDARY).grid(row=0, column=0, sticky="w")
-        entry_vid = ctk.CTkEntry(frm_hw, width=120)
-        entry_vid.insert(0, hex(self.cfg_vid))
-        entry_vid.grid(row=0, column=1, padx=10)
-        ctk.CTkLabel(frm_hw, text="Product ID (Hex):", text_color=Theme.TEXT_SECONDARY).grid(row=1, column=0, sticky="w", pady=5)
-        entry_pid = ctk.CTkEntry(frm_hw, width=120)
-        entry_pid.insert(0, hex(self.cfg_pid))
-        entry_pid.grid(row=1, column=1, padx=10, pady=5)
-
-        # LAYOUT SELECTOR
-        frm_layout = ctk.CTkFrame(win, fg_color="transparent")
-        frm_layout.pack(pady=10, padx=40, fill="x")
-        ctk.CTkLabel(frm_layout, text="Device Layout:", text_color=Theme.TEXT_SECONDARY, font=("Segoe UI", 12, "bold")).pack(anchor="w", pady=(0, 5))
-        combo_layout = ctk.CTkComboBox(frm_layout, values=["3-Key + Knob", "4-Key"])
-        combo_layout.set(self.cfg_layout)
-        combo_layout.pack(fill="x")
-
-        frm_life = ctk.CTkFrame(win, fg_color="transparent")
-        frm_life.pack(pady=15, padx=40, fill="x")
-        ctk.CTkLabel(frm_life, text="Auto-Switch Strategy:", text_color=Theme.TEXT_SECONDARY, font=("Segoe UI", 12, "bold")).pack(anchor="w", pady=(0, 5))
-        init_strategy = "Fast Response (0.5s)" if self.cfg_focus_delay <= 0.5 else "Max Lifespan (2.0s)"
-        seg_strategy = ctk.CTkSegmentedButton(frm_life, values=["Fast Response (0.5s)", "Max Lifespan (2.0s)"])
-        seg_strategy.set(init_strategy)
-        seg_strategy.pack(fill="x")
-
-        def save_and_close():
-            self.cfg_notify_preset = var_notif_p.get()
-            self.cfg_notify_status = var_notif_s.get()
-            old_tray = self.cfg_tray_enabled
-            self.cfg_tray_enabled = var_tray.get()
-            if old_tray != self.cfg_tray_enabled:
-                if self.cfg_tray_enabled: self.setup_tray()
-                else: 
-                    if self.tray_icon: self.tray_icon.stop()
-                    self.tray_icon = None
-            self.cfg_startup = var_start.get()
-            self.cfg_check_updates = var_update.get()
-            self.cfg_layout = combo_layout.get()
-            
-            strat = seg_strategy.get()
-            self.cfg_focus_delay = 0.5 if "Fast" in strat else 2.0
-            
-            self.toggle_startup()
-            try:
-                new_vid = int(entry_vid.get(), 16)
-                new_pid = int(entry_pid.get(), 16)
-                if new_vid != self.cfg_vid or new_pid != self.cfg_pid:
-                    self.cfg_vid = new_vid
-                    self.cfg_pid = new_pid
-                    self.pad.vid = new_vid
-                    self.pad.pid = new_pid
-                    self.pad.connect()
-            except ValueError: return
+                self.cfg_startup_stamp = None
             self.save_config_state()
-            # Force redraw of visualizer immediately
-            self.draw_visualizer()
-            win.destroy()
-
-        ctk.CTkCheckBox(win, text="Notify on Preset Change", variable=var_notif_p).pack(pady=10, padx=40, anchor="w")
-        ctk.CTkCheckBox(win, text="Notify on Connect/Disconnect", variable=var_notif_s).pack(pady=10, padx=40, anchor="w")
-        ctk.CTkCheckBox(win, text="Enable System Tray Icon", variable=var_tray).pack(pady=10, padx=40, anchor="w")
-        ctk.CTkCheckBox(win, text="Start with Windows", variable=var_start).pack(pady=10, padx=40, anchor="w")
-        ctk.CTkCheckBox(win, text="Check for Updates Automatically", variable=var_update).pack(pady=10, padx=40, anchor="w")
-        
-        ctk.CTkButton(win, text="SAVE & CLOSE", command=save_and_close, fg_color=Theme.ACTIVE_BUTTON, text_color="black").pack(pady=30)
-        ctk.CTkLabel(win, text=f"Version: {CURRENT_VERSION}", text_color=Theme.TEXT_DISABLED, font=("Segoe UI", 10)).pack(pady=(0, 0))
-        ctk.CTkLabel(win, text="Created by Visiuun", text_color=Theme.TEXT_SECONDARY).pack(pady=(5, 0))
-        link = ctk.CTkButton(win, text="github.com/visiuun", fg_color="transparent", text_color="#4da6ff", hover=False, command=lambda: webbrowser.open("https://github.com/visiuun"))
-        link.pack()
-
-    def setup_main_area(self):
-        self.main_frame = ctk.CTkFrame(self, fg_color=Theme.MAIN_BG, corner_radius=0)
-        self.main_frame.grid(row=0, column=1, sticky="nsew", padx=20, pady=20)
-        self.main_frame.grid_rowconfigure(1, weight=1) 
-        self.main_frame.grid_columnconfigure(0, weight=1)
-        header_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
-        header_frame.grid(row=0, column=0, sticky="ew", pady=(10, 20))
-        self.lbl_status_icon = ctk.CTkLabel(header_frame, text="●", font=("Arial", 24), text_color=Theme.DISCONNECTED_COLOR)
-        self.lbl_status_icon.pack(side="left", padx=(0, 10))
-        self.lbl_status_text = ctk.CTkLabel(header_frame, text="DISCONNECTED", font=Theme.FONT_SUBHEADER, text_color=Theme.TEXT_SECONDARY)
-        self.lbl_status_text.pack(side="left")
-        self.btn_set_default = ctk.CTkButton(header_frame, text="SET AS DEFAULT", font=("Segoe UI", 11, "bold"), fg_color="#333", width=120, command=self.set_active_as_default)
-        self.btn_set_default.pack(side="right", padx=5)
-        self.btn_link_app = ctk.CTkButton(header_frame, text="LINK TO APP", font=("Segoe UI", 11, "bold"), fg_color=Theme.WIDGET_BG, width=120, command=self.link_current_preset_to_app)
-        self.btn_link_app.pack(side="right", padx=5)
-        self.vis_container = ctk.CTkFrame(self.main_frame, fg_color=Theme.WIDGET_BG, corner_radius=15)
-        self.vis_container.grid(row=1, column=0, sticky="nsew", pady=10)
-        self.canvas = tk.Canvas(self.vis_container, bg=Theme.WIDGET_BG, highlightthickness=0, height=250)
-        self.canvas.pack(fill="both", expand=True, padx=20, pady=20)
-        self.canvas.bind("<Button-1>", self.on_canvas_click)
-        self.canvas.bind("<Configure>", lambda e: self.draw_visualizer())
-        self.editor_frame = ctk.CTkTabview(self.main_frame, fg_color=Theme.CONTAINER_BG, text_color=Theme.TEXT_PRIMARY, segmented_button_fg_color=Theme.WIDGET_BG, segmented_button_selected_color=Theme.ACTIVE_BUTTON, segmented_button_selected_hover_color=Theme.ACTIVE_BUTTON, segmented_button_unselected_color=Theme.WIDGET_BG, segmented_button_unselected_hover_color=Theme.BUTTON_HOVER)
-        self.editor_frame.grid(row=2, column=0, sticky="ew", pady=20)
-        self.tab_input = self.editor_frame.add("Input / Macro") 
-        self.tab_media = self.editor_frame.add("Media")
-        self.tab_app_audio = self.editor_frame.add("App Audio")
-        self.tab_led = self.editor_frame.add("LED")
-        self.tab_mappings = self.editor_frame.add("App Mappings")
-        self.setup_tab_content()
-        self.btn_upload = ctk.CTkButton(self.main_frame, text="UPLOAD CONFIGURATION", font=Theme.FONT_SUBHEADER, height=50, corner_radius=8, fg_color=Theme.WIDGET_BG, text_color=Theme.TEXT_DISABLED, state="disabled", command=self.start_upload)
-        self.btn_upload.grid(row=3, column=0, sticky="ew", pady=(10,0))
-
-    def setup_tab_content(self):
-        input_container = ctk.CTkFrame(self.tab_input, fg_color="transparent")
-        input_container.pack(pady=5, fill="both", expand=True)
-        ctk.CTkLabel(input_container, text="Modifiers (Apply to Key & Mouse)", font=("Segoe UI", 12, "bold"), text_color=Theme.TEXT_SECONDARY).pack(pady=(5,0))
-        mod_frame = ctk.CTkFrame(input_container, fg_color="transparent")
-        mod_frame.pack(pady=5)
-        self.var_ctrl = ctk.BooleanVar()
-        self.var_shift = ctk.BooleanVar()
-        self.var_alt = ctk.BooleanVar()
-        self.var_win = ctk.BooleanVar()
-        for t, v in [("Ctrl", self.var_ctrl), ("Shift", self.var_shift), ("Alt", self.var_alt), ("Win", self.var_win)]:
-            ctk.CTkCheckBox(mod_frame, text=t, variable=v, command=self.store_ui_state, fg_color=Theme.ACTIVE_BUTTON, text_color=Theme.TEXT_PRIMARY).pack(side="left", padx=10)
-        ctk.CTkLabel(input_container, text="Keyboard Key", font=("Segoe UI", 12, "bold"), text_color=Theme.TEXT_SECONDARY).pack(pady=(15,0))
-        self.cb_key = ctk.CTkComboBox(input_container, values=list(KEY_MAP.keys()), command=self.store_ui_state, width=300)
-        self.cb_key.pack(pady=5)
-        ctk.CTkLabel(input_container, text="--- AND / OR ---", font=("Segoe UI", 10), text_color=Theme.TEXT_DISABLED).pack(pady=5)
-        mouse_frame = ctk.CTkFrame(input_container, fg_color="transparent")
-        mouse_frame.pack(pady=5)
-        ctk.CTkLabel(mouse_frame, text="Mouse Button", font=("Segoe UI", 12, "bold"), text_color=Theme.TEXT_SECONDARY).grid(row=0, column=0, padx=10)
-        self.cb_mouse_btn = ctk.CTkComboBox(mouse_frame, values=list(MOUSE_BUTTONS.keys()), command=self.store_ui_state, width=140)
-        self.cb_mouse_btn.grid(row=1, column=0, padx=10)
-        ctk.CTkLabel(mouse_frame, text="Mouse Wheel", font=("Segoe UI", 12, "bold"), text_color=Theme.TEXT_SECONDARY).grid(row=0, column=1, padx=10)
-        self.cb_mouse_scroll = ctk.CTkComboBox(mouse_frame, values=list(MOUSE_WHEEL.keys()), command=self.store_ui_state, width=140)
-        self.cb_mouse_scroll.grid(row=1, column=1, padx=10)
-        self.cb_media = ctk.CTkComboBox(self.tab_media, values=list(MEDIA_MAP.keys()), command=self.store_ui_state, width=300)
-        self.cb_media.pack(pady=30)
-        if "keyboard/pycaw/comtypes" in MISSING_LIBS:
-            ctk.CTkLabel(self.tab_app_audio, text="Missing libraries (keyboard, pycaw, comtypes).\nCannot enable App Volume control.", text_color="red").pack(pady=20)
-        else:
-            app_audio_frame = ctk.CTkFrame(self.tab_app_audio, fg_color="transparent")
-            app_audio_frame.pack(pady=10, fill="x", padx=20)
-            ctk.CTkLabel(app_audio_frame, text="Target Process Name (.exe)", text_color=Theme.TEXT_SECONDARY, font=("Segoe UI", 12, "bold")).pack(anchor="w")
-            row1 = ctk.CTkFrame(app_audio_frame, fg_color="transparent")
-            row1.pack(fill="x", pady=5)
-            self.entry_app_name = ctk.CTkEntry(row1, placeholder_text="e.g., spotify.exe")
-            self.entry_app_name.pack(side="left", fill="x", expand=True, padx=(0, 10))
-            self.entry_app_name.bind("<KeyRelease>", self.store_ui_state)
-            btn_link_vol = ctk.CTkButton(row1, text="Grab Active App", width=120, fg_color=Theme.WIDGET_BG, command=self.grab_app_for_volume)
-            btn_link_vol.pack(side="right")
-            ctk.CTkLabel(app_audio_frame, text="Action", text_color=Theme.TEXT_SECONDARY, font=("Segoe UI", 12, "bold")).pack(anchor="w", pady=(15, 0))
-            self.cb_app_action = ctk.CTkComboBox(app_audio_frame, values=["Volume Up", "Volume Down", "Mute"], command=self.store_ui_state)
-            self.cb_app_action.pack(fill="x", pady=5)
-            ctk.CTkLabel(self.tab_app_audio, text="Note: If app is not found, controls Master Volume.\nRequires this software to be running.", text_color=Theme.TEXT_DISABLED, font=("Segoe UI", 10)).pack(pady=20)
-        self.cb_led = ctk.CTkComboBox(self.tab_led, values=list(LED_MODES.keys()), command=self.store_led_state, width=300)
-        self.cb_led.pack(pady=30)
-        self.mapping_scroll = ctk.CTkScrollableFrame(self.tab_mappings, fg_color="transparent")
-        self.mapping_scroll.pack(fill="both", expand=True, padx=10, pady=10)
-        self.refresh_mappings_ui()
-
-    def grab_app_for_volume(self):
-        def delayed():
-            time.sleep(3)
-            app = self.get_active_app_process(force=True)
-            if app:
-                self.entry_app_name.delete(0, 'end')
-                self.entry_app_name.insert(0, app)
-                self.store_ui_state()
-                self.after(0, lambda: messagebox.showinfo("Captured", f"Target set to: {app}"))
+        except Exception: LOG.warning("config", "could not update the startup shortcut", exc=True)
+
+    # --- Library edits (shared by the editor and the control channel) ---
+    def library_changed(self, event, *args):
+        self.library_version += 1
+        self.staged_frames.clear()
+        self.update_polling()
+        self.emit(event, *args)
+
+    def save_preset(self, name, data):
+        with self.library_lock:
+            data = self.stored_preset(name, data)
+            self.presets[name] = data
+            self.resolver.invalidate(name)
+            self.save_presets_file()
+            self.library_changed("preset_added", name)
+
+    def stored_preset(self, name, data):
+        # A full slot list saved over a child preset is stored as overrides again;
+        # "parent": None detaches it.
+        parent = data.get("parent", (self.presets.get(name) or {}).get("parent"))
+        if parent is None: return {k: v for k, v in data.items() if k != "parent"}
+        self.check_parent(name, parent)
+        if isinstance(data.get("keys"), list): data = derive_preset(data, parent, self.resolver.resolve(parent))
+        return data
+
+    def import_presets(self, presets):
+        # One write and one library change for any number of presets.
+        with self.library_lock:
+            merged = PresetResolver(dict(self.presets, **presets))
+            for name, data in presets.items():
+                parent = data.get("parent")
+                if parent is None: continue
+                if parent not in merged.presets: raise ValueError(f"{name}: unknown parent {parent}")
+                if merged.cycle_of(name): raise ValueError(f"{name}: {parent} already inherits from {name}")
+            self.presets.update(presets)
+            self.resolver.invalidate(*presets)
+            self.save_presets_file()
+            self.library_changed("presets")
+            return len(presets)
+
+    def check_parent(self, name, parent):
+        if parent not in self.presets: raise ValueError(f"Unknown preset: {parent}")
+        if parent == name or name in self.resolver.ancestors(parent): raise ValueError(f"{parent} already inherits from {name}")
+
+    def set_preset_parent(self, name, parent):
+        # parent=None detaches a preset into a full copy; a new name becomes an empty child.
+        with self.library_lock:
+            if name not in self.presets and parent is None: raise ValueError(f"Unknown preset: {name}")
+            if parent is None: data = dict(flatten_preset(self.resolver.resolve(name)), parent=None)
             else:
-                self.after(0, lambda: messagebox.showerror("Error", "Could not detect app."))
-        messagebox.showinfo("Ready", "Focus the target app within 3 seconds...")
-        threading.Thread(target=delayed, daemon=True).start()
-
-    def set_active_as_default(self):
-        if not self.current_preset_name: return
-        self.default_preset_name = self.current_preset_name
-        self.app_mappings = {k: v for k, v in self.app_mappings.items() if v != self.default_preset_name}
-        self.save_mappings_file()
-        self.save_config_state()
-        self.refresh_preset_list()
-        self.refresh_mappings_ui()
-        messagebox.showinfo("Success", f"'{self.default_preset_name}' is now the Default.")
-
-    def refresh_mappings_ui(self):
-        if not self.running or not self.winfo_exists(): return
-        for w in self.mapping_scroll.winfo_children(): w.destroy()
-        if not self.app_mappings:
-            ctk.CTkLabel(self.mapping_scroll, text="No app mappings yet.", text_color=Theme.TEXT_SECONDARY).pack(pady=20)
-            return
-        for app_name, preset_name in list(self.app_mappings.items()):
-            row = ctk.CTkFrame(self.mapping_scroll, fg_color=Theme.WIDGET_BG)
-            row.pack(fill="x", pady=2, padx=5)
-            ctk.CTkLabel(row, text=app_name, width=200, anchor="w", font=("Segoe UI", 12, "bold")).pack(side="left", padx=10)
-            ctk.CTkLabel(row, text=f"→  {preset_name}", text_color=Theme.TEXT_SECONDARY).pack(side="left", padx=10)
-            ctk.CTkButton(row, text="X", width=30, fg_color="#441111", command=lambda a=app_name: self.remove_mapping(a)).pack(side="right", padx=5)
+                self.check_parent(name, parent)
+                base = self.resolver.resolve(parent)
+                data = derive_preset(self.resolver.resolve(name), parent, base) if name in self.presets else {"parent": parent, "keys": {}}
+            self.save_preset(name, data)
+            return self.presets[name]
+
+    def delete_preset(self, name):
+        with self.library_lock:
+            if name not in self.presets: return []
+            # Children keep their resolved slots and move up to the deleted preset's parent.
+            grandparent = self.presets[name].get("parent")
+            rehomed = {}
+            for child in self.resolver.children_of(name):
+                full = self.resolver.resolve(child)
+                rehomed[child] = derive_preset(full, grandparent, self.resolver.resolve(grandparent)) if grandparent in self.presets else flatten_preset(full)
+            to_remove = [app for app, pre in self.app_mappings.items() if pre == name]
+            for app in to_remove: del self.app_mappings[app]
+            if to_remove:
+                self.save_mappings_file()
+                self.library_changed("mappings")
+            if name == self.default_preset_name:
+                self.default_preset_name = None
+            self.resolver.invalidate(name)
+            del self.presets[name]
+            self.presets.update(rehomed)
+            self.resolver.invalidate(*rehomed)
+            self.save_presets_file()
+            if self.current_preset_name == name: self.current_preset_name = None
+            self.library_changed("preset_removed", name)
+            return to_remove
+
+    def set_default_preset(self, name):
+        with self.library_lock:
+            self.default_preset_name = name
+            self.app_mappings = {k: v for k, v in self.app_mappings.items() if v != name}
+            self.save_mappings_file()
+            self.save_config_state()
+            self.library_changed("mappings")
+
+    def add_mapping(self, app_name, preset_name):
+        with self.library_lock:
+            self.app_mappings[app_name] = preset_name
+            self.save_mappings_file()
+            self.library_changed("mappings")
 
     def remove_mapping(self, app_name):
-        if app_name in self.app_mappings:
+        with self.library_lock:
+            if app_name not in self.app_mappings: return False
             del self.app_mappings[app_name]
             self.save_mappings_file()
-            self.refresh_mappings_ui()
-
-    def link_current_preset_to_app(self):
-        if not self.current_preset_name: return
-        if self.current_preset_name == self.default_preset_name:
-            messagebox.showerror("Error", "The Default Preset cannot be linked to a specific app.")
-            return
-        def delayed_capture():
-            time.sleep(3)
-            app_name = self.get_active_app_process(force=True)
-            if app_name and app_name.lower() not in ["python.exe", "vmacropad.exe"]:
-                self.app_mappings[app_name] = self.current_preset_name
-                self.save_mappings_file()
-                self.after(0, self.refresh_mappings_ui)
-                self.after(0, lambda: messagebox.showinfo("Success", f"Linked '{app_name}' to '{self.current_preset_name}'"))
-            else:
-                self.after(0, lambda: messagebox.showerror("Error", "Could not identify app."))
-        messagebox.showinfo("Ready", "Focus target app within 3 seconds.")
-        threading.Thread(target=delayed_capture, daemon=True).start()
-
-    def get_active_app_process(self, force=False):
-        hwnd = ctypes.windll.user32.GetForegroundWindow()
-        if hwnd == 0: return None
-        pid_obj = ctypes.c_ulong()
-        ctypes.windll.user32.GetWindowThreadProcessId(hwnd, ctypes.byref(pid_obj))
-        pid = pid_obj.value
-        if pid == 0: return None
-        process_name = None
-        if psutil:
-            try: process_name = psutil.Process(pid).name()
-            except (psutil.NoSuchProcess, psutil.AccessDenied): pass
-        if not process_name:
-            process_name = get_process_name_by_pid_ctypes(pid)
-        return process_name
-
-    def app_monitor_loop(self):
-        if not self.running: return
-        current_hwnd = ctypes.windll.user32.GetForegroundWindow()
-        self.last_hwnd = current_hwnd
-        current_app = self.get_active_app_process()
-        target_preset = None
-        is_mapped = current_app and current_app in self.app_mappings
-        if is_mapped:
-            self.manual_override = False
-            target_preset = self.app_mappings[current_app]
-        else:
-            if self.manual_override: target_preset = self.last_auto_uploaded_preset 
-            else: target_preset = self.default_preset_name
-        if target_preset and target_preset not in self.presets:
-             target_preset = self.default_preset_name
-        if target_preset:
-            if target_preset != self.last_detected_target:
-                self.last_detected_target = target_preset
-                self.focus_timer_start = time.time()
+            self.library_changed("mappings")
+            return True
+
+    # --- Connection and focus monitoring ---
+    def initial_connect(self, attempt=0):
+        # The remembered pad first, then a few quick scans, then the regular
+        # connection poll.
+        if attempt or not self.devices.fast_connect(self.pad):
+            entries = self.devices.scan()
+            entry = self.devices.primary_entry(entries)
+            if not (entry and self.devices.connect(self.pad, entry)) and attempt < 9:
+                self.scheduler.call_later(0.5, self.initial_connect, attempt + 1, name="connect")
+                return
+        self.scheduler.call_every(2.0, self.timed_tick, "loop.check_conn", self.check_conn_tick, name="check_conn")
+
+    def wants_focus_poll(self):
+        # The focus poll only runs while it can lead to a switch: the pad is connected
+        # and an app is mapped, or the default preset still has to be applied.
+        if not (self.running and (self.connected_last_frame or self.devices.pads)): return False
+        return bool(self.app_mappings) or self.devices.has_mappings() or self.default_pending()
+
+    def default_pending(self):
+        return self.default_preset_name in self.presets and not self.manual_override and self.last_auto_uploaded_preset != self.default_preset_name
+
+    def update_polling(self):
+        want = self.wants_focus_poll()
+        if want and not self.scheduler.scheduled("app_monitor"):
+            self.scheduler.call_every(0.25, self.timed_tick, "loop.app_monitor", self.app_monitor_tick, name="app_monitor")
+        elif not want: self.scheduler.cancel("app_monitor")
+        # Without the focus poll a slower check still spots games, or the connection
+        # poll would keep scanning through them.
+        game_check = not want and self.running and (self.cfg_game_mode or self.game) and (self.connected_last_frame or bool(self.devices.pads))
+        if game_check and not self.scheduler.scheduled("game_check"):
+            self.scheduler.call_every(GAME_CHECK_POLL_S, self.timed_tick, "loop.game_check", self.game_check_tick, name="game_check")
+        elif not game_check: self.scheduler.cancel("game_check")
+
+    def wake(self):
+        # Called when the editor is shown: look for the pad right away.
+        self.conn_poll_interval = 2.0
+        if self.scheduler.scheduled("check_conn"):
+            self.scheduler.call_every(2.0, self.timed_tick, "loop.check_conn", self.check_conn_tick, name="check_conn")
+
+    def timed_tick(self, metric, tick):
+        t0 = time.perf_counter() if METRICS.enabled else 0
+        next_delay = tick()
+        if t0: METRICS.observe(metric, time.perf_counter() - t0)
+        return next_delay
+
+    def check_conn_tick(self):
+        # No USB scans during a game; a pad that drops still shows up as failed writes.
+        if self.game and self.pad.is_connected(): return GAME_CONN_POLL_S
+        # A replugged pad usually comes back on its old path; try that instead of
+        # the scan. After a miss it waits until the scan sees something new.
+        fast = attempted = False
+        if not self.pad.is_connected() and self.fast_path_ok:
+            attempted = True
+            fast = self.fast_path_ok = self.devices.fast_connect(self.pad)
+        if not fast:
+            entries = self.devices.scan()
+            seen = {e["path"] for e in entries}
+            if seen != self.last_scan:
+                self.last_scan = seen
+                if not attempted: self.fast_path_ok = True
+            entry = self.devices.primary_entry(entries)
+            if entry and not self.pad.is_connected(): self.devices.connect(self.pad, entry)
+            elif not entry and self.pad.is_connected():
+                self.pad.mark_disconnected()
+        if self.pad.is_connected() != self.connected_last_frame:
+            self.connected_last_frame = self.pad.is_connected()
+            if self.connected_last_frame: self.fast_path_ok = True
+            self.on_status_changed(self.connected_last_frame)
+        if not fast: self.devices.sync(entries)
+        # Back off while the pad is unplugged: 2 s, 4 s, then every 8 s.
+        if self.connected_last_frame or self.devices.pads: self.conn_poll_interval = 2.0
+        else: self.conn_poll_interval = min(self.conn_poll_interval * 2, 8.0)
+        return self.conn_poll_interval
+
+    def on_status_changed(self, c):
+        LOG.info("engine", "pad %s", "connected" if c else "disconnected")
+        self.pad_image = None
+        self.update_polling()
+        if c: self.startup.mark("first_connect")
+        self.emit("status", c)
+        if self.init_complete and self.cfg_notify_status:
+            self.notify_user("Device Status", "Macropad Connected" if c else "Macropad Disconnected", "status")
+        if c and self.current_preset_name: self.start_upload(deferrable=True)
+
+    def app_monitor_tick(self):
+        with self.library_lock:
+            current_hwnd = user32.GetForegroundWindow() if user32 else 0
+            if self.game:
+                if self.cfg_game_mode and self.game_focused(current_hwnd): return GAME_FOCUS_POLL_S
+                self.leave_game_mode()
+            self.last_hwnd = current_hwnd
+            current_app = self.get_foreground_app()
+            if current_app and current_app != self.last_focus_app:
+                self.focus_history.record(self.last_focus_app, current_app)
+                self.last_focus_app = current_app
+            target_preset = None
+            is_mapped = current_app and current_app in self.app_mappings
+            if is_mapped:
+                self.manual_override = False
+                target_preset = self.app_mappings[current_app]
             else:
-                if (time.time() - self.focus_timer_start) > self.cfg_focus_delay:
-                    if target_preset != self.last_auto_uploaded_preset:
-                        if self.pad.is_connected() and not self.is_uploading:
-                            self.last_auto_uploaded_preset = target_preset
-                            self.after(0, self.safe_auto_load, target_preset)
-        self.after(250, self.app_monitor_loop)
-
-    def safe_auto_load(self, target_preset):
-        if self.running and self.winfo_exists():
-            self.load_preset_by_name(target_preset, is_auto=True)
-            self.start_upload()
-
-    def load_preset_by_name(self, name, is_auto=False):
-        if name not in self.presets: return
-        if not is_auto:
-            self.manual_override = True
-            self.last_auto_uploaded_preset = name
-        self.current_preset_name = name
-        self.save_config_state()
-        data = self.presets[name]
-        cleaned_data = []
-        for d in data["keys"]:
-            new_d = dict(d)
-            if "type" not in new_d: new_d["type"] = "key"
-            if "code" not in new_d: new_d["code"] = 0
-            if "mouse_btn" not in new_d: new_d["mouse_btn"] = 0
-            if "mouse_scroll" not in new_d: new_d["mouse_scroll"] = 0
-            if new_d["type"] == "mouse":
-                if "btn" in new_d: new_d["mouse_btn"] = new_d["btn"]
-                if "scroll" in new_d: new_d["mouse_scroll"] = new_d["scroll"]
-            cleaned_data.append(new_d)
-        self.current_data = cleaned_data
-        self.led_mode = data.get("led", 1)
-        if self.winfo_exists():
-            self.refresh_preset_list_highlight()
-            self.update_editor_ui()
-            self.draw_visualizer()
-            self.update_tray_icon() 
-        if self.init_complete and self.cfg_notify_preset:
-            msg = f"{name}"
-            if is_auto: msg += " (Auto)"
-            self.notify_user("Preset Changed", msg)
-
-    def refresh_preset_list(self):
-        if not self.running or not self.winfo_exists(): return
-        for w in self.preset_scroll.winfo_children(): w.destroy()
-        self.preset_widgets.clear()
-        for name in self.presets:
-            display_text = f"{name} (DEFAULT)" if name == self.default_preset_name else name
-            btn = ctk.CTkButton(self.preset_scroll, text=display_text, font=Theme.FONT_BODY, height=35, fg_color=Theme.INACTIVE_PILL, hover_color=Theme.BUTTON_HOVER, command=lambda n=name: self.load_preset_by_name(n))
-            btn.pack(fill="x", pady=2)
-            self.preset_widgets[name] = btn
-        self.refresh_preset_list_highlight()
-
-    def refresh_preset_list_highlight(self):
-        if not self.running or not self.winfo_exists(): return
-        for name, btn in self.preset_widgets.items():
-            try:
-                if name == self.current_preset_name:
-                    btn.configure(fg_color=Theme.ACTIVE_BUTTON, text_color=Theme.TEXT_INVERSE)
+                if self.manual_override: target_preset = self.last_auto_uploaded_preset
+                else: target_preset = self.default_preset_name
+            if target_preset and target_preset not in self.presets:
+                 target_preset = self.default_preset_name
+            if target_preset:
+                if target_preset != self.last_detected_target:
+                    self.last_detected_target = target_preset
+                    self.focus_timer_start = self.clock()
+                    self.focus_changed_at = time.perf_counter()
+                    if target_preset != self.last_auto_uploaded_preset: self.stage_preset(target_preset)
                 else:
-                    btn.configure(fg_color=Theme.INACTIVE_PILL, text_color=Theme.TEXT_PRIMARY)
-            except: pass
-
-    def create_rounded_rect(self, x1, y1, x2, y2, radius=25, **kwargs):
-        points = [x1+radius, y1, x1+radius, y1, x2-radius, y1, x2-radius, y1, x2, y1, x2, y1+radius, x2, y1+radius, x2, y2-radius, x2, y2-radius, x2, y2, x2-radius, y2, x2-radius, y2, x1+radius, y2, x1+radius, y2, x1, y2, x1, y2-radius, x1, y2-radius, x1, y1+radius, x1, y1+radius, x1, y1]
-        return self.canvas.create_polygon(points, **kwargs, smooth=True)
-
-    def draw_visualizer(self):
-        if not self.running or not self.winfo_exists(): return
-        self.canvas.delete("all")
-        accent = "#888888"
-        if self.current_preset_name in self.presets:
-            accent = self.presets[self.current_preset_name].get("color", "#888888")
-        
-        w = self.canvas.winfo_width()
-        h = self.canvas.winfo_height()
-        if w < 10: w, h = 600, 250
-        
-        cx, cy = w // 2, h // 2
-        
-        if self.cfg_layout == "4-Key":
-            # --- 4 KEY LAYOUT ---
-            key_size = 80
-            gap = 30
-            total_width = (4 * key_size) + (3 * gap)
-            start_x = cx - (total_width / 2)
-            key_y = cy - (key_size / 2)
-            
-            for i in range(4):
-                x = start_x + (i * (key_size + gap))
-                is_sel = (i == self.selected_key_index)
-                fill = accent if is_sel else Theme.CONTAINER_BG
-                outline = "#ffffff" if is_sel else "#333333"
-                width = 3 if is_sel else 2
-                tag = f"key_{i}"
-                self.create_rounded_rect(x, key_y, x+key_size, key_y+key_size, radius=15, fill=fill, outline=outline, width=width, tags=tag)
-                text_color = Theme.TEXT_INVERSE if (is_sel and not self.is_dark(accent)) else Theme.TEXT_PRIMARY
-                self.canvas.create_text(x + key_size/2, key_y + key_size/2, text=str(i+1), fill=text_color, font=("Segoe UI", 24, "bold"), tags=tag)
-                
-        else:
-            # --- 3 KEY + KNOB LAYOUT (Standard) ---
-            key_size = 80
-            gap = 30
-            # Keys 1-3
-            start_x = cx - 210
-            key_y = cy - (key_size // 2)
-            
-            for i in range(3):
-                x = start_x + (i * (key_size + gap))
-                is_sel = (i == self.selected_key_index)
-                fill = accent if is_sel else Theme.CONTAINER_BG
-                outline = "#ffffff" if is_sel else "#333333"
-                width = 3 if is_sel else 2
-                tag = f"key_{i}"
-                self.create_rounded_rect(x, key_y, x+key_size, key_y+key_size, radius=15, fill=fill, outline=outline, width=width, tags=tag)
-                text_color = Theme.TEXT_INVERSE if (is_sel and not self.is_dark(accent)) else Theme.TEXT_PRIMARY
-                self.canvas.create_text(x + key_size/2, key_y + key_size/2, text=str(i+1), fill=text_color, font=("Segoe UI", 24, "bold"), tags=tag)
-
-            # Knob (Indices 3, 4, 5)
-            knob_x = start_x + (3 * (key_size + gap)) + 50
-            knob_y = cy
-            knob_r = 50
-            is_ccw = (self.selected_key_index == 3)
-            is_cw = (self.selected_key_index == 4)
-            is_press = (self.selected_key_index == 5)
-            
-            self.canvas.create_oval(knob_x-knob_r, knob_y-knob_r, knob_x+knob_r, knob_y+knob_r, fill=Theme.CONTAINER_BG, outline="#333333", width=2)
-            self.canvas.create_arc(knob_x-knob_r, knob_y-knob_r, knob_x+knob_r, knob_y+knob_r, start=90, extent=180, fill=accent if is_ccw else "#444444", style=tk.PIESLICE)
-            self.canvas.create_arc(knob_x-knob_r, knob_y-knob_r, knob_x+knob_r, knob_y+knob_r, start=270, extent=180, fill=accent if is_cw else "#444444", style=tk.PIESLICE)
-            self.canvas.create_oval(knob_x-25, knob_y-25, knob_x+25, knob_y+25, fill=Theme.CONTAINER_BG, outline="#222")
-            self.canvas.create_oval(knob_x-18, knob_y-18, knob_x+18, knob_y+18, fill=accent if is_press else "#222222", outline="white" if is_press else "#555")
-            self.canvas.create_text(knob_x-65, knob_y, text="CCW", fill=Theme.TEXT_SECONDARY, font=("Segoe UI", 10, "bold"), anchor="e")
-            self.canvas.create_text(knob_x+65, knob_y, text="CW", fill=Theme.TEXT_SECONDARY, font=("Segoe UI", 10, "bold"), anchor="w")
-
-    def is_dark(self, hex_color):
-        if not hex_color.startswith('#'): return True
-        h = hex_color.lstrip('#')
-        try:
-            rgb = tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
-            return (rgb[0]*0.299 + rgb[1]*0.587 + rgb[2]*0.114) < 140
-        except: return True
-
-    def on_canvas_click(self, event):
-        if self.is_uploading or not self.winfo_exists(): return
-        w = self.canvas.winfo_width()
-        h = self.canvas.winfo_height()
-        cx, cy = w // 2, h // 2
-        
-        if self.cfg_layout == "4-Key":
-            key_size = 80
-            gap = 30
-            total_width = (4 * key_size) + (3 * gap)
-            start_x = cx - (total_width / 2)
-            key_y = cy - (key_size / 2)
-            
-            for i in range(4):
-                kx = start_x + (i * (key_size + gap))
-                if kx <= event.x <= kx+key_size and key_y <= event.y <= key_y+key_size:
-                    self.selected_key_index = i
-                    self.update_editor_ui()
-                    self.draw_visualizer()
-                    return
-        else:
-            # 3-Key + Knob logic
-            key_size = 80
-            gap = 30
-            start_x = cx - 210
-            key_y = cy - (key_size // 2)
-            
-            for i in range(3):
-                kx = start_x + (i * (key_size + gap))
-                if kx <= event.x <= kx+key_size and key_y <= event.y <= key_y+key_size:
-                    self.selected_key_index = i
-                    self.update_editor_ui()
-                    self.draw_visualizer()
-                    return
-            
-            knob_x = start_x + (3 * (key_size + gap)) + 50
-            knob_y = cy
-            dx = event.x - knob_x
-            dy = event.y - knob_y
-            dist = math.sqrt(dx*dx + dy*dy)
-            if dist <= 18:
-                self.selected_key_index = 5
-            elif dist <= 50:
-                self.selected_key_index = 3 if dx < 0 else 4
-            
-            self.update_editor_ui()
-            self.draw_visualizer()
-
-    def update_editor_ui(self):
-        if not self.running or not self.winfo_exists(): return
-        d = self.current_data[self.selected_key_index]
-        dtype = d.get("type", "key")
-        
-        try:
-            if dtype == "media":
-                self.editor_frame.set("Media")
-                self.cb_media.set(next((k for k,v in MEDIA_MAP.items() if v == (d.get("b1", 0), d.get("b2", 0))), "None"))
-            elif dtype == "app_vol":
-                self.editor_frame.set("App Audio")
-                self.entry_app_name.delete(0, 'end')
-                self.entry_app_name.insert(0, d.get("app", ""))
-                act_map = {"up": "Volume Up", "down": "Volume Down", "mute": "Mute"}
-                self.cb_app_action.set(act_map.get(d.get("action", "up"), "Volume Up"))
-            else:
-                self.editor_frame.set("Input / Macro")
-                mod = d.get("mod", 0)
-                self.var_ctrl.set(bool(mod & 1))
-                self.var_shift.set(bool(mod & 2))
-                self.var_alt.set(bool(mod & 4))
-                self.var_win.set(bool(mod & 8))
-                
-                code = d.get("code", 0)
-                self.cb_key.set(next((k for k,v in KEY_MAP.items() if v == code), "None"))
-                
-                m_btn = d.get("mouse_btn", 0)
-                m_scr = d.get("mouse_scroll", 0)
-                self.cb_mouse_btn.set(next((k for k,v in MOUSE_BUTTONS.items() if v == m_btn), "None"))
-                self.cb_mouse_scroll.set(next((k for k,v in MOUSE_WHEEL.items() if v == m_scr), "None"))
-            
-            self.cb_led.set(next((k for k,v in LED_MODES.items() if v == self.led_mode), "Static"))
-        except: pass
-
-    def store_ui_state(self, _=None):
+                    if (self.clock() - self.focus_timer_start) > self.cfg_focus_delay:
+                        if target_preset != self.last_auto_uploaded_preset:
+                            if (self.pad.is_connected() or self.devices.pads) and not self.is_uploading:
+                                LOG.info("focus", "%s -> %s", current_app, target_preset)
+                                self.last_auto_uploaded_preset = target_preset
+                                self.switch_started_at = self.focus_changed_at
+                                self.activate_preset(target_preset, is_auto=True)
+                                self.start_upload()
+                                self.predict_next_switch(current_app, target_preset)
+                                if not is_mapped: self.update_polling()
+                        elif self.devices.pads: self.devices.follow(current_app)
+            # Enter game mode only once the app's preset is on the pad.
+            if target_preset in (None, self.last_auto_uploaded_preset) and not self.is_uploading and self.is_game(current_app, current_hwnd):
+                self.enter_game_mode(current_app, current_hwnd)
+                return GAME_FOCUS_POLL_S
+
+    # --- Game mode ---
+    def game_check_tick(self):
+        hwnd = user32.GetForegroundWindow() if user32 else 0
+        if self.game:
+            if self.cfg_game_mode and self.game_focused(hwnd): return GAME_FOCUS_POLL_S
+            self.leave_game_mode()
+            self.update_polling()
+            return
+        # The process name is only looked up when the foreground window changes.
+        if not hwnd or hwnd != self.game_probe[0]: self.game_probe = (hwnd, self.get_foreground_app())
+        app = self.game_probe[1]
+        if not self.is_uploading and self.is_game(app, hwnd):
+            self.enter_game_mode(app, hwnd)
+            return GAME_FOCUS_POLL_S
+
+    def is_game(self, app, hwnd):
+        if not self.cfg_game_mode or not app: return False
+        if app.lower() in (a.lower() for a in self.cfg_game_apps): return True
+        checked_hwnd, checked_at, fullscreen = self.game_checked
+        now = self.clock()
+        if hwnd != checked_hwnd or now - checked_at > 1.0:
+            fullscreen = bool(hwnd) and self.is_fullscreen(hwnd)
+            self.game_checked = (hwnd, now, fullscreen)
+        return fullscreen
+
+    def game_focused(self, hwnd):
+        # A window handle compare when there is one; the simulated focus source has none.
+        if hwnd: return hwnd == self.game[1]
+        return self.get_foreground_app() == self.game[0]
+
+    def enter_game_mode(self, app, hwnd):
+        self.game = (app, hwnd)
+        LOG.info("engine", "game mode on for %s", app)
+        METRICS.incr("game.entered")
+
+    def leave_game_mode(self):
+        app, self.game = self.game[0], None
+        with self.state_lock:
+            full, self.deferred_upload = self.deferred_upload, None
+            pads, self.uncommitted = self.uncommitted, set()
+        LOG.info("engine", "game mode off for %s, %s held upload, %d flash commits", app, "1" if full is not None else "no", len(pads))
+        # The held upload commits the primary itself; if it cannot start, commit what is there.
+        if full is not None and self.start_upload(full): pads.discard(self.pad)
+        if pads: self.scheduler.submit(self.commit_flash, pads, name="flash_commit")
+        self.wake()
+
+    def commit_flash(self, pads):
+        with self.upload_lock:
+            for pad in pads:
+                if pad.is_connected() and not pad.save_to_flash(): LOG.warning("upload", "deferred flash commit to %s failed", hid_path_text(pad.path))
+
+    def preset_for_app(self, app):
+        target = self.app_mappings.get(app, self.default_preset_name)
+        return target if target in self.presets else None
+
+    def predict_next_switch(self, app, preset):
+        # Scores the previous guess against this switch, then stages the preset the
+        # history says is most likely to follow this app.
+        self.focus_history.score(self.predicted_preset, preset)
+        self.predicted_preset = self.focus_history.predict(app, self.preset_for_app, exclude=preset)
+        if self.predicted_preset: self.stage_preset(self.predicted_preset)
+
+    def stage_preset(self, name):
+        if name not in self.presets or name in self.staged_frames: return
+        data, led = self.resolver.normalized(name)
+        if len(self.staged_frames) >= 8: self.staged_frames.clear()
+        self.staged_frames[name] = ((data, led, self.cfg_layout), compile_preset_frames(data, led, self.cfg_layout))
+
+    def preset_frames(self, name, data, led_mode, layout):
+        staged = self.staged_frames.get(name)
+        if staged and staged[0] == (data, led_mode, layout):
+            METRICS.incr("upload.staged")
+            return staged[1]
+        return compile_preset_frames(data, led_mode, layout)
+
+    # --- Presets and uploads ---
+    def activate_preset(self, name, is_auto=False):
+        with self.library_lock:
+            if name not in self.presets: return False
+            if not is_auto:
+                self.manual_override = True
+                self.last_auto_uploaded_preset = name
+            self.current_preset_name = name
+            self.save_config_state()
+            data, self.led_mode = self.resolver.normalized(name)
+            self.current_data = list(data)
+            self.devices.follow(self.last_focus_app)
+            self.emit("preset", name, is_auto)
+            if self.init_complete and self.cfg_notify_preset:
+                msg = f"{name}"
+                if is_auto: msg += " (Auto)"
+                self.notify_user("Preset Changed", msg, "preset")
+            return True
+
+    def tray_activate_preset(self, name):
         if not self.running or self.is_uploading: return
-        tab = self.editor_frame.get()
-        idx = self.selected_key_index
-        
-        if tab == "Input / Macro":
-            mod = (1 if self.var_ctrl.get() else 0) | (2 if self.var_shift.get() else 0) | (4 if self.var_alt.get() else 0) | (8 if self.var_win.get() else 0)
-            key_code = KEY_MAP.get(self.cb_key.get(), 0)
-            mouse_btn = MOUSE_BUTTONS.get(self.cb_mouse_btn.get(), 0)
-            mouse_scroll = MOUSE_WHEEL.get(self.cb_mouse_scroll.get(), 0)
-            
-            if mouse_btn != 0 or mouse_scroll != 0:
-                self.current_data[idx] = {
-                    "type": "mouse", "mod": mod, "code": 0,
-                    "mouse_btn": mouse_btn, "mouse_scroll": mouse_scroll
-                }
-            else:
-                self.current_data[idx] = {
-                    "type": "key", "mod": mod, "code": key_code,
-                    "mouse_btn": 0, "mouse_scroll": 0
-                }
-                
-        elif tab == "Media":
-            b1, b2 = MEDIA_MAP.get(self.cb_media.get(), (0,0))
-            self.current_data[idx] = {"type": "media", "b1": b1, "b2": b2}
-            
-        elif tab == "App Audio":
-            act_map = {"Volume Up": "up", "Volume Down": "down", "Mute": "mute"}
-            action = act_map.get(self.cb_app_action.get(), "up")
-            app_name = self.entry_app_name.get().strip()
-            self.current_data[idx] = {"type": "app_vol", "app": app_name, "action": action}
-
-    def store_led_state(self, _=None):
-        self.led_mode = LED_MODES.get(self.cb_led.get(), 1)
-
-    def add_preset(self):
-        name = ctk.CTkInputDialog(text="Preset Name:", title="Save").get_input()
-        if not name: return
-        color = colorchooser.askcolor()[1] or "#888888"
-        self.presets[name] = {"keys": [dict(x) for x in self.current_data], "led": self.led_mode, "color": color}
-        self.save_presets_file()
-        self.refresh_preset_list()
-        self.load_preset_by_name(name)
-
-    def del_preset(self):
-        if self.current_preset_name in self.presets:
-            to_remove = [app for app, pre in self.app_mappings.items() if pre == self.current_preset_name]
-            for app in to_remove: del self.app_mappings[app]
-            if to_remove:
-                self.save_mappings_file()
-                self.refresh_mappings_ui()
-            if self.current_preset_name == self.default_preset_name:
-                self.default_preset_name = None
-            del self.presets[self.current_preset_name]
-            self.save_presets_file()
-            self.current_preset_name = None
-            self.refresh_preset_list()
-            if self.presets:
-                self.load_preset_by_name(list(self.presets.keys())[0])
-
-    def start_upload(self):
-        if self.is_uploading: return
-        if self.pad.is_connected():
-            self.set_blocking_state(True)
-            threading.Thread(target=self._upload_thread, daemon=True).start()
-
-    def _upload_thread(self):
+        self.last_auto_uploaded_preset = name
+        self.activate_preset(name)
+        self.start_upload()
+
+    def begin_upload(self, wait=0):
+        # Claims the upload slot. With wait > 0 a caller queues behind a running
+        # upload for up to that many seconds instead of being turned away.
+        deadline = time.monotonic() + wait
+        while True:
+            with self.state_lock:
+                if not self.pad.is_connected(): return False
+                if not self.is_uploading:
+                    self.is_uploading = True
+                    self.upload_idle.clear()
+                    break
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not self.upload_idle.wait(remaining): return False
+        self.emit("upload", True, None)
+        return True
+
+    def start_upload(self, full=False, deferrable=False):
+        # Uploads the engine starts on its own (reconnect replays) wait out game mode.
+        if deferrable and self.game:
+            with self.state_lock: self.deferred_upload = full or bool(self.deferred_upload)
+            METRICS.incr("game.upload_deferred")
+            return False
+        if not self.begin_upload(): return False
+        self.scheduler.submit(self._upload_thread, full, name="upload")
+        return True
+
+    def upload_now(self, wait=0, full=False):
+        if not self.begin_upload(wait): return False
+        return self._upload_thread(full)
+
+    def _upload_thread(self, full=False):
+        with self.library_lock: name, data, led_mode, layout = self.current_preset_name, list(self.current_data), self.led_mode, self.cfg_layout
         with self.upload_lock:
+            t0 = time.perf_counter() if METRICS.enabled else 0
             try:
-                self.pad.select_layer(0)
-                time.sleep(0.05)
-                new_hotkeys = []
-                
-                # Determine Action IDs based on Layout Mode
-                use_ids = ACTION_IDS_3K_KNOB
-                if self.cfg_layout == "4-Key":
-                    use_ids = ACTION_IDS_4K
-                
-                for i, d in enumerate(self.current_data):
-                    # Skip uploading slots 5 and 6 if in 4-Key mode (indices 4, 5)
-                    if self.cfg_layout == "4-Key" and i > 3:
-                        continue
-                        
-                    t = d.get("type")
-                    current_action_id = use_ids[i]
-                    
-                    if t == "key": self.pad.set_key(i, d["mod"], d["code"], action_id_override=current_action_id)
-                    elif t == "media": self.pad.set_media(i, d["b1"], d["b2"], action_id_override=current_action_id)
-                    elif t == "mouse": self.pad.set_mouse(i, d["mouse_btn"], d["mouse_scroll"], d.get("mod", 0), action_id_override=current_action_id)
-                    elif t == "app_vol":
-                        trigger_code = INTERNAL_TRIGGER_KEYS[i]
-                        self.pad.set_key(i, TRIGGER_MODIFIER, trigger_code, action_id_override=current_action_id)
-                        if keyboard and AudioUtilities:
-                            f_key = f"f{13 + (trigger_code - 104)}"
-                            hk_str = f"ctrl+alt+shift+{f_key}"
-                            new_hotkeys.append({"hotkey": hk_str, "app": d.get("app"), "action": d.get("action")})
-                    time.sleep(0.02)
-                self.pad.set_led(self.led_mode)
-                self.pad.save_to_flash()
-                self.after(0, lambda: self.refresh_hotkeys(new_hotkeys))
-            except Exception as e:
-                self.after(0, self.upload_finished, False)
-            else:
-                self.after(0, self.upload_finished, True)
+                frames = self.preset_frames(name, data, led_mode, layout)
+                previous = None if full else self.pad_image
+                self.pad_image = None
+                ok = self.write_frames(self.pad, frames, previous)
+                if ok: self.pad_image = frames
+                else: LOG.warning("upload", "writes failed while uploading %s", name)
+                if t0: METRICS.observe("upload.total", time.perf_counter() - t0)
+                if self.pad.recorder: self.pad.recorder.flush()
+                self.primary_hotkeys = frames.hotkeys
+                self.refresh_hotkeys(self.all_hotkeys())
+            except Exception:
+                LOG.error("upload", "upload of %s failed", name)
+                METRICS.incr("upload.failed")
+                return self.upload_finished(False)
+        return self.upload_finished(True)
+
+    def write_frames(self, pad, frames, previous=None):
+        # In game mode the slots are written right away; the flash commit waits.
+        commit = not self.game
+        ok = write_preset_frames(pad, frames, previous, self.sleep, commit)
+        if not commit:
+            with self.state_lock: self.uncommitted.add(pad)
+            METRICS.incr("game.flash_deferred")
+        return ok
+
+    def all_hotkeys(self):
+        return self.primary_hotkeys + self.devices.hotkeys()
 
     def refresh_hotkeys(self, new_hotkeys):
-        if not keyboard: return
-        try:
-            for hk in self.active_hotkeys: keyboard.remove_hotkey(hk)
-        except: pass
-        self.active_hotkeys.clear()
-        for item in new_hotkeys:
-            try:
-                cb = lambda a=item["app"], ac=item["action"]: AppAudioController.adjust_app_volume(a, ac)
-                hk = keyboard.add_hotkey(item["hotkey"], cb, suppress=True) 
-                self.active_hotkeys.append(hk)
-            except Exception: pass
+        # App-volume slots are only bound when the audio libraries load.
+        self.hotkeys.update([item for item in new_hotkeys if "macro" in item or load_audio()])
+
+    def run_hotkey(self, item):
+        if "macro" in item: self.macros.trigger(item["hotkey"], item["macro"], item["char_delay"], item["cancel"])
+        else: AppAudioController.adjust_app_volume(item["app"], item["action"])
 
     def upload_finished(self, success):
-        self.set_blocking_state(False)
-        if not success:
-            if self.running and self.winfo_exists():
-                if not self.last_auto_uploaded_preset: 
-                    messagebox.showerror("Error", "Upload failed.")
-
-    def set_blocking_state(self, b):
-        if not self.running or not self.winfo_exists(): return
-        self.is_uploading = b
-        s = "disabled" if b else "normal"
+        if success:
+            self.startup.mark("first_upload")
+            self.devices.remember(self.devices.primary_identity, self.pad)
+        started, self.switch_started_at = self.switch_started_at, None
+        if started and success: METRICS.observe("switch.focus_to_upload", time.perf_counter() - started)
+        self.is_uploading = False
+        self.upload_idle.set()
+        self.emit("upload", False, success)
+        return success
+
+    # --- Control channel ---
+    def timed_upload(self, msg, full=False):
+        t_dispatch = time.perf_counter()
+        ok = self.upload_now(wait=msg.get("wait", 5.0), full=full)
+        t_done = time.perf_counter()
+        if not ok: raise RuntimeError("Upload failed" if self.pad.is_connected() else "Macropad is not connected")
+        received = msg.get("received", t_dispatch)
+        return {
+            "preset": self.current_preset_name,
+            "dispatch_us": round((t_dispatch - received) * 1e6, 1),
+            "upload_ms": round((t_done - t_dispatch) * 1000, 2),
+        }
+
+    def status(self):
+        return {
+            "connected": self.is_connected(),
+            "preset": self.current_preset_name,
+            "uploading": self.is_uploading,
+            "library_version": self.library_version,
+            "version": CURRENT_VERSION,
+            "prediction": self.focus_history.stats(),
+            "devices": 1 + len(self.devices.pads) if self.is_connected() else len(self.devices.pads),
+            "game": self.game[0] if self.game else None,
+        }
+
+    def handle_command(self, msg):
+        cmd = msg.get("cmd")
+        if cmd == "status": return self.status()
+        if cmd == "open":
+            self.emit("open")
+            return {}
+        if cmd == "library":
+            with self.library_lock:
+                return {"presets": dict(self.presets), "mappings": dict(self.app_mappings), "default_preset": self.default_preset_name, "library_version": self.library_version}
+        if cmd == "config":
+            return {"config": self.config_values()}
+        if cmd == "startup":
+            return {"phases_ms": self.startup.report()}
+        if cmd == "trace":
+            if "enable" in msg:
+                self.set_hid_trace(bool(msg["enable"]))
+                self.save_config_state()
+            reply = {"enabled": self.cfg_hid_trace, "path": HID_TRACE_FILE}
+            if msg.get("dump"):
+                if not self.pad.recorder: raise RuntimeError("HID tracing is off")
+                reply["dumped"] = self.pad.recorder.dump(msg["dump"])
+                reply["path"] = msg["dump"]
+            return reply
+        if cmd == "metrics":
+            if "enable" in msg:
+                METRICS.enabled = bool(msg["enable"])
+                self.cfg_metrics = METRICS.enabled
+                self.save_config_state()
+            if msg.get("reset"): METRICS.reset()
+            return METRICS.snapshot()
+        if cmd == "update":
+            release = self.perform_update_check(force=True) if msg.get("check") else self.update_checker.load_cache().get("release")
+            cache = self.update_checker.cache
+            return {"current": CURRENT_VERSION, "latest": (release or {}).get("tag_name"), "url": (release or {}).get("html_url"),
+                    "last_status": cache.get("status"), "next_check_s": round(self.update_checker.next_check_in())}
+        if cmd == "log":
+            for subsystem, level in (msg.get("levels") or {}).items():
+                if level not in LOG_LEVELS: raise ValueError(f"Unknown level: {level}")
+                if subsystem not in LOG_SUBSYSTEMS + ("*",): raise ValueError(f"Unknown subsystem: {subsystem} (one of {', '.join(LOG_SUBSYSTEMS)})")
+                LOG.set_level(subsystem, level)
+                self.cfg_log_levels = dict(self.cfg_log_levels, **{subsystem: level})
+            if "spill" in msg: self.cfg_log_spill = bool(msg["spill"])
+            self.apply_log_config()
+            self.save_config_state()
+            reply = {"levels": LOG.level_names(), "spill": LOG.spill_path}
+            if msg.get("dump"): reply["dumped"], reply["path"] = self.dump_events(msg["dump"]), msg["dump"]
+            else: reply["events"] = LOG.recent(msg.get("count", 50), msg.get("subsystem"))
+            return reply
+        if cmd == "game":
+            if "enable" in msg: self.cfg_game_mode = bool(msg["enable"])
+            if msg.get("add"): self.cfg_game_apps = sorted(set(self.cfg_game_apps) | {msg["add"]})
+            if msg.get("remove"): self.cfg_game_apps = [a for a in self.cfg_game_apps if a.lower() != msg["remove"].lower()]
+            self.save_config_state()
+            self.update_polling()
+            return {"enabled": self.cfg_game_mode, "apps": self.cfg_game_apps, "active": self.game[0] if self.game else None,
+                    "held_upload": self.deferred_upload is not None, "flash_commits_held": len(self.uncommitted)}
+        if cmd == "devices":
+            return {"devices": self.devices.describe()}
+        if cmd == "device":
+            changes = {k: msg[k] for k in ("name", "preset", "map", "unmap") if k in msg}
+            return {"device": self.devices.configure(msg.get("device"), **changes)}
+        if cmd == "list":
+            with self.library_lock: return {"presets": list(self.presets), "default_preset": self.default_preset_name, "current": self.current_preset_name}
+        if cmd == "activate":
+            if not self.activate_preset(msg.get("name")): raise ValueError(f"Unknown preset: {msg.get('name')}")
+            return {"preset": self.current_preset_name}
+        if cmd == "switch":
+            name = msg.get("name")
+            if name not in self.presets: raise ValueError(f"Unknown preset: {name}")
+            if not self.pad.is_connected(): raise RuntimeError("Macropad is not connected")
+            self.last_auto_uploaded_preset = name
+            self.activate_preset(name)
+            return self.timed_upload(msg)
+        if cmd == "upload":
+            with self.library_lock:
+                if "keys" in msg: self.current_data = [dict(d) for d in msg["keys"]]
+                if "led" in msg: self.led_mode = msg["led"]
+            if not self.pad.is_connected(): raise RuntimeError("Macropad is not connected")
+            full = msg.get("full", True)
+            if msg.get("deferrable") and self.game:
+                self.start_upload(full, deferrable=True)
+                return {"preset": self.current_preset_name, "deferred": True}
+            return self.timed_upload(msg, full=full)
+        if cmd == "save_preset":
+            self.save_preset(msg["name"], msg["data"])
+            return {}
+        if cmd == "import_presets":
+            return {"imported": self.import_presets(msg["presets"])}
+        if cmd == "preset":
+            name = msg.get("name")
+            if "parent" in msg: self.set_preset_parent(name, msg["parent"])
+            if name not in self.presets: raise ValueError(f"Unknown preset: {name}")
+            return {"name": name, "stored": self.presets[name], "resolved": self.resolver.resolve(name),
+                    "ancestors": self.resolver.ancestors(name), "children": self.resolver.children_of(name)}
+        if cmd == "delete_preset":
+            return {"unmapped": self.delete_preset(msg["name"])}
+        if cmd == "set_default":
+            self.set_default_preset(msg["name"])
+            return {}
+        if cmd == "add_mapping":
+            self.add_mapping(msg["app"], msg["preset"])
+            return {}
+        if cmd == "remove_mapping":
+            return {"removed": self.remove_mapping(msg["app"])}
+        if cmd == "set_config":
+            self.update_config(msg["values"])
+            return {}
+        raise ValueError(f"Unknown command: {cmd}")
+
+# --- CONTROL CHANNEL ---
+# Local-only IPC: a named pipe on Windows, a Unix socket elsewhere, both behind
+# an authkey kept in the app data folder. Messages are JSON objects sent as
+# single frames; nothing is unpickled.
+if IS_WINDOWS:
+    CONTROL_ADDRESS = r'\\.\pipe\VMacropad-' + (os.getenv('USERNAME') or "user")
+else:
+    CONTROL_ADDRESS = os.path.join(APP_DATA_DIR, "control.sock")
+CONTROL_KEY_FILE = os.path.join(APP_DATA_DIR, "control.key")
+
+def control_authkey(create=False):
+    # A fresh per-user secret for every service start, readable only by its owner.
+    if not create:
         try:
-            self.btn_upload.configure(state=s, text="UPLOADING..." if b else "UPLOAD CONFIGURATION")
-            self.btn_add.configure(state=s)
-            self.btn_del.configure(state=s)
-            for btn in self.preset_widgets.values(): btn.configure(state=s)
-        except: pass
+            with open(CONTROL_KEY_FILE, "rb") as f: return f.read() or None
+        except OSError: return None
+    key = os.urandom(32)
+    fd = os.open(CONTROL_KEY_FILE, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+    with os.fdopen(fd, "wb") as f: f.write(key)
+    if not IS_WINDOWS: os.chmod(CONTROL_KEY_FILE, 0o600)
+    return key
+
+class ControlServer:
+    def __init__(self, engine, address=CONTROL_ADDRESS):
+        self.engine = engine
+        self.address = address
+        self.listener = None
+
+    def start(self):
+        if not IS_WINDOWS and os.path.exists(self.address):
+            try: os.remove(self.address)
+            except OSError: LOG.warning("control", "could not remove the stale socket %s", self.address, exc=True)
+        self.listener = Listener(self.address, authkey=control_authkey(create=True))
+        threading.Thread(target=self.accept_loop, daemon=True).start()
+
+    def close(self):
+        listener, self.listener = self.listener, None
+        if listener:
+            try: listener.close()
+            except OSError: LOG.warning("control", "could not close the listener", exc=True)
+
+    def accept_loop(self):
+        while self.listener:
+            try: conn = self.listener.accept()
+            except Exception:
+                if not self.listener: return
+                LOG.warning("control", "rejected a connection", exc=True)
+                continue
+            threading.Thread(target=self.serve, args=(conn,), daemon=True).start()
+
+    def serve(self, conn):
+        with conn:
+            while True:
+                try: raw = conn.recv_bytes()
+                except (EOFError, OSError): return
+                received = time.perf_counter()
+                msg = None
+                try:
+                    msg = json.loads(raw)
+                    msg["received"] = received
+                    reply = self.engine.handle_command(msg)
+                    reply["ok"] = True
+                except Exception as e:
+                    LOG.info("control", "%s failed", msg.get("cmd") if isinstance(msg, dict) else raw[:40], exc=True)
+                    reply = {"ok": False, "error": str(e)}
+                try: conn.send_bytes(json.dumps(reply).encode("utf-8"))
+                except (EOFError, OSError): return
+
+class ControlClient:
+    def __init__(self, conn):
+        self.conn = conn
+        self.lock = threading.Lock()
+
+    @classmethod
+    def connect(cls, address=CONTROL_ADDRESS):
+        authkey = control_authkey()
+        if authkey is None: return None
+        try: return cls(Client(address, authkey=authkey))
+        except Exception: return None
+
+    def call(self, cmd, **kwargs):
+        kwargs["cmd"] = cmd
+        with self.lock:
+            self.conn.send_bytes(json.dumps(kwargs).encode("utf-8"))
+            reply = json.loads(self.conn.recv_bytes())
+        if not reply.pop("ok", False): raise RuntimeError(reply.get("error", "Command failed"))
+        return reply
+
+    def close(self):
+        try: self.conn.close()
+        except Exception: LOG.debug("control", "closing the connection failed", exc=True)
+
+class RemoteEngine(MacroEngine):
+    # Editor-side view of a running service. Library and config edits are sent
+    # over the control channel; the service owns the device, hotkeys and files.
+    def __init__(self, client):
+        self.client = client
+        self.remote_connected = False
+        super().__init__()
 
-    def check_conn_loop(self):
-        if not self.running: return
-        p = self.pad.scan_for_device()
-        if p and not self.pad.is_connected(): self.pad.connect()
-        elif not p and self.pad.is_connected():
-            self.pad.device = None
-            self.pad._connected = False
-        if self.pad.is_connected() != self.connected_last_frame:
-            self.connected_last_frame = self.pad.is_connected()
-            self.after(0, self.safe_update_status, self.connected_last_frame)
-        self.after(2000, self.check_conn_loop)
+    def load_config_early(self):
+        self.cfg_vid = DEFAULT_VENDOR_ID
+        self.cfg_pid = DEFAULT_PRODUCT_ID
+        self.default_preset_name = None
+        self.cfg_notify_preset = False
+        self.cfg_notify_status = False
+        self.cfg_tray_enabled = True
+        self.cfg_startup = True
+        self.cfg_focus_delay = 0.5
+        self.cfg_check_updates = True
+        self.cfg_update_hours = 24
+        self.cfg_layout = "3-Key + Knob"
+        self.cfg_startup_stamp = None
+        self.cfg_metrics = False
+        self.cfg_hid_trace = False
+        self.cfg_log_levels = {}
+        self.cfg_log_spill = False
+        self.cfg_game_mode = True
+        self.cfg_game_apps = []
+        self.saved_config = None
+        self.load_error = None
+        try: self.apply_config_values(self.client.call("config")["config"])
+        except Exception as e:
+            LOG.warning("control", "could not read the service config", exc=True)
+            self.load_error = ("config", str(e))
 
-    def update_status_ui(self, c):
-        if not self.running or not self.winfo_exists(): return
-        self.update_tray_icon() 
-        try:
-            self.lbl_status_icon.configure(text_color=Theme.CONNECTED_COLOR if c else Theme.DISCONNECTED_COLOR)
-            self.lbl_status_text.configure(text="CONNECTED" if c else "DISCONNECTED", text_color=Theme.TEXT_PRIMARY if c else Theme.TEXT_SECONDARY)
-            self.btn_upload.configure(state="normal" if c else "disabled", fg_color=Theme.CONNECTED_COLOR if c else Theme.WIDGET_BG, text_color="black" if c else Theme.TEXT_DISABLED)
-            if self.init_complete and self.cfg_notify_status:
-                self.notify_user("Device Status", "Macropad Connected" if c else "Macropad Disconnected")
-            if c and self.current_preset_name: self.start_upload()
-        except: pass
-
-    def setup_tray(self):
-        if self.cfg_tray_enabled and not self.tray_icon: self.update_tray_icon()
-    
-    def update_tray_icon(self):
-        if not self.running or not self.cfg_tray_enabled: return
-        color = "#888888"
-        if self.pad.is_connected() and self.current_preset_name in self.presets:
-            color = self.presets[self.current_preset_name].get("color", "#888888")
-        img = Image.new('RGBA', (64, 64), (0,0,0,0))
-        d = ImageDraw.Draw(img)
-        if not self.pad.is_connected():
-            d.rounded_rectangle([2, 2, 62, 62], 16, fill="black", outline="#ff3d00", width=4)
-            d.line((18, 18, 46, 46), fill="#ff3d00", width=6)
-            d.line((46, 18, 18, 46), fill="#ff3d00", width=6)
-        else:
-            d.rounded_rectangle([2, 2, 62, 62], 16, fill=color, outline=color, width=0)
-            d.line((16, 20, 32, 48), fill="white", width=6)
-            d.line((32, 48, 48, 20), fill="white", width=6)
-        if self.tray_icon:
-            self.tray_icon.icon = img
-            self.tray_icon.menu = self.create_tray_menu()
-        else:
-            self.tray_icon = pystray.Icon("VMacropad", img, "V Macropad", self.create_tray_menu())
-            threading.Thread(target=self.tray_icon.run, daemon=True).start()
+    def load_presets(self):
+        try: lib = self.client.call("library")
+        except Exception as e:
+            LOG.warning("control", "could not read the service library", exc=True)
+            self.load_error = ("library", str(e))
+            return {}
+        self.app_mappings_remote = lib["mappings"]
+        self.library_version = lib["library_version"]
+        return lib["presets"]
 
-    def _make_tray_action(self, name): return lambda icon, item: self.tray_activate_preset(name)
-    def _make_tray_check(self, name): return lambda item: self.current_preset_name == name
+    def load_mappings(self):
+        return getattr(self, "app_mappings_remote", {})
+
+    def start(self):
+        try: status = self.client.call("status")
+        except Exception:
+            LOG.warning("control", "could not read the service status", exc=True)
+            status = {}
+        self.library_version = status.get("library_version", 0)
+        self.remote_connected = status.get("connected", False)
+        name = status.get("preset")
+        if name in self.presets: MacroEngine.activate_preset(self, name, is_auto=True)
+        elif self.presets: MacroEngine.activate_preset(self, next(iter(self.presets)), is_auto=True)
+        self.init_complete = True
+        self.scheduler.start()
+        self.scheduler.call_every(0.5, self.poll_status, name="remote_poll")
+        if self.load_error: self.emit("remote_error", *self.load_error)
 
-    def create_tray_menu(self):
-        items = [pystray.MenuItem("Open", self.show_window_tray, default=True), pystray.Menu.SEPARATOR]
-        for name in self.presets:
-            items.append(pystray.MenuItem(name, self._make_tray_action(name), checked=self._make_tray_check(name)))
-        items.append(pystray.Menu.SEPARATOR)
-        items.append(pystray.MenuItem("Quit", self.quit_app))
-        return pystray.Menu(*items)
+    def stop(self):
+        if not self.running: return
+        self.running = False
+        self.scheduler.stop()
+        self.client.close()
+        self.stopped.set()
 
-    def tray_activate_preset(self, name):
-        if not self.running or self.is_uploading: return
-        self.last_auto_uploaded_preset = name
-        self.after(0, self.safe_tray_load, name)
+    def is_connected(self):
+        return self.remote_connected
 
-    def safe_tray_load(self, name):
-        if self.running and self.winfo_exists():
-            self.load_preset_by_name(name)
-            self.start_upload()
+    def call(self, cmd, **kwargs):
+        # A refused edit leaves the local view ahead of the service; the next status
+        # poll reloads the library, and a refused config change reloads the config.
+        try: return self.client.call(cmd, **kwargs)
+        except Exception as e:
+            LOG.warning("control", "%s was not applied: %s", cmd, e, exc=not isinstance(e, RuntimeError))
+            self.library_version = None
+            if cmd == "set_config": self.scheduler.submit(self.refresh_config, name="refresh_config")
+            self.emit("remote_error", cmd, str(e))
+            return None
+
+    def refresh_config(self):
+        reply = self.call("config")
+        if reply: self.apply_config_values(reply["config"])
+
+    def poll_status(self):
+        try: status = self.client.call("status")
+        except Exception:
+            self.running = False
+            self.scheduler.stop()
+            self.emit("stopped")
+            return
+        if status["library_version"] != self.library_version:
+            self.refresh_library()
+        if status["connected"] != self.remote_connected:
+            self.remote_connected = status["connected"]
+            self.emit("status", self.remote_connected)
+        name = status.get("preset")
+        if name and name != self.current_preset_name and name in self.presets and not self.is_uploading:
+            MacroEngine.activate_preset(self, name, is_auto=True)
+
+    def refresh_library(self):
+        lib = self.call("library")
+        if not lib: return
+        self.library_version = lib["library_version"]
+        self.default_preset_name = lib["default_preset"]
+        if lib["mappings"] != self.app_mappings:
+            self.app_mappings = lib["mappings"]
+            self.emit("mappings")
+        if lib["presets"] != self.presets:
+            self.presets = lib["presets"]
+            self.emit("presets")
+
+    def set_hid_trace(self, enabled): pass
+    def apply_log_config(self): pass
+    def update_polling(self): pass
+    def wake(self): pass
+    def save_config_state(self): pass
+    def save_presets_file(self): pass
+    def save_mappings_file(self): pass
+    def force_refresh_startup(self): pass
+    def notify_user(self, title, message, category="info"): pass
+
+    def update_config(self, values):
+        self.apply_config_values(values)
+        self.call("set_config", values=values)
+
+    def save_preset(self, name, data):
+        # Stored the way the service stores it, so both sides resolve alike.
+        self.presets[name] = self.stored_preset(name, data)
+        self.resolver.invalidate(name)
+        self.call("save_preset", name=name, data=data)
+        self.emit("preset_added", name)
+
+    def delete_preset(self, name):
+        unmapped = [app for app, pre in self.app_mappings.items() if pre == name]
+        for app in unmapped: del self.app_mappings[app]
+        if name == self.default_preset_name: self.default_preset_name = None
+        self.resolver.invalidate(name)
+        self.presets.pop(name, None)
+        if self.current_preset_name == name: self.current_preset_name = None
+        self.call("delete_preset", name=name)
+        self.emit("preset_removed", name)
+        return unmapped
+
+    def set_default_preset(self, name):
+        self.default_preset_name = name
+        self.app_mappings = {k: v for k, v in self.app_mappings.items() if v != name}
+        self.call("set_default", name=name)
+
+    def add_mapping(self, app_name, preset_name):
+        self.app_mappings[app_name] = preset_name
+        self.call("add_mapping", app=app_name, preset=preset_name)
 
-    def show_window_tray(self, icon=None, item=None):
-        if self.running: self.after(0, self.deiconify)
+    def remove_mapping(self, app_name):
+        if app_name not in self.app_mappings: return False
+        del self.app_mappings[app_name]
+        self.call("remove_mapping", app=app_name)
+        return True
 
-    def on_close_attempt(self):
-        if self.cfg_tray_enabled: self.withdraw()
-        else: self.quit_app()
+    def activate_preset(self, name, is_auto=False):
+        if not MacroEngine.activate_preset(self, name, is_auto): return False
+        if not is_auto: self.call("activate", name=name)
+        return True
 
-    def quit_app(self, icon=None, item=None):
-        self.running = False
-        self.after(0, self._perform_shutdown)
+    def tray_activate_preset(self, name): pass
 
-    def _perform_shutdown(self):
-        if self.tray_icon: self.tray_icon.stop()
-        if keyboard:
-            try: keyboard.unhook_all()
-            except: pass
-        self.destroy()
-        os._exit(0)
+    def upload_finished(self, success):
+        # Startup timing and the device cache belong to the service.
+        self.is_uploading = False
+        self.upload_idle.set()
+        self.emit("upload", False, success)
+        return success
+
+    def start_upload(self, full=False, deferrable=False):
+        if self.is_uploading or not self.remote_connected: return
+        self.is_uploading = True
+        self.emit("upload", True, None)
+        def remote_upload():
+            reply = self.call("upload", keys=self.current_data, led=self.led_mode, full=full, deferrable=deferrable)
+            self.upload_finished(reply is not None)
+        self.scheduler.submit(remote_upload, name="upload")
+
+# --- ENTRY POINTS ---
+class EditorLauncher:
+    def __init__(self):
+        self.process = None
+
+    def open(self):
+        if self.process and self.process.poll() is None: return
+        args = [sys.executable]
+        if not getattr(sys, 'frozen', False): args.append(os.path.abspath(__file__))
+        args.append("--ui")
+        try: self.process = subprocess.Popen(args)
+        except Exception: self.process = None
+
+    def close(self):
+        if self.process and self.process.poll() is None:
+            try: self.process.terminate()
+            except Exception: LOG.warning("control", "could not stop the editor", exc=True)
+
+def run_daemon(engine):
+    server = ControlServer(engine)
+    server.start()
+    editor = EditorLauncher()
+    engine.subscribe(lambda event, *args: editor.open() if event == "open" else None)
+    tray = TrayController(engine, on_open=editor.open, on_quit=engine.stop)
+    engine.start()
+    tray.start()
+    engine.stopped.wait()
+    tray.stop()
+    server.close()
+    editor.close()
+    os._exit(0)
+
+def run_editor(engine=None):
+    server = None
+    if engine is None:
+        client = ControlClient.connect()
+        engine = RemoteEngine(client) if client else MacroEngine()
+    if not isinstance(engine, RemoteEngine):
+        server = ControlServer(engine)
+        try: server.start()
+        except Exception: server = None
+    from vmacropad_ui import VMacroApp
+    app = VMacroApp(engine)
+    app.mainloop()
+    if server: server.close()
+
+CTL_USAGE = """usage: vmacropad.py ctl [--json] <command>
+
+commands:
+  status              connection state and active preset
+  list                preset names
+  switch <preset>     activate a preset and upload it to the pad
+  upload              re-upload the active preset
+  startup             startup timing report
+  metrics [on|off|reset]
+                      latency histograms and counters; toggles or clears collection
+  trace [on|off|dump <file>]
+                      record HID frames to hid-trace.vmht; dump writes the in-memory ring
+  update [check]      cached release info; check asks the server now
+  log [N] [subsystem] recent events (default 50)
+  log level <subsystem|*> <debug|info|warning|error|off>
+                      subsystems: hid, devices, upload, focus, engine, presets, audio,
+                      hotkeys, macro, config, update, control, tray
+  log spill [on|off]  also append warnings and errors to events.log
+  log dump <file>     write every buffered event to a file
+  game [on|off]       game mode state; toggles pausing in fullscreen apps
+  preset <name> [inherit <parent>|detach]
+                      show a preset's stored and resolved slots; inherit keeps only
+                      the slots that differ from parent, detach stores a full copy
+  game add|remove <app>
+                      treat an app as a game even when it is windowed
+  devices             attached pads, their presets and assignments
+  device <n|id> assign <preset>|follow
+  device <n|id> map <app> <preset>
+  device <n|id> unmap <app>
+  device <n|id> name <label>
+                      per-pad settings for additional pads"""
+
+def device_changes(args):
+    # "device <ref> <op> ..." -> keyword arguments for the device command
+    op, rest = (args[2] if len(args) > 2 else ""), args[3:]
+    if op == "assign" and rest: return {"preset": None if rest == ["follow"] else " ".join(rest)}
+    if op == "map" and len(rest) >= 2: return {"map": {rest[0]: " ".join(rest[1:])}}
+    if op == "unmap" and rest: return {"unmap": rest[0]}
+    if op == "name" and rest: return {"name": " ".join(rest)}
+    return None
+
+def preset_options(args):
+    # "preset <name...> [inherit <parent...>|detach]"
+    for i, arg in enumerate(args[2:], 2):
+        if arg == "detach": return {"name": " ".join(args[1:i]), "parent": None}
+        if arg == "inherit" and i + 1 < len(args): return {"name": " ".join(args[1:i]), "parent": " ".join(args[i + 1:])}
+    return {"name": " ".join(args[1:])}
+
+def log_options(args):
+    op = args[1] if len(args) > 1 else ""
+    if op == "level" and len(args) > 3: return {"levels": {args[2]: args[3]}}
+    if op == "spill": return {"spill": args[2:3] != ["off"]}
+    if op == "dump": return {"dump": os.path.abspath(args[2] if len(args) > 2 else "events-recent.txt")}
+    opts = {}
+    for arg in args[1:]:
+        if arg.isdigit(): opts["count"] = int(arg)
+        else: opts["subsystem"] = arg
+    return opts
+
+def run_ctl(args):
+    as_json = "--json" in args
+    args = [a for a in args if a != "--json"]
+    if not args or args[0] not in ("status", "list", "switch", "upload", "startup", "metrics", "trace", "update", "log", "devices", "device", "game", "preset") or (args[0] in ("switch", "preset") and len(args) < 2) \
+            or (args[0] == "device" and not device_changes(args)):
+        print(CTL_USAGE)
+        return 2
+    client = ControlClient.connect()
+    if not client:
+        print("VMacropad is not running.", file=sys.stderr)
+        return 3
+    t0 = time.perf_counter()
+    try:
+        if args[0] == "switch": reply = client.call("switch", name=" ".join(args[1:]))
+        elif args[0] == "metrics":
+            opts = {"on": {"enable": True}, "off": {"enable": False}, "reset": {"reset": True}}
+            reply = client.call("metrics", **opts.get(args[1] if len(args) > 1 else "", {}))
+        elif args[0] == "trace":
+            opt = args[1] if len(args) > 1 else ""
+            if opt == "dump": reply = client.call("trace", dump=os.path.abspath(args[2] if len(args) > 2 else "hid-ring.vmht"))
+            elif opt in ("on", "off"): reply = client.call("trace", enable=opt == "on")
+            else: reply = client.call("trace")
+        elif args[0] == "update": reply = client.call("update", check=args[1:2] == ["check"])
+        elif args[0] == "device": reply = client.call("device", device=args[1], **device_changes(args))
+        elif args[0] == "log": reply = client.call("log", **log_options(args))
+        elif args[0] == "preset": reply = client.call("preset", **preset_options(args))
+        elif args[0] == "game":
+            op, app = (args[1] if len(args) > 1 else ""), " ".join(args[2:])
+            opts = {"on": {"enable": True}, "off": {"enable": False}, "add": {"add": app}, "remove": {"remove": app}}
+            reply = client.call("game", **opts.get(op, {}))
+        else: reply = client.call(args[0])
+    except RuntimeError as e:
+        print(f"error: {e}", file=sys.stderr)
+        return 1
+    finally: client.close()
+    reply["roundtrip_ms"] = round((time.perf_counter() - t0) * 1000, 2)
+    if as_json: print(json.dumps(reply))
+    elif args[0] == "metrics":
+        print(f"collection: {'on' if reply['enabled'] else 'off'}")
+        for name, h in reply["histograms"].items():
+            print(f"{name:<24} n={h['count']:<7} mean={h['mean_ms']:.3f}ms p50={h['p50_ms']:.3f}ms p90={h['p90_ms']:.3f}ms p99={h['p99_ms']:.3f}ms max={h['max_ms']:.3f}ms")
+        for name, n in reply["counters"].items():
+            print(f"{name:<24} {n}")
+    elif args[0] == "log":
+        for line in reply.get("events", []): print(line)
+        if "dumped" in reply: print(f"{reply['dumped']} events written to {reply['path']}")
+        print("levels: " + ", ".join(f"{k}={v}" for k, v in reply["levels"].items()) + f"; spill: {reply['spill'] or 'off'}")
+    elif args[0] == "devices" or args[0] == "device":
+        for i, d in enumerate(reply.get("devices") or [reply["device"]], 1):
+            label = f" \"{d['name']}\"" if d.get("name") else ""
+            state = ("uploading " if d.get("uploading") else "") + (d.get("preset") or "-") if d["connected"] else "not connected"
+            pin = f" assigned={d['assigned']}" if d.get("assigned") else (" follows primary" if d["role"] == "extra" else "")
+            apps = "".join(f" {app}->{p}" for app, p in d.get("mappings", {}).items())
+            print(f"{i}. [{d['role']}] {d['id']}{label}: {state}{pin}{apps}")
+    elif args[0] == "preset":
+        stored, resolved = reply["stored"], reply["resolved"]
+        overrides = stored.get("keys")
+        if stored.get("parent") is None: own = None
+        elif isinstance(overrides, dict): own = {int(i) for i in overrides}
+        else: own = {i for i, slot in enumerate(overrides or []) if slot is not None}
+        print(" <- ".join([reply["name"]] + reply["ancestors"]))
+        for i, slot in enumerate(resolved["keys"]):
+            print(f"{'*' if own is None or i in own else ' '} {i + 1} = {format_slot(slot)}")
+        print(f"led: {resolved.get('led', 1)}, color: {resolved.get('color', '#888888')}; children: {', '.join(reply['children']) or '-'}")
+        if own is not None: print("(* = stored in this preset, the rest is inherited)")
+    elif args[0] == "list":
+        for name in reply["presets"]:
+            mark = "*" if name == reply["current"] else " "
+            print(f"{mark} {name}{' (DEFAULT)' if name == reply['default_preset'] else ''}")
+    else:
+        for key, value in reply.items():
+            if key != "roundtrip_ms": print(f"{key}: {value}")
+        print(f"roundtrip_ms: {reply['roundtrip_ms']}")
+    return 0
+
+def saved_config():
+    try:
+        with open(CONFIG_FILE, "r") as f: return json.load(f)
+    except Exception: return {}
+
+def run_compile(args):
+    import argparse
+    conf = saved_config()
+    parser = argparse.ArgumentParser(prog="vmacropad.py compile", description="Validate presets and compile them into a bundle for 'flash'.")
+    parser.add_argument("output")
+    parser.add_argument("--presets", default=PRESETS_FILE, help="presets.json to compile (default: the app's library)")
+    parser.add_argument("--layout", choices=BUNDLE_LAYOUTS, default=conf.get("layout", "3-Key + Knob"))
+    parser.add_argument("--bank", type=int, choices=range(TRIGGER_BANKS), default=0, help="trigger-chord bank for App Audio and Macro slots")
+    parser.add_argument("--only", action="append", metavar="PRESET", help="compile only these presets")
+    opts = parser.parse_args(args)
+    try:
+        with open(opts.presets, "r") as f: presets = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"error: cannot read {opts.presets}: {e}", file=sys.stderr)
+        return 1
+    try: blob = compile_bundle(presets, opts.layout, opts.bank, opts.only)
+    except ValueError as e:
+        print(f"error: invalid presets:\n{e}", file=sys.stderr)
+        return 1
+    with open(opts.output, "wb") as f: f.write(blob)
+    _, _, compiled = read_bundle(blob)
+    for p in compiled: print(f"{p.digest[:12]}  {p.name}")
+    print(f"{len(compiled)} presets ({opts.layout}), {len(blob)} bytes -> {opts.output}")
+    return 0
+
+def run_import(args):
+    import argparse
+    parser = argparse.ArgumentParser(prog="vmacropad.py import", description="Add presets written in the text slot syntax to the library.")
+    parser.add_argument("file", help="text file, '-' for stdin")
+    parser.add_argument("--dry-run", action="store_true", help="parse and check only")
+    opts = parser.parse_args(args)
+    try:
+        if opts.file == "-": text = sys.stdin.read()
+        else:
+            with open(opts.file, "r", encoding="utf-8") as f: text = f.read()
+    except OSError as e:
+        print(f"error: cannot read {opts.file}: {e}", file=sys.stderr)
+        return 1
+    t0 = time.perf_counter()
+    presets, errors = parse_preset_text(text)
+    parse_ms = (time.perf_counter() - t0) * 1000
+    client = ControlClient.connect()
+    try:
+        if client: library = client.call("library")["presets"]
+        else:
+            try:
+                with open(PRESETS_FILE, "r") as f: library = json.load(f)
+            except (OSError, ValueError): library = {}
+        resolver = PresetResolver(dict(library, **presets))
+        for name in presets:
+            problems = validate_preset(resolver.resolve(name), saved_config().get("layout", "3-Key + Knob"))
+            if name in resolver.broken: problems.insert(0, resolver.broken[name])
+            errors += [f"{name}: {e}" for e in problems]
+        if errors:
+            print("error: nothing imported:\n" + "\n".join(errors), file=sys.stderr)
+            return 1
+        slots = sum(len(d["keys"]) for d in presets.values())
+        print(f"{len(presets)} presets, {slots} slots parsed in {parse_ms:.1f} ms")
+        if opts.dry_run: return 0
+        if client: client.call("import_presets", presets=presets)
+        else:
+            with open(PRESETS_FILE, "w") as f: json.dump(dict(library, **presets), f, indent=4)
+        print(f"imported into {'the running app' if client else PRESETS_FILE}")
+        return 0
+    finally:
+        if client: client.close()
+
+def run_flash(args):
+    import argparse
+    conf = saved_config()
+    parser = argparse.ArgumentParser(prog="vmacropad.py flash", description="Write a compiled preset to one or more pads.")
+    parser.add_argument("bundle")
+    parser.add_argument("--preset", help="preset to write (default: the first in the bundle)")
+    parser.add_argument("--device", action="append", metavar="N|ID", help="pad number or identity from --list (default: every pad)")
+    parser.add_argument("--list", action="store_true", help="show the bundle contents and attached pads")
+    opts = parser.parse_args(args)
+    try:
+        with open(opts.bundle, "rb") as f: layout, bank, presets = read_bundle(f.read())
+    except (OSError, ValueError, struct.error) as e:
+        print(f"error: {opts.bundle}: {e}", file=sys.stderr)
+        return 1
+    pads = scan_pads(conf.get("vendor_id", DEFAULT_VENDOR_ID), conf.get("product_id", DEFAULT_PRODUCT_ID))
+    if opts.list:
+        print(f"{layout}, trigger bank {bank}")
+        for p in presets: print(f"  {p.digest[:12]}  {p.name}{f' ({len(p.frames.hotkeys)} host-side slots)' if p.frames.hotkeys else ''}")
+        for i, d in enumerate(pads, 1): print(f"{i}. {d['identity']}  {hid_path_text(d['path'])}")
+        return 0
+    preset = next((p for p in presets if p.name == opts.preset), None) if opts.preset else (presets[0] if presets else None)
+    if not preset:
+        print(f"error: {opts.preset or 'a preset'} is not in the bundle", file=sys.stderr)
+        return 1
+    if opts.device:
+        chosen = [d for i, d in enumerate(pads, 1) if any(ref == str(i) if ref.isdigit() else ref in d["identity"] for ref in opts.device)]
+    else: chosen = pads
+    if not chosen:
+        print("No macropad found.", file=sys.stderr)
+        return 1
+    client = ControlClient.connect()
+    if client:
+        # The service keeps track of what each pad holds; writing behind its back
+        # would make its next upload skip slots that changed.
+        client.close()
+        print("VMacropad is running; quit it before flashing.", file=sys.stderr)
+        return 1
+    known = {}
+    try:
+        with open(DEVICE_CACHE_FILE, "r") as f: known = json.load(f)
+    except FileNotFoundError: pass
+    except Exception: LOG.warning("devices", "could not read %s", DEVICE_CACHE_FILE, exc=True)
+    results = {}
+    def flash(entry):
+        pad = MacroPadDevice(conf.get("vendor_id", DEFAULT_VENDOR_ID), conf.get("product_id", DEFAULT_PRODUCT_ID))
+        pad.working_strategy = known.get(entry["identity"], {}).get("strategy")
+        t0 = time.perf_counter()
+        ok = pad.connect(entry["path"]) and write_preset_frames(pad, preset.frames)
+        results[entry["identity"]] = (ok, (time.perf_counter() - t0) * 1000)
+        pad.mark_disconnected()
+    threads = [threading.Thread(target=flash, args=(d,)) for d in chosen]
+    for t in threads: t.start()
+    for t in threads: t.join()
+    for identity, (ok, ms) in results.items(): print(f"{identity}: {'ok' if ok else 'FAILED'} ({ms:.0f} ms)")
+    if preset.frames.hotkeys: print(f"{len(preset.frames.hotkeys)} App Audio/Macro slot(s) only act while VMacropad is running.")
+    return 0 if all(ok for ok, _ in results.values()) else 1
+
+def main(argv=None):
+    # The editor module imports from "vmacropad"; make sure that resolves to this
+    # module when it is run as a script instead of loading a second copy.
+    sys.modules.setdefault("vmacropad", sys.modules[__name__])
+    args = sys.argv[1:] if argv is None else argv
+    if args[:1] == ["ctl"]: return run_ctl(args[1:])
+    if args[:1] == ["compile"]: return run_compile(args[1:])
+    if args[:1] == ["flash"]: return run_flash(args[1:])
+    if args[:1] == ["import"]: return run_import(args[1:])
+    if "--ui" in args: return run_editor()
+    client = ControlClient.connect()
+    if client:
+        # Already running: bring up its editor instead of starting a second service.
+        try: client.call("open")
+        except Exception as e: LOG.warning("control", "the running instance did not open its editor: %s", e)
+        client.close()
+        return
+    engine = MacroEngine()
+    if "--daemon" in args or engine.cfg_tray_enabled: return run_daemon(engine)
+    run_editor(engine)
+
+STARTUP_IMPORT_TIME = time.perf_counter() - PROCESS_T0
 
 if __name__ == "__main__":
-    app = VMacroApp()
-    app.mainloop()
+    sys.exit(main())
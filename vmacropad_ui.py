@@ -0,0 +1,907 @@
+import customtkinter as ctk
+import tkinter as tk
+from tkinter import messagebox, colorchooser
+import os
+import time
+import threading
+import math
+import webbrowser
+
+from vmacropad import (
+    CURRENT_VERSION, MISSING_LIBS, LOG, METRICS, KEY_MAP, MEDIA_MAP, MOUSE_BUTTONS, MOUSE_WHEEL, LED_MODES,
+    MOUSE_BUTTON_NAMES, MOUSE_WHEEL_NAMES, LED_NAMES, key_name, key_code, media_name, media_code,
+    RemoteEngine, TrayController, get_active_app_process, parse_macro, resource_path,
+)
+
+MACRO_HINT = "ctrl+c  ·  down shift / up shift  ·  type Hello  ·  wait 50"
+
+# --- THEME DEFINITION ---
+class Theme:
+    MAIN_BG = "#000000"
+    CONTAINER_BG = "#121212" 
+    WIDGET_BG = "#1c1c1c"
+    ACTIVE_BUTTON = "#e5e5e5"
+    INACTIVE_PILL = "#282828"
+    BUTTON_HOVER = "#333333"
+    CONNECTED_COLOR = "#76ff03"
+    DISCONNECTED_COLOR = "#ff3d00"
+    TEXT_PRIMARY = "#ffffff"
+    TEXT_INVERSE = "#000000"
+    TEXT_SECONDARY = "#8e8e8e"
+    TEXT_DISABLED = "#4d4d4d"
+    FONT_HEADER = ("Segoe UI", 20, "bold")
+    FONT_SUBHEADER = ("Segoe UI", 14, "bold")
+    FONT_BODY = ("Segoe UI", 12, "normal")
+
+# --- PRESET SIDEBAR ---
+class VirtualPresetList(ctk.CTkFrame):
+    # Only the rows that fit in the viewport exist as widgets. Scrolling rebinds
+    # the pooled buttons to other names instead of creating new ones.
+    ROW_HEIGHT = 37
+
+    def __init__(self, master, command, **kwargs):
+        super().__init__(master, fg_color="transparent", **kwargs)
+        self.command = command
+        self.items = []
+        self.labels = {}
+        self.active = None
+        self.row_state = "normal"
+        self.top = 0
+        self.rows = []
+        self.row_cache = []
+        self.grid_rowconfigure(0, weight=1)
+        self.grid_columnconfigure(0, weight=1)
+        self.body = ctk.CTkFrame(self, fg_color="transparent", corner_radius=0)
+        self.body.grid(row=0, column=0, sticky="nsew")
+        self.scrollbar = ctk.CTkScrollbar(self, command=self.on_scrollbar)
+        self.scrollbar.grid(row=0, column=1, sticky="ns")
+        self.body.bind("<Configure>", self.on_resize)
+        self._bind_wheel(self.body)
+
+    def _bind_wheel(self, widget):
+        widget.bind("<MouseWheel>", self.on_wheel)
+        widget.bind("<Button-4>", lambda e: self.scroll_to(self.top - 1))
+        widget.bind("<Button-5>", lambda e: self.scroll_to(self.top + 1))
+
+    def visible_count(self):
+        h = self.body.winfo_height()
+        if h < self.ROW_HEIGHT: return 0
+        return h // self.ROW_HEIGHT + 1
+
+    def max_top(self):
+        per_page = max(1, self.body.winfo_height() // self.ROW_HEIGHT)
+        return max(0, len(self.items) - per_page)
+
+    def on_resize(self, _=None):
+        needed = self.visible_count()
+        while len(self.rows) < needed:
+            i = len(self.rows)
+            btn = ctk.CTkButton(self.body, text="", font=Theme.FONT_BODY, height=35, fg_color=Theme.INACTIVE_PILL, hover_color=Theme.BUTTON_HOVER, command=lambda r=i: self.on_row_click(r))
+            self._bind_wheel(btn)
+            self.rows.append(btn)
+            self.row_cache.append(None)
+        self.top = min(self.top, self.max_top())
+        self.render()
+
+    def on_row_click(self, row):
+        idx = self.top + row
+        if idx < len(self.items): self.command(self.items[idx])
+
+    def on_wheel(self, event):
+        step = -1 if event.delta > 0 else 1
+        self.scroll_to(self.top + step * max(1, abs(event.delta) // 120))
+
+    def on_scrollbar(self, *args):
+        if not args: return
+        if args[0] == "moveto":
+            self.scroll_to(int(round(float(args[1]) * len(self.items))))
+        elif args[0] == "scroll":
+            step = int(float(args[1]))
+            self.scroll_to(self.top + (step > 0) - (step < 0))
+        else:
+            self.scroll_to(int(round(float(args[0]) * len(self.items))))
+
+    def scroll_to(self, top):
+        top = max(0, min(int(top), self.max_top()))
+        if top == self.top: return
+        self.top = top
+        self.render()
+
+    def render(self):
+        for r in range(len(self.rows)): self.render_row(r)
+        self.render_scrollbar()
+
+    def render_row(self, r):
+        if r >= len(self.rows) or r >= self.visible_count():
+            if r < len(self.rows) and self.row_cache[r] is not None:
+                self.rows[r].place_forget()
+                self.row_cache[r] = None
+            return
+        btn = self.rows[r]
+        idx = self.top + r
+        if idx >= len(self.items):
+            if self.row_cache[r] is not None:
+                btn.place_forget()
+                self.row_cache[r] = None
+            return
+        name = self.items[idx]
+        is_active = name == self.active
+        key = (self.labels.get(name, name), is_active, self.row_state)
+        if self.row_cache[r] == key: return
+        if self.row_cache[r] is None:
+            btn.place(x=0, y=r * self.ROW_HEIGHT, relwidth=1.0)
+        try:
+            btn.configure(text=key[0], state=self.row_state,
+                          fg_color=Theme.ACTIVE_BUTTON if is_active else Theme.INACTIVE_PILL,
+                          text_color=Theme.TEXT_INVERSE if is_active else Theme.TEXT_PRIMARY)
+        except tk.TclError: pass
+        self.row_cache[r] = key
+
+    def render_name(self, name):
+        try: idx = self.items.index(name)
+        except ValueError: return
+        r = idx - self.top
+        if 0 <= r < len(self.rows): self.render_row(r)
+
+    def set_items(self, names, labels=None):
+        self.items = list(names)
+        self.labels = dict(labels or {})
+        self.row_cache = [None if k is None else () for k in self.row_cache]
+        self.top = min(self.top, self.max_top())
+        self.render()
+
+    def insert(self, name, label=None):
+        if label is not None: self.labels[name] = label
+        if name in self.items:
+            self.render_name(name)
+            return
+        self.items.append(name)
+        r = len(self.items) - 1 - self.top
+        if 0 <= r < len(self.rows): self.render_row(r)
+        self.render_scrollbar()
+
+    def remove(self, name):
+        if name not in self.items: return
+        idx = self.items.index(name)
+        self.items.pop(idx)
+        self.labels.pop(name, None)
+        if self.active == name: self.active = None
+        old_top = self.top
+        self.top = min(self.top, self.max_top())
+        start = 0 if self.top != old_top else max(0, idx - self.top)
+        for r in range(start, len(self.rows)): self.render_row(r)
+        self.render_scrollbar()
+
+    def set_label(self, name, label):
+        if label is None: self.labels.pop(name, None)
+        else: self.labels[name] = label
+        self.render_name(name)
+
+    def set_active(self, name):
+        if name == self.active: return
+        old, self.active = self.active, name
+        if old is not None: self.render_name(old)
+        if name is not None: self.render_name(name)
+
+    def set_state(self, state):
+        if state == self.row_state: return
+        self.row_state = state
+        for r in range(len(self.rows)): self.render_row(r)
+
+    def render_scrollbar(self):
+        total = len(self.items)
+        if not total:
+            self.scrollbar.set(0.0, 1.0)
+            return
+        per_page = max(1, self.body.winfo_height() // self.ROW_HEIGHT)
+        self.scrollbar.set(self.top / total, min(1.0, (self.top + per_page) / total))
+
+# --- UI UPDATE BUS ---
+class UiUpdateBus:
+    # Worker threads publish state changes here; the Tk thread applies them once per
+    # frame. Repeated changes of one kind collapse to the latest, so a burst of
+    # engine events costs a single refresh. call() queues one-off work in order.
+    FRAME_MS = 16
+
+    def __init__(self, widget, apply):
+        self.widget = widget
+        self.apply = apply
+        self.lock = threading.Lock()
+        self.changes = {}
+        self.calls = []
+        self.scheduled = False
+        self.queued_at = 0
+
+    def publish(self, kind, *args):
+        with self.lock:
+            self.changes[kind] = args
+            self._schedule()
+
+    def append(self, kind, *item):
+        # Like publish, but every item is kept in order.
+        with self.lock:
+            self.changes.setdefault(kind, []).append(item)
+            self._schedule()
+
+    def call(self, fn, *args):
+        with self.lock:
+            self.calls.append((fn, args))
+            self._schedule()
+
+    def _schedule(self):
+        if self.scheduled: return
+        self.scheduled = True
+        if METRICS.enabled: self.queued_at = time.perf_counter()
+        try: self.widget.after(self.FRAME_MS, self.drain)
+        except Exception: self.scheduled = False
+
+    def drain(self):
+        with self.lock:
+            changes, calls, queued = self.changes, self.calls, self.queued_at
+            self.changes, self.calls, self.queued_at = {}, [], 0
+            self.scheduled = False
+        if queued: METRICS.observe("ui.event_delay", time.perf_counter() - queued)
+        if changes: self.apply(changes)
+        for fn, args in calls: fn(*args)
+
+# --- MAIN APPLICATION ---
+class VMacroApp(ctk.CTk):
+    def __init__(self, engine):
+        super().__init__()
+
+        self.engine = engine
+        self.is_remote = isinstance(engine, RemoteEngine)
+
+        ctk.set_appearance_mode("dark")
+        ctk.set_default_color_theme("dark-blue")
+        self.title(f"V Macropad Manager")
+        self.geometry("1000x700")
+        self.configure(fg_color=Theme.MAIN_BG)
+        self.protocol("WM_DELETE_WINDOW", self.on_close_attempt)
+        self.minsize(950, 650)
+
+        try:
+            icon_path = resource_path("vmacropad.ico")
+            self.iconbitmap(icon_path)
+        except Exception: pass
+
+        self.selected_key_index = 0
+        self.running = True
+        self.tray = None
+        self.ui_bus = UiUpdateBus(self, self.apply_ui_changes)
+        self.deferred_changes = {}
+
+        self.grid_columnconfigure(1, weight=1)
+        self.grid_rowconfigure(0, weight=1)
+
+        self.setup_sidebar()
+        self.setup_main_area()
+        self.engine.subscribe(self.on_engine_event)
+        self.engine.start()
+        self.refresh_preset_list()
+        self.update_editor_ui()
+        self.draw_visualizer()
+        self.update_status_ui(self.engine.is_connected())
+        self.engine.startup.mark("ui_build")
+        if not self.is_remote:
+            self.tray = TrayController(self.engine, on_open=self.show_window_tray, on_quit=self.quit_app)
+            self.tray.start()
+
+        if self.tray and self.engine.cfg_tray_enabled: self.withdraw()
+        else: self.deiconify()
+        self.bind("<Map>", lambda e: e.widget is self and self.after_idle(self.catch_up))
+
+    def on_engine_event(self, event, *args):
+        # Engine events arrive on worker threads; state goes through the UI bus.
+        if not self.running: return
+        if event == "upload":
+            state, success = args
+            self.ui_bus.publish("uploading", state)
+            if success is False: self.ui_bus.publish("upload_failed")
+        elif event in ("status", "preset", "presets", "mappings"): self.ui_bus.publish(event, *args)
+        elif event in ("preset_added", "preset_removed"): self.ui_bus.append("preset_edits", event, *args)
+        elif event == "update": self.ui_bus.call(self.notify_update, *args)
+        elif event == "remote_error": self.ui_bus.publish("remote_error", *args)
+        elif event == "open": self.show_window_tray()
+        elif event == "stopped": self.ui_bus.call(self.quit_app)
+
+    def is_hidden(self):
+        try: return self.state() in ("withdrawn", "iconic")
+        except Exception: return False
+
+    def apply_ui_changes(self, changes):
+        if not self.running or not self.winfo_exists(): return
+        if self.is_hidden():
+            # Nothing is drawn while the window is hidden; catch_up applies the
+            # accumulated changes once it is shown again.
+            changes.pop("upload_failed", None)
+            if changes.pop("preset_edits", None): changes["presets"] = ()
+            self.deferred_changes.update(changes)
+            return
+        if "status" in changes: self.update_status_ui(*changes["status"])
+        if "presets" in changes: self.refresh_preset_list()
+        else:
+            for event, name in changes.get("preset_edits", ()): self.apply_preset_edit(event, name)
+            if "preset" in changes or "preset_edits" in changes: self.refresh_preset_list_highlight()
+        if "preset" in changes:
+            self.update_editor_ui()
+            self.draw_visualizer()
+        if "mappings" in changes: self.refresh_mappings_ui()
+        if "uploading" in changes: self.set_blocking_state(*changes["uploading"])
+        if "upload_failed" in changes: self.upload_finished(False)
+        if "remote_error" in changes: self.show_remote_error(*changes["remote_error"])
+
+    def notify_update(self, version, url):
+        ans = messagebox.askyesno("Update Available", f"A new version ({version}) is available.\n\nCurrent: {CURRENT_VERSION}\n\nWould you like to open the download page?")
+        if ans: webbrowser.open(url)
+
+    def setup_sidebar(self):
+        self.sidebar = ctk.CTkFrame(self, fg_color=Theme.CONTAINER_BG, corner_radius=0, width=260)
+        self.sidebar.grid(row=0, column=0, sticky="nsew")
+        self.sidebar.grid_rowconfigure(2, weight=1)
+        self.sidebar.grid_columnconfigure(0, weight=1)
+        ctk.CTkLabel(self.sidebar, text="V MACROPAD", font=Theme.FONT_HEADER, text_color=Theme.TEXT_PRIMARY).grid(row=0, column=0, pady=(30, 10))
+        ctk.CTkLabel(self.sidebar, text="PRESET LIBRARY", font=Theme.FONT_BODY, text_color=Theme.TEXT_SECONDARY).grid(row=1, column=0, pady=(0, 20))
+        self.preset_list = VirtualPresetList(self.sidebar, command=self.load_preset_by_name)
+        self.preset_list.grid(row=2, column=0, sticky="nsew", padx=10, pady=10)
+        btn_frame = ctk.CTkFrame(self.sidebar, fg_color="transparent")
+        btn_frame.grid(row=3, column=0, sticky="ew", pady=20, padx=20)
+        btn_frame.grid_columnconfigure((0,1), weight=1)
+        self.btn_add = ctk.CTkButton(btn_frame, text="NEW", font=Theme.FONT_BODY, fg_color=Theme.BUTTON_HOVER, hover_color=Theme.TEXT_DISABLED, command=self.add_preset)
+        self.btn_add.grid(row=0, column=0, padx=5, sticky="ew")
+        self.btn_del = ctk.CTkButton(btn_frame, text="DELETE", font=Theme.FONT_BODY, fg_color="#441111", hover_color="#802122", command=self.del_preset)
+        self.btn_del.grid(row=0, column=1, padx=5, sticky="ew")
+        self.btn_settings = ctk.CTkButton(self.sidebar, text="SETTINGS", font=Theme.FONT_BODY, fg_color="transparent", border_width=1, border_color=Theme.TEXT_DISABLED, command=self.open_settings_ui)
+        self.btn_settings.grid(row=4, column=0, sticky="ew", padx=20, pady=(0, 20))
+
+    def open_settings_ui(self):
+        engine = self.engine
+        win = ctk.CTkToplevel(self)
+        win.title("Settings")
+        win.geometry("420x750")
+        win.resizable(False, False)
+        win.attributes("-topmost", True)
+        win.configure(fg_color=Theme.CONTAINER_BG)
+        try:
+            x = self.winfo_x() + (self.winfo_width()//2) - 210
+            y = self.winfo_y() + (self.winfo_height()//2) - 375
+            win.geometry(f"+{x}+{y}")
+        except tk.TclError: pass
+        ctk.CTkLabel(win, text="SETTINGS", font=Theme.FONT_HEADER).pack(pady=(20, 20))
+
+        var_notif_p = ctk.BooleanVar(value=engine.cfg_notify_preset)
+        var_notif_s = ctk.BooleanVar(value=engine.cfg_notify_status)
+        var_tray = ctk.BooleanVar(value=engine.cfg_tray_enabled)
+        var_start = ctk.BooleanVar(value=engine.cfg_startup)
+        var_update = ctk.BooleanVar(value=engine.cfg_check_updates)
+        var_game = ctk.BooleanVar(value=engine.cfg_game_mode)
+
+        frm_hw = ctk.CTkFrame(win, fg_color="transparent")
+        frm_hw.pack(pady=10, padx=40, fill="x")
+        ctk.CTkLabel(frm_hw, text="Vendor ID (Hex):", text_color=Theme.TEXT_SECONDARY).grid(row=0, column=0, sticky="w")
+        entry_vid = ctk.CTkEntry(frm_hw, width=120)
+        entry_vid.insert(0, hex(engine.cfg_vid))
+        entry_vid.grid(row=0, column=1, padx=10)
+        ctk.CTkLabel(frm_hw, text="Product ID (Hex):", text_color=Theme.TEXT_SECONDARY).grid(row=1, column=0, sticky="w", pady=5)
+        entry_pid = ctk.CTkEntry(frm_hw, width=120)
+        entry_pid.insert(0, hex(engine.cfg_pid))
+        entry_pid.grid(row=1, column=1, padx=10, pady=5)
+
+        # LAYOUT SELECTOR
+        frm_layout = ctk.CTkFrame(win, fg_color="transparent")
+        frm_layout.pack(pady=10, padx=40, fill="x")
+        ctk.CTkLabel(frm_layout, text="Device Layout:", text_color=Theme.TEXT_SECONDARY, font=("Segoe UI", 12, "bold")).pack(anchor="w", pady=(0, 5))
+        combo_layout = ctk.CTkComboBox(frm_layout, values=["3-Key + Knob", "4-Key"])
+        combo_layout.set(engine.cfg_layout)
+        combo_layout.pack(fill="x")
+
+        frm_life = ctk.CTkFrame(win, fg_color="transparent")
+        frm_life.pack(pady=15, padx=40, fill="x")
+        ctk.CTkLabel(frm_life, text="Auto-Switch Strategy:", text_color=Theme.TEXT_SECONDARY, font=("Segoe UI", 12, "bold")).pack(anchor="w", pady=(0, 5))
+        init_strategy = "Fast Response (0.5s)" if engine.cfg_focus_delay <= 0.5 else "Max Lifespan (2.0s)"
+        seg_strategy = ctk.CTkSegmentedButton(frm_life, values=["Fast Response (0.5s)", "Max Lifespan (2.0s)"])
+        seg_strategy.set(init_strategy)
+        seg_strategy.pack(fill="x")
+
+        def save_and_close():
+            try:
+                new_vid = int(entry_vid.get(), 16)
+                new_pid = int(entry_pid.get(), 16)
+            except ValueError: return
+            strat = seg_strategy.get()
+            engine.update_config({
+                "notify_preset": var_notif_p.get(),
+                "notify_status": var_notif_s.get(),
+                "tray_enabled": var_tray.get(),
+                "startup_enabled": var_start.get(),
+                "check_updates": var_update.get(),
+                "game_mode": var_game.get(),
+                "layout": combo_layout.get(),
+                "focus_delay": 0.5 if "Fast" in strat else 2.0,
+                "vendor_id": new_vid,
+                "product_id": new_pid,
+            })
+            # Force redraw of visualizer immediately
+            self.draw_visualizer()
+            win.destroy()
+
+        ctk.CTkCheckBox(win, text="Notify on Preset Change", variable=var_notif_p).pack(pady=10, padx=40, anchor="w")
+        ctk.CTkCheckBox(win, text="Notify on Connect/Disconnect", variable=var_notif_s).pack(pady=10, padx=40, anchor="w")
+        ctk.CTkCheckBox(win, text="Enable System Tray Icon", variable=var_tray).pack(pady=10, padx=40, anchor="w")
+        ctk.CTkCheckBox(win, text="Start with Windows", variable=var_start).pack(pady=10, padx=40, anchor="w")
+        ctk.CTkCheckBox(win, text="Check for Updates Automatically", variable=var_update).pack(pady=10, padx=40, anchor="w")
+        ctk.CTkCheckBox(win, text="Pause While a Fullscreen Game Runs", variable=var_game).pack(pady=10, padx=40, anchor="w")
+
+        ctk.CTkButton(win, text="SAVE & CLOSE", command=save_and_close, fg_color=Theme.ACTIVE_BUTTON, text_color="black").pack(pady=30)
+        ctk.CTkLabel(win, text=f"Version: {CURRENT_VERSION}", text_color=Theme.TEXT_DISABLED, font=("Segoe UI", 10)).pack(pady=(0, 0))
+        ctk.CTkLabel(win, text="Created by Visiuun", text_color=Theme.TEXT_SECONDARY).pack(pady=(5, 0))
+        link = ctk.CTkButton(win, text="github.com/visiuun", fg_color="transparent", text_color="#4da6ff", hover=False, command=lambda: webbrowser.open("https://github.com/visiuun"))
+        link.pack()
+
+    def setup_main_area(self):
+        self.main_frame = ctk.CTkFrame(self, fg_color=Theme.MAIN_BG, corner_radius=0)
+        self.main_frame.grid(row=0, column=1, sticky="nsew", padx=20, pady=20)
+        self.main_frame.grid_rowconfigure(1, weight=1)
+        self.main_frame.grid_columnconfigure(0, weight=1)
+        header_frame = ctk.CTkFrame(self.main_frame, fg_color="transparent")
+        header_frame.grid(row=0, column=0, sticky="ew", pady=(10, 20))
+        self.lbl_status_icon = ctk.CTkLabel(header_frame, text="●", font=("Arial", 24), text_color=Theme.DISCONNECTED_COLOR)
+        self.lbl_status_icon.pack(side="left", padx=(0, 10))
+        self.lbl_status_text = ctk.CTkLabel(header_frame, text="DISCONNECTED", font=Theme.FONT_SUBHEADER, text_color=Theme.TEXT_SECONDARY)
+        self.lbl_status_text.pack(side="left")
+        self.btn_set_default = ctk.CTkButton(header_frame, text="SET AS DEFAULT", font=("Segoe UI", 11, "bold"), fg_color="#333", width=120, command=self.set_active_as_default)
+        self.btn_set_default.pack(side="right", padx=5)
+        self.btn_link_app = ctk.CTkButton(header_frame, text="LINK TO APP", font=("Segoe UI", 11, "bold"), fg_color=Theme.WIDGET_BG, width=120, command=self.link_current_preset_to_app)
+        self.btn_link_app.pack(side="right", padx=5)
+        self.vis_container = ctk.CTkFrame(self.main_frame, fg_color=Theme.WIDGET_BG, corner_radius=15)
+        self.vis_container.grid(row=1, column=0, sticky="nsew", pady=10)
+        self.canvas = tk.Canvas(self.vis_container, bg=Theme.WIDGET_BG, highlightthickness=0, height=250)
+        self.canvas.pack(fill="both", expand=True, padx=20, pady=20)
+        self.canvas.bind("<Button-1>", self.on_canvas_click)
+        self.canvas.bind("<Configure>", lambda e: self.draw_visualizer())
+        self.editor_frame = ctk.CTkTabview(self.main_frame, fg_color=Theme.CONTAINER_BG, text_color=Theme.TEXT_PRIMARY, segmented_button_fg_color=Theme.WIDGET_BG, segmented_button_selected_color=Theme.ACTIVE_BUTTON, segmented_button_selected_hover_color=Theme.ACTIVE_BUTTON, segmented_button_unselected_color=Theme.WIDGET_BG, segmented_button_unselected_hover_color=Theme.BUTTON_HOVER)
+        self.editor_frame.grid(row=2, column=0, sticky="ew", pady=20)
+        self.tab_input = self.editor_frame.add("Input / Macro")
+        self.tab_media = self.editor_frame.add("Media")
+        self.tab_app_audio = self.editor_frame.add("App Audio")
+        self.tab_macro = self.editor_frame.add("Macro Sequence")
+        self.tab_led = self.editor_frame.add("LED")
+        self.tab_mappings = self.editor_frame.add("App Mappings")
+        self.setup_tab_content()
+        self.btn_upload = ctk.CTkButton(self.main_frame, text="UPLOAD CONFIGURATION", font=Theme.FONT_SUBHEADER, height=50, corner_radius=8, fg_color=Theme.WIDGET_BG, text_color=Theme.TEXT_DISABLED, state="disabled", command=self.start_upload)
+        self.btn_upload.grid(row=3, column=0, sticky="ew", pady=(10,0))
+
+    def setup_tab_content(self):
+        input_container = ctk.CTkFrame(self.tab_input, fg_color="transparent")
+        input_container.pack(pady=5, fill="both", expand=True)
+        ctk.CTkLabel(input_container, text="Modifiers (Apply to Key & Mouse)", font=("Segoe UI", 12, "bold"), text_color=Theme.TEXT_SECONDARY).pack(pady=(5,0))
+        mod_frame = ctk.CTkFrame(input_container, fg_color="transparent")
+        mod_frame.pack(pady=5)
+        self.var_ctrl = ctk.BooleanVar()
+        self.var_shift = ctk.BooleanVar()
+        self.var_alt = ctk.BooleanVar()
+        self.var_win = ctk.BooleanVar()
+        for t, v in [("Ctrl", self.var_ctrl), ("Shift", self.var_shift), ("Alt", self.var_alt), ("Win", self.var_win)]:
+            ctk.CTkCheckBox(mod_frame, text=t, variable=v, command=self.store_ui_state, fg_color=Theme.ACTIVE_BUTTON, text_color=Theme.TEXT_PRIMARY).pack(side="left", padx=10)
+        ctk.CTkLabel(input_container, text="Keyboard Key", font=("Segoe UI", 12, "bold"), text_color=Theme.TEXT_SECONDARY).pack(pady=(15,0))
+        self.cb_key = ctk.CTkComboBox(input_container, values=list(KEY_MAP.keys()), command=self.store_ui_state, width=300)
+        self.cb_key.pack(pady=5)
+        ctk.CTkLabel(input_container, text="--- AND / OR ---", font=("Segoe UI", 10), text_color=Theme.TEXT_DISABLED).pack(pady=5)
+        mouse_frame = ctk.CTkFrame(input_container, fg_color="transparent")
+        mouse_frame.pack(pady=5)
+        ctk.CTkLabel(mouse_frame, text="Mouse Button", font=("Segoe UI", 12, "bold"), text_color=Theme.TEXT_SECONDARY).grid(row=0, column=0, padx=10)
+        self.cb_mouse_btn = ctk.CTkComboBox(mouse_frame, values=list(MOUSE_BUTTONS.keys()), command=self.store_ui_state, width=140)
+        self.cb_mouse_btn.grid(row=1, column=0, padx=10)
+        ctk.CTkLabel(mouse_frame, text="Mouse Wheel", font=("Segoe UI", 12, "bold"), text_color=Theme.TEXT_SECONDARY).grid(row=0, column=1, padx=10)
+        self.cb_mouse_scroll = ctk.CTkComboBox(mouse_frame, values=list(MOUSE_WHEEL.keys()), command=self.store_ui_state, width=140)
+        self.cb_mouse_scroll.grid(row=1, column=1, padx=10)
+        self.cb_media = ctk.CTkComboBox(self.tab_media, values=list(MEDIA_MAP.keys()), command=self.store_ui_state, width=300)
+        self.cb_media.pack(pady=30)
+        if "keyboard/pycaw/comtypes" in MISSING_LIBS:
+            ctk.CTkLabel(self.tab_app_audio, text="Missing libraries (keyboard, pycaw, comtypes).\nCannot enable App Volume control.", text_color="red").pack(pady=20)
+        else:
+            app_audio_frame = ctk.CTkFrame(self.tab_app_audio, fg_color="transparent")
+            app_audio_frame.pack(pady=10, fill="x", padx=20)
+            ctk.CTkLabel(app_audio_frame, text="Target Process Name (.exe)", text_color=Theme.TEXT_SECONDARY, font=("Segoe UI", 12, "bold")).pack(anchor="w")
+            row1 = ctk.CTkFrame(app_audio_frame, fg_color="transparent")
+            row1.pack(fill="x", pady=5)
+            self.entry_app_name = ctk.CTkEntry(row1, placeholder_text="e.g., spotify.exe")
+            self.entry_app_name.pack(side="left", fill="x", expand=True, padx=(0, 10))
+            self.entry_app_name.bind("<KeyRelease>", self.store_ui_state)
+            btn_link_vol = ctk.CTkButton(row1, text="Grab Active App", width=120, fg_color=Theme.WIDGET_BG, command=self.grab_app_for_volume)
+            btn_link_vol.pack(side="right")
+            ctk.CTkLabel(app_audio_frame, text="Action", text_color=Theme.TEXT_SECONDARY, font=("Segoe UI", 12, "bold")).pack(anchor="w", pady=(15, 0))
+            self.cb_app_action = ctk.CTkComboBox(app_audio_frame, values=["Volume Up", "Volume Down", "Mute"], command=self.store_ui_state)
+            self.cb_app_action.pack(fill="x", pady=5)
+            ctk.CTkLabel(self.tab_app_audio, text="Note: If app is not found, controls Master Volume.\nRequires this software to be running.", text_color=Theme.TEXT_DISABLED, font=("Segoe UI", 10)).pack(pady=20)
+        if "keyboard/pycaw/comtypes" in MISSING_LIBS:
+            ctk.CTkLabel(self.tab_macro, text="Missing library (keyboard).\nCannot run macro sequences.", text_color="red").pack(pady=20)
+        else:
+            macro_frame = ctk.CTkFrame(self.tab_macro, fg_color="transparent")
+            macro_frame.pack(pady=10, fill="both", expand=True, padx=20)
+            ctk.CTkLabel(macro_frame, text="Steps (one per line)", text_color=Theme.TEXT_SECONDARY, font=("Segoe UI", 12, "bold")).pack(anchor="w")
+            self.txt_macro = ctk.CTkTextbox(macro_frame, height=110, font=("Consolas", 12))
+            self.txt_macro.pack(fill="x", pady=5)
+            self.txt_macro.bind("<KeyRelease>", self.store_ui_state)
+            row = ctk.CTkFrame(macro_frame, fg_color="transparent")
+            row.pack(fill="x", pady=5)
+            self.var_macro_cancel = ctk.BooleanVar(value=True)
+            ctk.CTkCheckBox(row, text="Press again to cancel", variable=self.var_macro_cancel, command=self.store_ui_state, fg_color=Theme.ACTIVE_BUTTON, text_color=Theme.TEXT_PRIMARY).pack(side="left")
+            self.entry_char_delay = ctk.CTkEntry(row, width=60, placeholder_text="0")
+            self.entry_char_delay.pack(side="right")
+            self.entry_char_delay.bind("<KeyRelease>", self.store_ui_state)
+            ctk.CTkLabel(row, text="Typing delay (ms)", text_color=Theme.TEXT_SECONDARY).pack(side="right", padx=10)
+            self.lbl_macro_status = ctk.CTkLabel(macro_frame, text=MACRO_HINT, text_color=Theme.TEXT_DISABLED, font=("Segoe UI", 10))
+            self.lbl_macro_status.pack(anchor="w")
+        self.cb_led = ctk.CTkComboBox(self.tab_led, values=list(LED_MODES.keys()), command=self.store_led_state, width=300)
+        self.cb_led.pack(pady=30)
+        self.mapping_scroll = ctk.CTkScrollableFrame(self.tab_mappings, fg_color="transparent")
+        self.mapping_scroll.pack(fill="both", expand=True, padx=10, pady=10)
+        self.refresh_mappings_ui()
+
+    def grab_app_for_volume(self):
+        def captured(app):
+            if not self.running: return
+            if app:
+                self.entry_app_name.delete(0, 'end')
+                self.entry_app_name.insert(0, app)
+                self.store_ui_state()
+                messagebox.showinfo("Captured", f"Target set to: {app}")
+            else:
+                messagebox.showerror("Error", "Could not detect app.")
+        messagebox.showinfo("Ready", "Focus the target app within 3 seconds...")
+        self.engine.scheduler.call_later(3, lambda: self.ui_bus.call(captured, get_active_app_process(force=True)), name="capture_app")
+
+    def set_active_as_default(self):
+        engine = self.engine
+        if not engine.current_preset_name: return
+        old_default = engine.default_preset_name
+        engine.set_default_preset(engine.current_preset_name)
+        self.preset_list.set_label(old_default, None)
+        self.preset_list.set_label(engine.default_preset_name, self.preset_label(engine.default_preset_name))
+        self.refresh_mappings_ui()
+        messagebox.showinfo("Success", f"'{engine.default_preset_name}' is now the Default.")
+
+    def refresh_mappings_ui(self):
+        if not self.running or not self.winfo_exists(): return
+        for w in self.mapping_scroll.winfo_children(): w.destroy()
+        if not self.engine.app_mappings:
+            ctk.CTkLabel(self.mapping_scroll, text="No app mappings yet.", text_color=Theme.TEXT_SECONDARY).pack(pady=20)
+            return
+        for app_name, preset_name in list(self.engine.app_mappings.items()):
+            row = ctk.CTkFrame(self.mapping_scroll, fg_color=Theme.WIDGET_BG)
+            row.pack(fill="x", pady=2, padx=5)
+            ctk.CTkLabel(row, text=app_name, width=200, anchor="w", font=("Segoe UI", 12, "bold")).pack(side="left", padx=10)
+            ctk.CTkLabel(row, text=f"→  {preset_name}", text_color=Theme.TEXT_SECONDARY).pack(side="left", padx=10)
+            ctk.CTkButton(row, text="X", width=30, fg_color="#441111", command=lambda a=app_name: self.remove_mapping(a)).pack(side="right", padx=5)
+
+    def remove_mapping(self, app_name):
+        if self.engine.remove_mapping(app_name):
+            self.refresh_mappings_ui()
+
+    def link_current_preset_to_app(self):
+        engine = self.engine
+        if not engine.current_preset_name: return
+        if engine.current_preset_name == engine.default_preset_name:
+            messagebox.showerror("Error", "The Default Preset cannot be linked to a specific app.")
+            return
+        def delayed_capture():
+            app_name = get_active_app_process(force=True)
+            if app_name and app_name.lower() not in ["python.exe", "pythonw.exe", "vmacropad.exe"]:
+                engine.add_mapping(app_name, engine.current_preset_name)
+                self.ui_bus.publish("mappings")
+                self.ui_bus.call(messagebox.showinfo, "Success", f"Linked '{app_name}' to '{engine.current_preset_name}'")
+            else:
+                self.ui_bus.call(messagebox.showerror, "Error", "Could not identify app.")
+        messagebox.showinfo("Ready", "Focus target app within 3 seconds.")
+        engine.scheduler.call_later(3, delayed_capture, name="capture_app")
+
+    def load_preset_by_name(self, name):
+        self.engine.activate_preset(name)
+
+    def preset_label(self, name):
+        return f"{name} (DEFAULT)" if name == self.engine.default_preset_name else None
+
+    def refresh_preset_list(self):
+        if not self.running or not self.winfo_exists(): return
+        engine = self.engine
+        labels = {}
+        if engine.default_preset_name in engine.presets:
+            labels[engine.default_preset_name] = self.preset_label(engine.default_preset_name)
+        self.preset_list.set_items(engine.presets.keys(), labels)
+        self.refresh_preset_list_highlight()
+
+    def apply_preset_edit(self, event, name):
+        if not self.running or not self.winfo_exists(): return
+        if event == "preset_removed": self.preset_list.remove(name)
+        elif name in self.engine.presets: self.preset_list.insert(name, self.preset_label(name))
+
+    def refresh_preset_list_highlight(self):
+        if not self.running or not self.winfo_exists(): return
+        self.preset_list.set_active(self.engine.current_preset_name)
+
+    def create_rounded_rect(self, x1, y1, x2, y2, radius=25, **kwargs):
+        points = [x1+radius, y1, x1+radius, y1, x2-radius, y1, x2-radius, y1, x2, y1, x2, y1+radius, x2, y1+radius, x2, y2-radius, x2, y2-radius, x2, y2, x2-radius, y2, x2-radius, y2, x1+radius, y2, x1+radius, y2, x1, y2, x1, y2-radius, x1, y2-radius, x1, y1+radius, x1, y1+radius, x1, y1]
+        return self.canvas.create_polygon(points, **kwargs, smooth=True)
+
+    def draw_visualizer(self):
+        if not self.running or not self.winfo_exists(): return
+        self.canvas.delete("all")
+        accent = "#888888"
+        if self.engine.current_preset_name in self.engine.presets:
+            accent = self.engine.resolver.resolve(self.engine.current_preset_name).get("color", "#888888")
+        
+        w = self.canvas.winfo_width()
+        h = self.canvas.winfo_height()
+        if w < 10: w, h = 600, 250
+        
+        cx, cy = w // 2, h // 2
+        
+        if self.engine.cfg_layout == "4-Key":
+            # --- 4 KEY LAYOUT ---
+            key_size = 80
+            gap = 30
+            total_width = (4 * key_size) + (3 * gap)
+            start_x = cx - (total_width / 2)
+            key_y = cy - (key_size / 2)
+            
+            for i in range(4):
+                x = start_x + (i * (key_size + gap))
+                is_sel = (i == self.selected_key_index)
+                fill = accent if is_sel else Theme.CONTAINER_BG
+                outline = "#ffffff" if is_sel else "#333333"
+                width = 3 if is_sel else 2
+                tag = f"key_{i}"
+                self.create_rounded_rect(x, key_y, x+key_size, key_y+key_size, radius=15, fill=fill, outline=outline, width=width, tags=tag)
+                text_color = Theme.TEXT_INVERSE if (is_sel and not self.is_dark(accent)) else Theme.TEXT_PRIMARY
+                self.canvas.create_text(x + key_size/2, key_y + key_size/2, text=str(i+1), fill=text_color, font=("Segoe UI", 24, "bold"), tags=tag)
+                
+        else:
+            # --- 3 KEY + KNOB LAYOUT (Standard) ---
+            key_size = 80
+            gap = 30
+            # Keys 1-3
+            start_x = cx - 210
+            key_y = cy - (key_size // 2)
+            
+            for i in range(3):
+                x = start_x + (i * (key_size + gap))
+                is_sel = (i == self.selected_key_index)
+                fill = accent if is_sel else Theme.CONTAINER_BG
+                outline = "#ffffff" if is_sel else "#333333"
+                width = 3 if is_sel else 2
+                tag = f"key_{i}"
+                self.create_rounded_rect(x, key_y, x+key_size, key_y+key_size, radius=15, fill=fill, outline=outline, width=width, tags=tag)
+                text_color = Theme.TEXT_INVERSE if (is_sel and not self.is_dark(accent)) else Theme.TEXT_PRIMARY
+                self.canvas.create_text(x + key_size/2, key_y + key_size/2, text=str(i+1), fill=text_color, font=("Segoe UI", 24, "bold"), tags=tag)
+
+            # Knob (Indices 3, 4, 5)
+            knob_x = start_x + (3 * (key_size + gap)) + 50
+            knob_y = cy
+            knob_r = 50
+            is_ccw = (self.selected_key_index == 3)
+            is_cw = (self.selected_key_index == 4)
+            is_press = (self.selected_key_index == 5)
+            
+            self.canvas.create_oval(knob_x-knob_r, knob_y-knob_r, knob_x+knob_r, knob_y+knob_r, fill=Theme.CONTAINER_BG, outline="#333333", width=2)
+            self.canvas.create_arc(knob_x-knob_r, knob_y-knob_r, knob_x+knob_r, knob_y+knob_r, start=90, extent=180, fill=accent if is_ccw else "#444444", style=tk.PIESLICE)
+            self.canvas.create_arc(knob_x-knob_r, knob_y-knob_r, knob_x+knob_r, knob_y+knob_r, start=270, extent=180, fill=accent if is_cw else "#444444", style=tk.PIESLICE)
+            self.canvas.create_oval(knob_x-25, knob_y-25, knob_x+25, knob_y+25, fill=Theme.CONTAINER_BG, outline="#222")
+            self.canvas.create_oval(knob_x-18, knob_y-18, knob_x+18, knob_y+18, fill=accent if is_press else "#222222", outline="white" if is_press else "#555")
+            self.canvas.create_text(knob_x-65, knob_y, text="CCW", fill=Theme.TEXT_SECONDARY, font=("Segoe UI", 10, "bold"), anchor="e")
+            self.canvas.create_text(knob_x+65, knob_y, text="CW", fill=Theme.TEXT_SECONDARY, font=("Segoe UI", 10, "bold"), anchor="w")
+
+    def is_dark(self, hex_color):
+        if not hex_color.startswith('#'): return True
+        h = hex_color.lstrip('#')
+        try:
+            rgb = tuple(int(h[i:i+2], 16) for i in (0, 2, 4))
+            return (rgb[0]*0.299 + rgb[1]*0.587 + rgb[2]*0.114) < 140
+        except ValueError: return True
+
+    def on_canvas_click(self, event):
+        if self.engine.is_uploading or not self.winfo_exists(): return
+        w = self.canvas.winfo_width()
+        h = self.canvas.winfo_height()
+        cx, cy = w // 2, h // 2
+        
+        if self.engine.cfg_layout == "4-Key":
+            key_size = 80
+            gap = 30
+            total_width = (4 * key_size) + (3 * gap)
+            start_x = cx - (total_width / 2)
+            key_y = cy - (key_size / 2)
+            
+            for i in range(4):
+                kx = start_x + (i * (key_size + gap))
+                if kx <= event.x <= kx+key_size and key_y <= event.y <= key_y+key_size:
+                    self.selected_key_index = i
+                    self.update_editor_ui()
+                    self.draw_visualizer()
+                    return
+        else:
+            # 3-Key + Knob logic
+            key_size = 80
+            gap = 30
+            start_x = cx - 210
+            key_y = cy - (key_size // 2)
+            
+            for i in range(3):
+                kx = start_x + (i * (key_size + gap))
+                if kx <= event.x <= kx+key_size and key_y <= event.y <= key_y+key_size:
+                    self.selected_key_index = i
+                    self.update_editor_ui()
+                    self.draw_visualizer()
+                    return
+            
+            knob_x = start_x + (3 * (key_size + gap)) + 50
+            knob_y = cy
+            dx = event.x - knob_x
+            dy = event.y - knob_y
+            dist = math.sqrt(dx*dx + dy*dy)
+            if dist <= 18:
+                self.selected_key_index = 5
+            elif dist <= 50:
+                self.selected_key_index = 3 if dx < 0 else 4
+            
+            self.update_editor_ui()
+            self.draw_visualizer()
+
+    def update_editor_ui(self):
+        if not self.running or not self.winfo_exists(): return
+        d = self.engine.current_data[self.selected_key_index]
+        dtype = d.get("type", "key")
+        
+        try:
+            if dtype == "media":
+                self.editor_frame.set("Media")
+                self.cb_media.set(media_name(d.get("b1", 0), d.get("b2", 0)))
+            elif dtype == "app_vol":
+                self.editor_frame.set("App Audio")
+                self.entry_app_name.delete(0, 'end')
+                self.entry_app_name.insert(0, d.get("app", ""))
+                act_map = {"up": "Volume Up", "down": "Volume Down", "mute": "Mute"}
+                self.cb_app_action.set(act_map.get(d.get("action", "up"), "Volume Up"))
+            elif dtype == "macro":
+                self.editor_frame.set("Macro Sequence")
+                self.txt_macro.delete("1.0", "end")
+                self.txt_macro.insert("1.0", "\n".join(d.get("steps", [])))
+                self.var_macro_cancel.set(d.get("cancel_on_repress", True))
+                self.entry_char_delay.delete(0, 'end')
+                if d.get("char_delay_ms"): self.entry_char_delay.insert(0, str(d["char_delay_ms"]))
+            else:
+                self.editor_frame.set("Input / Macro")
+                mod = d.get("mod", 0)
+                self.var_ctrl.set(bool(mod & 1))
+                self.var_shift.set(bool(mod & 2))
+                self.var_alt.set(bool(mod & 4))
+                self.var_win.set(bool(mod & 8))
+                
+                code = d.get("code", 0)
+                self.cb_key.set(key_name(code))
+                
+                m_btn = d.get("mouse_btn", 0)
+                m_scr = d.get("mouse_scroll", 0)
+                self.cb_mouse_btn.set(MOUSE_BUTTON_NAMES.get(m_btn, "None"))
+                self.cb_mouse_scroll.set(MOUSE_WHEEL_NAMES.get(m_scr, "None"))
+            
+            self.cb_led.set(LED_NAMES.get(self.engine.led_mode, "Static"))
+        except Exception: LOG.warning("presets", "could not show slot %d in the editor", self.selected_key_index + 1, exc=True)
+
+    def store_ui_state(self, _=None):
+        if not self.running or self.engine.is_uploading: return
+        tab = self.editor_frame.get()
+        idx = self.selected_key_index
+        
+        if tab == "Input / Macro":
+            mod = (1 if self.var_ctrl.get() else 0) | (2 if self.var_shift.get() else 0) | (4 if self.var_alt.get() else 0) | (8 if self.var_win.get() else 0)
+            code = key_code(self.cb_key.get()) or 0
+            mouse_btn = MOUSE_BUTTONS.get(self.cb_mouse_btn.get(), 0)
+            mouse_scroll = MOUSE_WHEEL.get(self.cb_mouse_scroll.get(), 0)
+            
+            if mouse_btn != 0 or mouse_scroll != 0:
+                self.engine.current_data[idx] = {
+                    "type": "mouse", "mod": mod, "code": 0,
+                    "mouse_btn": mouse_btn, "mouse_scroll": mouse_scroll
+                }
+            else:
+                self.engine.current_data[idx] = {
+                    "type": "key", "mod": mod, "code": code,
+                    "mouse_btn": 0, "mouse_scroll": 0
+                }
+                
+        elif tab == "Media":
+            b1, b2 = media_code(self.cb_media.get()) or (0, 0)
+            self.engine.current_data[idx] = {"type": "media", "b1": b1, "b2": b2}
+            
+        elif tab == "App Audio":
+            act_map = {"Volume Up": "up", "Volume Down": "down", "Mute": "mute"}
+            action = act_map.get(self.cb_app_action.get(), "up")
+            app_name = self.entry_app_name.get().strip()
+            self.engine.current_data[idx] = {"type": "app_vol", "app": app_name, "action": action}
+
+        elif tab == "Macro Sequence":
+            lines = self.txt_macro.get("1.0", "end").rstrip("\n").split("\n")
+            errors = parse_macro(lines)[1]
+            self.lbl_macro_status.configure(text=errors[0] if errors else MACRO_HINT, text_color="red" if errors else Theme.TEXT_DISABLED)
+            try: char_delay = max(0.0, float(self.entry_char_delay.get() or 0))
+            except ValueError: char_delay = 0.0
+            self.engine.current_data[idx] = {"type": "macro", "steps": lines, "char_delay_ms": char_delay, "cancel_on_repress": self.var_macro_cancel.get()}
+
+    def store_led_state(self, _=None):
+        self.engine.led_mode = LED_MODES.get(self.cb_led.get(), 1)
+
+    def add_preset(self):
+        name = ctk.CTkInputDialog(text="Preset Name:", title="Save").get_input()
+        if not name: return
+        color = colorchooser.askcolor()[1] or "#888888"
+        self.engine.save_preset(name, {"keys": [dict(x) for x in self.engine.current_data], "led": self.engine.led_mode, "color": color})
+        self.load_preset_by_name(name)
+
+    def del_preset(self):
+        engine = self.engine
+        removed = engine.current_preset_name
+        if removed not in engine.presets: return
+        unmapped = engine.delete_preset(removed)
+        if unmapped: self.refresh_mappings_ui()
+        if engine.presets:
+            self.load_preset_by_name(next(iter(engine.presets)))
+
+    def start_upload(self):
+        self.engine.start_upload(full=True)
+
+    def upload_finished(self, success):
+        if not success:
+            if self.running and self.winfo_exists():
+                if not self.engine.last_auto_uploaded_preset:
+                    messagebox.showerror("Error", "Upload failed.")
+
+    def show_remote_error(self, cmd, message):
+        if not self.running or not self.winfo_exists(): return
+        messagebox.showerror("Not Applied", f"The background service did not apply '{cmd}':\n\n{message}\n\nThe editor now shows the service's state again.")
+
+    def set_blocking_state(self, b):
+        if not self.running or not self.winfo_exists(): return
+        s = "disabled" if b else "normal"
+        try:
+            self.btn_upload.configure(state=s, text="UPLOADING..." if b else "UPLOAD CONFIGURATION")
+            self.btn_add.configure(state=s)
+            self.btn_del.configure(state=s)
+            self.preset_list.set_state(s)
+        except tk.TclError: pass
+
+    def update_status_ui(self, c):
+        if not self.running or not self.winfo_exists(): return
+        try:
+            self.lbl_status_icon.configure(text_color=Theme.CONNECTED_COLOR if c else Theme.DISCONNECTED_COLOR)
+            self.lbl_status_text.configure(text="CONNECTED" if c else "DISCONNECTED", text_color=Theme.TEXT_PRIMARY if c else Theme.TEXT_SECONDARY)
+            self.btn_upload.configure(state="normal" if c else "disabled", fg_color=Theme.CONNECTED_COLOR if c else Theme.WIDGET_BG, text_color="black" if c else Theme.TEXT_DISABLED)
+        except tk.TclError: pass
+
+    def show_window_tray(self, icon=None, item=None):
+        if self.running: self.ui_bus.call(self.restore_window)
+
+    def restore_window(self):
+        self.deiconify()
+        self.engine.wake()
+        self.catch_up()
+
+    def catch_up(self):
+        if not self.deferred_changes: return
+        changes, self.deferred_changes = self.deferred_changes, {}
+        self.apply_ui_changes(changes)
+
+    def on_close_attempt(self):
+        if self.tray and self.engine.cfg_tray_enabled: self.withdraw()
+        else: self.quit_app()
+
+    def quit_app(self, icon=None, item=None):
+        if not self.running: return
+        self.running = False
+        self.ui_bus.call(self._perform_shutdown)
+
+    def _perform_shutdown(self):
+        if self.tray: self.tray.stop()
+        self.engine.stop()
+        self.destroy()
+        os._exit(0)